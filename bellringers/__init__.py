@@ -2,7 +2,10 @@
 Bell Ringers Flask Blueprint
 A community-driven CS bell ringer generator with Lock & Spin mechanics
 """
-from flask import Blueprint, session, request, jsonify
+import os
+import time
+
+from flask import Blueprint, session, request, jsonify, g, current_app
 
 
 def create_blueprint():
@@ -13,7 +16,17 @@ def create_blueprint():
     Returns:
         Blueprint: Configured bellringers blueprint with all routes and handlers
     """
+    from . import cache
     from . import database as db
+    from . import excerpts
+    from . import gemini_api
+    from . import limits
+    from . import metrics
+    from . import profiler
+    from . import shards
+    from . import similarity
+    from . import standards
+    from . import writer
 
     # Create the main blueprint with URL prefix
     bp = Blueprint(
@@ -24,6 +37,31 @@ def create_blueprint():
         url_prefix='/bellringers'
     )
 
+    # Multi-process metrics aggregation is configured from the host app's config
+    bp.record_once(lambda state: metrics.configure(state.app.config.get('METRICS_DIR')))
+    bp.record_once(lambda state: profiler.configure(state.app.config.get('DB_PROFILE'),
+                                                    state.app.config.get('DB_SLOW_QUERY_MS', 100)))
+    bp.record_once(lambda state: writer.configure(state.app.config.get('DB_WRITE_QUEUE'),
+                                                  state.app.config.get('DB_WRITE_MAX_BATCH'),
+                                                  state.app.config.get('DB_WRITE_BUSY_RETRIES')))
+    bp.record_once(lambda state: shards.configure(state.app.config.get('SHARDING_ENABLED'),
+                                                  state.app.config.get('SHARD_DIR'),
+                                                  state.app.config.get('SHARD_TENANT_HEADER')))
+
+    bp.record_once(lambda state: limits.configure(state.app.config))
+    bp.record_once(lambda state: gemini_api.configure(state.app.config))
+    bp.record_once(lambda state: similarity.configure(state.app.config))
+
+    bp.record_once(lambda state: cache.configure(state.app.config.get('BINDER_CACHE_BYTES',
+                                                                      cache.DEFAULT_BINDER_CACHE_BYTES)))
+
+    # Warm start: load the standards catalog once (rebuilt only when the files
+    # changed), and keep compiled templates on disk so recycled workers skip
+    # compiling them again
+    bp.record_once(lambda state: standards.load_standards(state.app.config.get('STANDARDS_DIR'),
+                                                          state.app.config.get('STANDARDS_CATALOG_PATH')))
+    bp.record_once(lambda state: configure_template_cache(state.app))
+
     # Import and register main routes
     from .routes import register_routes
     register_routes(bp)
@@ -46,20 +84,78 @@ def create_blueprint():
             return jsonify({'error': 'No handle provided'}), 400
 
         # Create user if doesn't exist
-        if not db.user_exists(handle):
-            db.create_user(handle)
+        user_id = db.get_or_create_user(handle)
 
         # Set session - mark as permanent so it persists
         session.permanent = True
         session['user_handle'] = handle
+        session['user_id'] = user_id
+        session['user_tenant'] = shards.current_tenant() if shards.enabled else None
         session.modified = True
 
-        print(f"Session set for user: {handle}")  # Debug logging
-        print(f"Session contents: {dict(session)}")  # Debug logging
+        current_app.logger.debug("Session set for user: %s", handle)
 
         response = make_response(jsonify({'success': True, 'handle': handle}))
         return response
 
+    # Register request timing handlers (registered first so timing covers check_session)
+    @bp.before_request
+    def start_request_timer():
+        """Record when the request started for the latency histograms"""
+        g.request_started = time.perf_counter()
+        g.db_seconds = 0.0
+
+    @bp.after_request
+    def record_request_metrics(response):
+        """Note the status for the request metrics and add the profiler headers"""
+        if 'request_started' in g:
+            g.response_status = str(response.status_code)
+            # A streamed body runs its queries after the headers are sent, so the
+            # totals would be partial; they are still observed on teardown
+            if profiler.enabled and not response.is_streamed:
+                summary = profiler.request_summary()
+                response.headers['X-DB-Queries'] = str(summary['queries'])
+                response.headers['X-DB-Connections'] = str(summary['connections'])
+                response.headers['X-DB-Query-Time-ms'] = f"{summary['seconds'] * 1000:.1f}"
+        return response
+
+    @bp.teardown_request
+    def observe_request(exc):
+        """Observe request latency and database time per endpoint
+
+        Runs after a streamed body (feed, binder) has been sent, so the time
+        and queries spent rendering it are included.
+        """
+        if 'request_started' in g:
+            labels = {'endpoint': request.endpoint or 'unknown'}
+            status = g.get('response_status') or ('500' if exc is not None else '200')
+            metrics.inc('bellringers_requests_total', dict(labels, method=request.method, status=status))
+            metrics.observe('bellringers_request_duration_seconds',
+                            time.perf_counter() - g.request_started, labels)
+            metrics.observe('bellringers_request_db_seconds', g.db_seconds, labels)
+            if profiler.enabled:
+                metrics.observe('bellringers_request_db_queries', profiler.request_summary()['queries'], labels,
+                                buckets=metrics.COUNT_BUCKETS)
+                for sql, count in profiler.repeated_statements().items():
+                    current_app.logger.warning("%s ran %d times in one request: %s",
+                                               request.endpoint, count, sql)
+            metrics.flush(force=False)
+
+    # Register shard selection (before anything touches the database)
+    @bp.before_request
+    def select_shard():
+        """Point database calls at the current tenant's shard"""
+        if shards.enabled:
+            g.tenant = shards.resolve_tenant()
+            g.shard_token = db.set_db_path(shards.select_shard(g.tenant))
+
+    @bp.teardown_request
+    def release_shard(exc):
+        """Restore the default database after the request (and any streaming) ends"""
+        token = g.pop('shard_token', None)
+        if token is not None:
+            db.reset_db_path(token)
+
     # Register before_request handler
     @bp.before_request
     def check_session():
@@ -70,9 +166,20 @@ def create_blueprint():
 
         # If user_handle in session, update last active
         if 'user_handle' in session:
-            handle = session['user_handle']
-            if db.user_exists(handle):
-                db.update_last_active(handle)
+            # Resolve the handle to an id once per session (and again if the shard changes)
+            tenant = shards.current_tenant() if shards.enabled else None
+            if session.get('user_id') is None or session.get('user_tenant') != tenant:
+                session['user_id'] = db.get_or_create_user(session['user_handle'])
+                session['user_tenant'] = tenant
+            # Also returns the binder version used for binder caching and ETags
+            g.user = db.touch_user(session['user_id'])
+            if g.user is None:
+                # The database was reset since the id was stored
+                session['user_id'] = db.get_or_create_user(session['user_handle'])
+                g.user = db.touch_user(session['user_id'])
+
+    # Section titles for the cards on list pages (stored as JSON, see excerpts.py)
+    bp.add_app_template_filter(excerpts.section_titles, 'section_titles')
 
     # Register context processor - note: for blueprints it's app_context_processor
     @bp.app_context_processor
@@ -81,3 +188,17 @@ def create_blueprint():
         return dict(user_handle=session.get('user_handle'))
 
     return bp
+
+
+def configure_template_cache(app):
+    """Give the app's Jinja environment a persistent bytecode cache
+
+    Uses TEMPLATE_CACHE_DIR; leaves any bytecode cache the host app set up alone.
+    """
+    from jinja2 import FileSystemBytecodeCache
+
+    directory = app.config.get('TEMPLATE_CACHE_DIR')
+    if not directory or app.jinja_env.bytecode_cache is not None:
+        return
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
@@ -1,9 +1,27 @@
 """
 Admin routes for Bell Ringers blueprint
 """
-from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for
+from flask import (Blueprint, render_template, request, jsonify, session, redirect, url_for,
+                   Response, stream_with_context, current_app)
+import hmac
 import hashlib
+import io
 from . import database as db
+from . import gemini_api
+from . import metrics
+from . import profiler
+from . import shards
+from . import similarity
+from . import standards
+from . import transfer
+from .routes import content_response
+
+# Days covered by the dashboard's generation cost views
+COST_REPORT_DAYS = 30
+
+# Moderation queue paging and bulk action limits
+QUEUE_PAGE_SIZE = 24
+MAX_BULK_IDS = 500
 
 
 def create_admin_blueprint():
@@ -12,9 +30,16 @@ def create_admin_blueprint():
     # Since we're a sub-blueprint, we use parent's template_folder via full paths
     admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+    def is_admin():
+        """True if the session is logged in as an admin of this request's tenant"""
+        if not session.get('admin_logged_in'):
+            return False
+        # A login on one school's shard is not valid on another's
+        return session.get('admin_tenant') == (shards.current_tenant() if shards.enabled else None)
+
     def require_admin():
         """Decorator to require admin authentication"""
-        if not session.get('admin_logged_in'):
+        if not is_admin():
             return redirect(url_for('bellringers.admin.login'))
         return None
 
@@ -32,6 +57,7 @@ def create_admin_blueprint():
                 if db.verify_admin(username, password_hash):
                     session['admin_logged_in'] = True
                     session['admin_username'] = username
+                    session['admin_tenant'] = shards.current_tenant() if shards.enabled else None
 
                     if request.is_json:
                         return jsonify({'success': True})
@@ -50,6 +76,7 @@ def create_admin_blueprint():
         """Admin logout"""
         session.pop('admin_logged_in', None)
         session.pop('admin_username', None)
+        session.pop('admin_tenant', None)
         return redirect(url_for('bellringers.admin.login'))
 
     @admin_bp.route('/dashboard')
@@ -63,49 +90,219 @@ def create_admin_blueprint():
         summary = db.get_activity_summary()
         user_stats = db.get_user_statistics()
 
+        # Every loaded standard, including those with nothing aligned yet
+        coverage = db.get_standard_coverage()
+        standard_coverage = []
+        for code, description in standards.get_standards_list():
+            if code == 'None':
+                continue
+            row = coverage.get(code)
+            standard_coverage.append({
+                'code': code,
+                'description': description,
+                'bell_ringers': row['bell_ringers'] if row else 0,
+                'published': row['published'] if row else 0,
+            })
+
         return render_template('bellringers/admin/dashboard.html',
                              summary=summary,
-                             user_stats=user_stats)
+                             user_stats=user_stats,
+                             standard_coverage=standard_coverage,
+                             generation_costs=db.get_generation_costs(COST_REPORT_DAYS),
+                             cost_report_days=COST_REPORT_DAYS)
 
     @admin_bp.route('/content')
     def content():
-        """Admin content management page"""
+        """Admin content management page - paginated, filterable moderation queue"""
         redirect_response = require_admin()
         if redirect_response:
             return redirect_response
 
-        # Get pending approvals
-        pending = db.get_pending_approvals()
+        filters = {
+            'status': request.args.get('status', 'pending'),
+            'topic': request.args.get('topic', ''),
+            'format': request.args.get('format', ''),
+            'owner': request.args.get('owner', '').strip(),
+            'age': request.args.get('age', ''),
+        }
+        page = request.args.get('page', 1, type=int)
 
-        # Get all public bell ringers
-        all_public = db.get_public_feed('new')
+        items, total = db.get_moderation_queue(
+            status=filters['status'],
+            topic=filters['topic'] or None,
+            format_type=filters['format'] or None,
+            owner=filters['owner'] or None,
+            max_age_days=int(filters['age']) if filters['age'].isdigit() else None,
+            page=page,
+            per_page=QUEUE_PAGE_SIZE
+        )
+        total_pages = max((total + QUEUE_PAGE_SIZE - 1) // QUEUE_PAGE_SIZE, 1)
 
         return render_template('bellringers/admin/content.html',
-                             pending=pending,
-                             all_public=all_public)
+                             items=items,
+                             total=total,
+                             page=page,
+                             total_pages=total_pages,
+                             filters=filters,
+                             summary=db.get_activity_summary(),
+                             topics=gemini_api.get_topic_options(),
+                             formats=gemini_api.get_format_options())
 
     @admin_bp.route('/api/approve/<int:bell_ringer_id>', methods=['POST'])
     def approve(bell_ringer_id):
         """Approve a bell ringer for public display"""
-        if not session.get('admin_logged_in'):
+        if not is_admin():
             return jsonify({'error': 'Unauthorized'}), 401
 
         try:
             db.approve_bell_ringer(bell_ringer_id)
+            similarity.expire()
             return jsonify({'success': True})
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+    @admin_bp.route('/api/content/<int:bell_ringer_id>')
+    def bell_ringer_content(bell_ringer_id):
+        """Full content of a bell ringer in the moderation queue, loaded on expand"""
+        if not is_admin():
+            return jsonify({'error': 'Unauthorized'}), 401
+
+        bell_ringer = db.get_bell_ringer(bell_ringer_id)
+        if not bell_ringer:
+            return jsonify({'error': 'Bell ringer not found'}), 404
+
+        return content_response(bell_ringer)
+
     @admin_bp.route('/api/delete/<int:bell_ringer_id>', methods=['POST'])
     def delete(bell_ringer_id):
         """Delete a bell ringer"""
-        if not session.get('admin_logged_in'):
+        if not is_admin():
             return jsonify({'error': 'Unauthorized'}), 401
 
         try:
             db.delete_bell_ringer(bell_ringer_id)
+            similarity.expire()
             return jsonify({'success': True})
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+    def parse_bulk_ids():
+        """Read a list of bell ringer ids from a bulk action request body"""
+        data = request.get_json(silent=True) or {}
+        ids = data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            return None, 'No ids provided'
+        if len(ids) > MAX_BULK_IDS:
+            return None, f'Too many ids (max {MAX_BULK_IDS})'
+        try:
+            return sorted({int(i) for i in ids}), None
+        except (TypeError, ValueError):
+            return None, 'Invalid id in list'
+
+    @admin_bp.route('/api/bulk-approve', methods=['POST'])
+    def bulk_approve():
+        """Approve a list of bell ringers in one transaction"""
+        if not is_admin():
+            return jsonify({'error': 'Unauthorized'}), 401
+
+        ids, error = parse_bulk_ids()
+        if error:
+            return jsonify({'error': error}), 400
+
+        try:
+            count = db.approve_bell_ringers(ids)
+            similarity.expire()
+            return jsonify({'success': True, 'ids': ids, 'count': count})
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    @admin_bp.route('/api/bulk-delete', methods=['POST'])
+    def bulk_delete():
+        """Delete a list of bell ringers in one transaction"""
+        if not is_admin():
+            return jsonify({'error': 'Unauthorized'}), 401
+
+        ids, error = parse_bulk_ids()
+        if error:
+            return jsonify({'error': error}), 400
+
+        try:
+            count = db.delete_bell_ringers(ids)
+            similarity.expire()
+            return jsonify({'success': True, 'ids': ids, 'count': count})
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    @admin_bp.route('/api/export/<dataset>')
+    def export(dataset):
+        """Stream the public corpus or an activity log date range as NDJSON or CSV"""
+        if not is_admin():
+            return jsonify({'error': 'Unauthorized'}), 401
+
+        fmt = request.args.get('format', 'ndjson')
+        if fmt not in transfer.FORMATS:
+            return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+
+        if dataset == 'public':
+            lines = transfer.export_public_corpus(fmt)
+        elif dataset == 'activity':
+            lines = transfer.export_activity_logs(request.args.get('start'), request.args.get('end'), fmt)
+        else:
+            return jsonify({'error': f'Unknown dataset: {dataset}'}), 404
+
+        return Response(
+            stream_with_context(lines),
+            mimetype=transfer.MIMETYPES[fmt],
+            headers={'Content-Disposition': f'attachment; filename={dataset}.{fmt}'}
+        )
+
+    @admin_bp.route('/api/import', methods=['POST'])
+    def bulk_import():
+        """Bulk import bell ringers from an uploaded NDJSON or CSV file"""
+        if not is_admin():
+            return jsonify({'error': 'Unauthorized'}), 401
+
+        upload = request.files.get('file')
+        if not upload:
+            return jsonify({'error': 'No file provided'}), 400
+
+        fmt = request.form.get('format') or transfer.guess_format(upload.filename)
+        chunk_size = request.form.get('chunk_size', transfer.DEFAULT_CHUNK_SIZE, type=int)
+
+        try:
+            lines = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+            stats = transfer.import_bell_ringers(lines, fmt, chunk_size, request.form.get('owner') or None)
+            return jsonify({'success': True, **stats})
+        except transfer.ImportFailed as e:
+            # Earlier chunks stay committed, so re-uploading the whole file would duplicate them
+            return jsonify({'error': str(e), 'rows': e.rows, 'line': e.line}), 400
+        except (ValueError, KeyError) as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    @admin_bp.route('/metrics')
+    def prometheus_metrics():
+        """Prometheus text endpoint (admin session or METRICS_TOKEN bearer token)"""
+        token = current_app.config.get('METRICS_TOKEN')
+        auth_header = request.headers.get('Authorization', '')
+        token_ok = bool(token) and hmac.compare_digest(auth_header, f'Bearer {token}')
+
+        if not (is_admin() or token_ok):
+            return jsonify({'error': 'Unauthorized'}), 401
+
+        return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+    @admin_bp.route('/api/query-stats')
+    def query_stats():
+        """Aggregated per-statement SQL timings (requires DB_PROFILE); ?reset=1 clears them"""
+        if not is_admin():
+            return jsonify({'error': 'Unauthorized'}), 401
+
+        stats = profiler.get_statement_stats()
+        if request.args.get('reset'):
+            profiler.reset_statement_stats()
+
+        return jsonify({'enabled': profiler.enabled, 'statements': stats})
+
     return admin_bp
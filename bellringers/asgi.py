@@ -0,0 +1,230 @@
+"""
+ASGI entry point for Bell Ringers with a native async generation endpoint
+
+A synchronous Flask view holds a worker thread for the whole Gemini call,
+so in-flight generations are capped at the thread count. This wrapper
+serves POST /bellringers/api/generate as a coroutine instead: the Gemini
+call awaits the SDK's async API on the event loop and the short database
+writes run in a small thread pool. Every other request is passed to the
+Flask app unchanged through asgiref's WsgiToAsgi adapter. Generations
+share the Flask path's per-user rate limits and have their own, larger
+in-flight limit (ASYNC_GENERATE_MAX_CONCURRENT; see bellringers.limits).
+
+Usage (e.g. with uvicorn), in a module next to app.py:
+    from app import app
+    from bellringers.asgi import create_asgi_app
+    application = create_asgi_app(app)
+"""
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.http import parse_cookie
+
+from . import database as db
+from . import gemini_api
+from . import limits
+from . import metrics
+from . import shards
+from . import similarity
+from .config import Config
+
+
+GENERATE_PATH = '/bellringers/api/generate'
+
+
+def create_asgi_app(flask_app, db_workers=None):
+    """Wrap a Flask app that has the bellringers blueprint registered
+
+    Args:
+        flask_app: The host Flask application
+        db_workers: Threads for database work (default: Config.ASYNC_DB_WORKERS)
+
+    Returns:
+        An ASGI application callable
+    """
+    return BellRingersASGI(flask_app, db_workers or flask_app.config.get('ASYNC_DB_WORKERS',
+                                                                        Config.ASYNC_DB_WORKERS))
+
+
+class BellRingersASGI:
+    """ASGI app: async generation, everything else delegated to Flask"""
+
+    def __init__(self, flask_app, db_workers):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.executor = ThreadPoolExecutor(max_workers=db_workers, thread_name_prefix='bellringers-db')
+        config = flask_app.config
+        max_concurrent = config.get('ASYNC_GENERATE_MAX_CONCURRENT', Config.ASYNC_GENERATE_MAX_CONCURRENT)
+        self.admission = limits.AsyncAdmissionController(
+            max_concurrent,
+            config.get('GENERATE_MAX_QUEUE', Config.GENERATE_MAX_QUEUE),
+            config.get('GENERATE_QUEUE_TIMEOUT', Config.GENERATE_QUEUE_TIMEOUT)) if max_concurrent else None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['path'] == GENERATE_PATH and scope['method'] == 'POST':
+            await self.generate(scope, receive, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        """Start up immediately; shut the database thread pool down on exit"""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def run_db(self, fn, *args):
+        """Run a blocking database call in the thread pool"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def generate(self, scope, receive, send):
+        """Async equivalent of routes.generate (same request and response JSON)"""
+        started = time.perf_counter()
+        headers = []
+        try:
+            status, payload = await self.handle_generate(scope, receive)
+        except limits.Rejected as rejected:
+            limits.record_rejection(rejected, 'async')
+            status, payload = rejected.status, {'error': rejected.message}
+            headers.append((b'retry-after', str(rejected.retry_after).encode('ascii')))
+
+        body = json.dumps(payload).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'),
+                        (b'content-length', str(len(body)).encode('ascii'))] + headers,
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+        labels = {'endpoint': 'bellringers.generate'}
+        metrics.inc('bellringers_requests_total', dict(labels, method='POST', status=str(status)))
+        metrics.observe('bellringers_request_duration_seconds', time.perf_counter() - started, labels)
+        metrics.flush(force=False)
+
+    async def handle_generate(self, scope, receive):
+        """Return (status, JSON payload) for a generation request
+
+        Raises:
+            limits.Rejected: Over the user's rate limit, or no generation slot free
+        """
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                   for name, value in scope['headers']}
+        session = self.load_session(headers)
+        user_handle = session.get('user_handle')
+        if not user_handle:
+            return 401, {'error': 'No user session'}
+
+        # Like the blueprint's shard selection: only provisioned tenants are served
+        tenant = None
+        if shards.enabled:
+            tenant = shards.tenant_from_host(
+                headers.get('host'), headers.get(shards.tenant_header.lower()) if shards.tenant_header else None)
+            if await self.run_db(shards.ensure_shard, tenant) is None:
+                return 404, {'error': 'Unknown tenant'}
+
+        try:
+            data = json.loads(await read_body(receive) or b'{}')
+        except ValueError:
+            return 400, {'error': 'Invalid JSON'}
+
+        topic = data.get('topic')
+        format_type = data.get('format')
+        constraint = data.get('constraint')
+        prompt = data.get('prompt', '')
+        standard_codes = data.get('standards', [])
+
+        try:
+            # A matching feed item needs no Gemini call (and so no rate limit or slot)
+            generation = None
+            if similarity.reuse_threshold > 0 and not data.get('fresh'):
+                generation = await self.run_db(similarity.reuse, topic, format_type, constraint,
+                                               standard_codes, prompt)
+            if generation is None:
+                key = limits.user_key(user_handle, session.get('user_tenant'))
+                if limits.rate_limiter is not None and limits.rate_limiter.shared:
+                    await self.run_db(limits.check_rate, key)
+                else:
+                    limits.check_rate(key)
+
+                generation = await gemini_api.generate_async(
+                    topic, format_type, constraint, standard_codes, prompt,
+                    slot=self.admission.slot if self.admission else nullcontext)
+            await self.run_db(log_generation, session, tenant, (topic, format_type, constraint), generation)
+        except limits.Rejected:
+            raise
+        except Exception as e:
+            return 500, {'error': str(e)}
+
+        return 200, {
+            'success': True,
+            'content': generation['content'],
+            'topic': topic,
+            'format': format_type,
+            'constraint': constraint,
+            'standards': standard_codes,
+            'source': generation['source'],
+            'similar_id': generation.get('similar_id')
+        }
+
+    def load_session(self, headers):
+        """Decode the Flask session cookie (an empty dict if missing or invalid)"""
+        app = self.flask_app
+        serializer = app.session_interface.get_signing_serializer(app)
+        if serializer is None:
+            return {}
+        cookie = parse_cookie(headers.get('cookie', '')).get(app.config['SESSION_COOKIE_NAME'])
+        if not cookie:
+            return {}
+        try:
+            return serializer.loads(cookie, max_age=int(app.permanent_session_lifetime.total_seconds()))
+        except Exception:
+            return {}
+
+
+async def read_body(receive):
+    """Read the full request body from the ASGI receive channel"""
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+def log_generation(session, tenant, slots, generation):
+    """Log a generation and touch last_active (runs in the database thread pool)
+
+    Mirrors the blueprint's shard selection and session handle resolution,
+    since this request never goes through Flask's before_request hooks.
+
+    Args:
+        tenant: The request's (provisioned) tenant, or None without sharding
+        slots: (topic, format, constraint) of the request
+        generation: Result dict from gemini_api.generate_async()
+    """
+    if not shards.enabled:
+        return _log_generation(session, None, slots, generation)
+
+    with db.use_database(shards.ensure_shard(tenant)):
+        return _log_generation(session, tenant, slots, generation)
+
+
+def _log_generation(session, tenant, slots, generation):
+    user_id = session.get('user_id') if session.get('user_tenant') == tenant else None
+    if user_id is None or not db.update_last_active(user_id):
+        user_id = db.get_or_create_user(session['user_handle'])
+    db.log_generation(user_id, *slots, generation)
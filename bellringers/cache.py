@@ -0,0 +1,160 @@
+"""
+In-process caches for Bell Ringers
+Binder pages are cached per user as plain row dicts in a bounded LRU that
+counts the approximate memory of what it holds. Entries are tagged with the
+user's binder_version (bumped by every write that changes what the binder
+page shows), so a version mismatch is a miss and nothing is ever served stale.
+The version and the user's created_at also form the binder page's ETag.
+"""
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from . import metrics
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache bounded by total size in bytes"""
+
+    def __init__(self, max_bytes, max_entry_bytes=None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 8
+        self.bytes = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached value (marking it recently used) or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, size):
+        """Store a value; returns False if it is too large to cache"""
+        if size > self.max_entry_bytes:
+            self.discard(key)
+            return False
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+        return True
+
+    def discard(self, key):
+        """Remove a key if present"""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+
+    def clear(self):
+        """Remove everything"""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Entry count and memory use"""
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.bytes,
+                    'max_bytes': self.max_bytes, 'evictions': self.evictions}
+
+
+def estimate_row_size(row):
+    """Approximate memory held by one cached row dict"""
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+
+
+# Binder rows per (database path, user id); sized by configure()
+binder_cache = None
+
+DEFAULT_BINDER_CACHE_BYTES = 32 * 1024 * 1024
+
+_TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), 'templates', 'bellringers')
+_template_version = None
+
+
+def configure(max_bytes=DEFAULT_BINDER_CACHE_BYTES):
+    """Create the binder cache (0 disables it)"""
+    global binder_cache
+    binder_cache = LRUCache(max_bytes) if max_bytes else None
+
+
+def template_version():
+    """Short hash of the template files, so a deploy changes every ETag"""
+    global _template_version
+    if _template_version is None:
+        digest = hashlib.sha1()
+        for root, _, filenames in sorted(os.walk(_TEMPLATES_DIR)):
+            for filename in sorted(filenames):
+                stat = os.stat(os.path.join(root, filename))
+                digest.update(f'{filename}:{stat.st_mtime_ns}:{stat.st_size};'.encode())
+        _template_version = digest.hexdigest()[:8]
+    return _template_version
+
+
+def user_stamp(user_id, user):
+    """Short id for a user that changes if the id is reused after a database reset
+
+    Args:
+        user_id: The user's id
+        user: Dict with created_at (from database.touch_user)
+    """
+    return hashlib.sha1(f"{user_id}:{user['created_at']}".encode()).hexdigest()[:8]
+
+
+def binder_etag(user_id, user):
+    """ETag for a user's binder page
+
+    Args:
+        user_id: The user's id
+        user: Dict with binder_version and created_at (from database.touch_user)
+    """
+    return f"binder-{user_stamp(user_id, user)}-{user['binder_version']}-{template_version()}"
+
+
+def get_binder(db_path, user_id, version):
+    """Cached binder rows for this version of the user's binder, or None"""
+    if binder_cache is None:
+        return None
+    entry = binder_cache.get((db_path, user_id))
+    hit = entry is not None and entry[0] == version
+    metrics.record_cache_lookup('binder', hit)
+    return entry[1] if hit else None
+
+
+def cache_binder_rows(db_path, user_id, version, rows):
+    """Yield rows (e.g. from a streaming cursor) and cache them once all were read
+
+    Nothing is cached if the consumer stops early or the binder is too big.
+    """
+    if binder_cache is None:
+        yield from rows
+        return
+
+    collected = []
+    size = 0
+    for row in rows:
+        row = dict(row)
+        size += estimate_row_size(row)
+        # Keep streaming, but stop collecting once the entry can't be cached anyway
+        if collected is not None:
+            collected.append(row)
+            if size > binder_cache.max_entry_bytes:
+                collected = None
+        yield row
+
+    if collected is not None:
+        binder_cache.put((db_path, user_id), (version, tuple(collected)), size)
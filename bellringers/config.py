@@ -12,3 +12,80 @@ class Config:
     # Admin defaults (change these!)
     DEFAULT_ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME', 'admin')
     DEFAULT_ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'changeme123')
+
+    # Activity log retention: raw rows older than this many days are rolled up
+    # into daily counts by the maintenance job (python -m bellringers.maintenance)
+    ACTIVITY_RETENTION_DAYS = int(os.environ.get('ACTIVITY_RETENTION_DAYS', '90'))
+    ACTIVITY_ROLLUP_BATCH_SIZE = int(os.environ.get('ACTIVITY_ROLLUP_BATCH_SIZE', '5000'))
+
+    # Metrics: directory shared by all worker processes for snapshot files
+    # (leave empty for single-process deployments), and an optional bearer
+    # token that lets a Prometheus scraper read /bellringers/admin/metrics
+    METRICS_DIR = os.environ.get('METRICS_DIR', '')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+    # SQL profiling (off by default): per-statement timing, slow query log with
+    # EXPLAIN QUERY PLAN, and per-request X-DB-* response headers
+    DB_PROFILE = os.environ.get('DB_PROFILE', '').lower() in ('1', 'true', 'yes')
+    DB_SLOW_QUERY_MS = float(os.environ.get('DB_SLOW_QUERY_MS', '100'))
+
+    # Write serialization (off by default): one writer thread per process and
+    # database file runs all writes, committing up to DB_WRITE_MAX_BATCH queued
+    # writes per transaction and retrying DB_WRITE_BUSY_RETRIES times (with
+    # jittered backoff) while another process holds the database lock
+    DB_WRITE_QUEUE = os.environ.get('DB_WRITE_QUEUE', '').lower() in ('1', 'true', 'yes')
+    DB_WRITE_MAX_BATCH = int(os.environ.get('DB_WRITE_MAX_BATCH', '64'))
+    DB_WRITE_BUSY_RETRIES = int(os.environ.get('DB_WRITE_BUSY_RETRIES', '8'))
+
+    # Sharding for multi-school deployments: one SQLite file per tenant, picked
+    # from the request host (or SHARD_TENANT_HEADER, when a trusted proxy sets it)
+    SHARDING_ENABLED = os.environ.get('SHARDING_ENABLED', '').lower() in ('1', 'true', 'yes')
+    SHARD_DIR = os.environ.get('SHARD_DIR', os.path.join(os.path.dirname(__file__), 'shards'))
+    SHARD_TENANT_HEADER = os.environ.get('SHARD_TENANT_HEADER', '')
+
+    # Compiled Jinja templates are kept here so recycled workers skip recompiling
+    # them (set to an empty string to disable)
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR',
+                                        os.path.join(os.path.dirname(__file__), 'template_cache'))
+
+    # Standards frameworks: every *.md file in STANDARDS_DIR is loaded into a
+    # searchable SQLite catalog, rebuilt at startup when the files change
+    STANDARDS_DIR = os.environ.get('STANDARDS_DIR', os.path.join(os.path.dirname(__file__), 'standards'))
+    STANDARDS_CATALOG_PATH = os.environ.get('STANDARDS_CATALOG_PATH',
+                                            os.path.join(os.path.dirname(__file__), 'standards_catalog.db'))
+
+    # Threads for database work on the async generation path (bellringers.asgi)
+    ASYNC_DB_WORKERS = int(os.environ.get('ASYNC_DB_WORKERS', '8'))
+
+    # Per-process binder page cache size in bytes (0 disables it)
+    BINDER_CACHE_BYTES = int(os.environ.get('BINDER_CACHE_BYTES', str(32 * 1024 * 1024)))
+
+    # Days binder removals are kept for offline sync; older clients resync fully
+    BINDER_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('BINDER_TOMBSTONE_RETENTION_DAYS', '30'))
+
+    # Generation limits per worker process: generations in flight, how many more
+    # may wait for a slot and for how long (seconds) before getting a 503
+    GENERATE_MAX_CONCURRENT = int(os.environ.get('GENERATE_MAX_CONCURRENT', '4'))
+    GENERATE_MAX_QUEUE = int(os.environ.get('GENERATE_MAX_QUEUE', '8'))
+    GENERATE_QUEUE_TIMEOUT = float(os.environ.get('GENERATE_QUEUE_TIMEOUT', '15'))
+    # The async path (bellringers.asgi) doesn't tie up threads, so it can allow more
+    ASYNC_GENERATE_MAX_CONCURRENT = int(os.environ.get('ASYNC_GENERATE_MAX_CONCURRENT', '100'))
+
+    # Gemini calls are retried this many times after a failure, waiting about
+    # GEMINI_RETRY_BACKOFF seconds (doubling each time); token prices (USD per
+    # million tokens) are used for the admin dashboard's cost views
+    GEMINI_MAX_RETRIES = int(os.environ.get('GEMINI_MAX_RETRIES', '2'))
+    GEMINI_RETRY_BACKOFF = float(os.environ.get('GEMINI_RETRY_BACKOFF', '1.0'))
+    GEMINI_INPUT_PRICE_PER_MILLION = float(os.environ.get('GEMINI_INPUT_PRICE_PER_MILLION', '0.10'))
+    GEMINI_OUTPUT_PRICE_PER_MILLION = float(os.environ.get('GEMINI_OUTPUT_PRICE_PER_MILLION', '0.40'))
+
+    # Serve an existing feed item instead of calling Gemini when one has the
+    # requested topic, format, constraint and standards and contains at least
+    # this share (0-1) of the prompt's terms; 0 disables reuse
+    SIMILAR_REUSE_THRESHOLD = float(os.environ.get('SIMILAR_REUSE_THRESHOLD', '0'))
+
+    # Generations per handle: sustained rate per minute and burst size (0 disables),
+    # kept in memory or in a SQLite file shared by all worker processes
+    GENERATE_RATE_PER_MINUTE = float(os.environ.get('GENERATE_RATE_PER_MINUTE', '6'))
+    GENERATE_BURST = int(os.environ.get('GENERATE_BURST', '10'))
+    RATE_LIMIT_DB = os.environ.get('RATE_LIMIT_DB', '')
@@ -1,19 +1,138 @@
 """
 Database module for Bell Ringers app using SQLite3
 """
+import math
 import sqlite3
 import os
-from datetime import datetime
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
 from contextlib import contextmanager
 
+from . import excerpts
+from . import metrics
+from . import profiler
+from . import writer
+
 DB_PATH = os.path.join(os.path.dirname(__file__), 'bellringers.db')
 
+# Shared public catalog (sharding mode only); the feed reads from here when set
+CATALOG_PATH = None
+
+# Reuse one connection per thread and database file (enabled in sharding mode)
+CACHE_CONNECTIONS = False
+
+# Database file for the current request or job, when it isn't DB_PATH
+_current_db_path = ContextVar('bellringers_db_path', default=None)
+
+_connection_cache = threading.local()
+
+# "Hot" feed ranking: log10(1 + binder adds) plus age credit. An item this many
+# seconds newer ranks like one with ~10x the binder adds, so the score decays
+# relative to newer items without ever being recomputed.
+HOT_SCORE_DECAY_SECONDS = 2 * 24 * 60 * 60
+HOT_SCORE_EPOCH = datetime(2024, 1, 1)
+
+
+def current_db_path():
+    """Path of the database the current request or job should use"""
+    return _current_db_path.get() or DB_PATH
+
+
+def set_db_path(path):
+    """Point get_db() at another database file; returns a token for reset_db_path()"""
+    return _current_db_path.set(path)
+
+
+def reset_db_path(token):
+    """Undo a set_db_path() call"""
+    _current_db_path.reset(token)
+
 
 @contextmanager
-def get_db():
-    """Context manager for database connections"""
-    conn = sqlite3.connect(DB_PATH, timeout=10.0, check_same_thread=False)
+def use_database(path):
+    """Run a block of database calls against another database file"""
+    token = set_db_path(path)
+    try:
+        yield
+    finally:
+        reset_db_path(token)
+
+
+def hot_score(binder_count, created_at):
+    """Time-decayed popularity score (registered as the SQL function hot_score)
+
+    Args:
+        binder_count: Number of binders the bell ringer is in
+        created_at: SQLite timestamp string ('YYYY-MM-DD HH:MM:SS', UTC)
+    """
+    try:
+        created = datetime.fromisoformat(str(created_at))
+    except ValueError:
+        created = HOT_SCORE_EPOCH
+    if created.tzinfo is not None:
+        created = created.astimezone(timezone.utc).replace(tzinfo=None)
+    age_credit = (created - HOT_SCORE_EPOCH).total_seconds()
+    return round(math.log10(1 + max(binder_count or 0, 0)) + age_credit / HOT_SCORE_DECAY_SECONDS, 7)
+
+
+def _connect(path, read_only=False):
+    """Open a new connection"""
+    factory = profiler.ProfilingConnection if profiler.enabled else sqlite3.Connection
+    if read_only:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, timeout=10.0,
+                               check_same_thread=False, factory=factory)
+    else:
+        conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False, factory=factory)
     conn.row_factory = sqlite3.Row
+    conn.create_function('hot_score', 2, hot_score, deterministic=True)
+    return conn
+
+
+def _checkout(path, read_only):
+    """Take this thread's cached connection for path, or None if it is busy"""
+    if not hasattr(_connection_cache, 'connections'):
+        _connection_cache.connections = {}
+        _connection_cache.in_use = set()
+
+    key = (path, read_only)
+    if key in _connection_cache.in_use:
+        return None  # Nested use (e.g. a streaming cursor is still open)
+
+    conn = _connection_cache.connections.get(key)
+    if conn is None:
+        conn = _connection_cache.connections[key] = _connect(path, read_only)
+    _connection_cache.in_use.add(key)
+    return conn
+
+
+def close_cached_connections():
+    """Close this thread's cached connections (e.g. before vacuuming a shard)"""
+    for conn in getattr(_connection_cache, 'connections', {}).values():
+        conn.close()
+    _connection_cache.connections = {}
+    _connection_cache.in_use = set()
+
+
+@contextmanager
+def get_db(path=None, read_only=False):
+    """Context manager for database connections
+
+    Args:
+        path: Database file (defaults to the current request's database)
+        read_only: Open the file read-only
+    """
+    started = time.perf_counter()
+    path = path or current_db_path()
+    key = (path, read_only)
+
+    conn = _checkout(path, read_only) if CACHE_CONNECTIONS else None
+    cached = conn is not None
+    if not cached:
+        conn = _connect(path, read_only)
+    profiler.record_checkout()
+
     try:
         yield conn
         conn.commit()
@@ -21,29 +140,74 @@ def get_db():
         conn.rollback()
         raise e
     finally:
-        conn.close()
+        if isinstance(conn, profiler.ProfilingConnection):
+            conn.finish()
+        if cached:
+            _connection_cache.in_use.discard(key)
+        else:
+            conn.close()
+        metrics.record_db_time(time.perf_counter() - started)
 
 
-def init_db():
-    """Initialize the database with all required tables"""
-    with get_db() as conn:
+def _write(fn, path=None):
+    """Run fn(cursor) in a write transaction and return its result
+
+    With the write queue enabled (DB_WRITE_QUEUE), fn runs on this process's
+    writer thread for the database, batched with other writes (see writer.py).
+    Otherwise it runs here, in its own get_db() transaction. Either way an
+    exception from fn rolls back its writes and is raised here.
+
+    Args:
+        fn: Callable taking a cursor; must not commit or keep the cursor
+        path: Database file (defaults to the current request's database)
+    """
+    path = path or current_db_path()
+    if not writer.enabled():
+        with get_db(path) as conn:
+            return fn(conn.cursor())
+
+    started = time.perf_counter()
+    try:
+        return writer.run(path, fn)
+    finally:
+        metrics.record_db_time(time.perf_counter() - started)
+
+
+def init_db(path=None):
+    """Initialize the database with all required tables
+
+    Args:
+        path: Database file to initialize (defaults to the current database)
+    """
+    with get_db(path) as conn:
         cursor = conn.cursor()
 
+        # Let retention free pages without a full VACUUM (only applies to new databases;
+        # see enable_incremental_vacuum() for existing ones)
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        # Streamed pages and exports read through an open cursor until the last row
+        # is sent; in WAL mode that reader doesn't block writers (or they it)
+        cursor.execute('PRAGMA journal_mode = WAL')
+
         # Users table (anonymous handles)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS users (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 handle TEXT UNIQUE NOT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                binder_version INTEGER NOT NULL DEFAULT 0
             )
         ''')
 
+        # Tables from older versions keyed users by handle; set them aside to rebuild below
+        legacy_tables = _rename_legacy_user_tables(cursor)
+
         # Bell ringers table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS bell_ringers (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                owner_handle TEXT NOT NULL,
+                owner_id INTEGER NOT NULL,
                 topic TEXT NOT NULL,
                 format TEXT NOT NULL,
                 constraint_type TEXT NOT NULL,
@@ -52,7 +216,11 @@ def init_db():
                 is_approved BOOLEAN DEFAULT 0,
                 binder_count INTEGER DEFAULT 0,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (owner_handle) REFERENCES users(handle)
+                hot_score REAL NOT NULL DEFAULT 0,
+                approved_at TIMESTAMP,
+                excerpt TEXT NOT NULL DEFAULT '',
+                sections TEXT NOT NULL DEFAULT '[]',
+                FOREIGN KEY (owner_id) REFERENCES users(id)
             )
         ''')
 
@@ -60,11 +228,44 @@ def init_db():
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS activity_logs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_handle TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
                 action_type TEXT NOT NULL,
                 details TEXT,
                 timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_handle) REFERENCES users(handle)
+                FOREIGN KEY (user_id) REFERENCES users(id)
+            )
+        ''')
+
+        # One row per generation: token usage, cost and upstream latency (admin dashboard)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS generation_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                topic TEXT,
+                format TEXT,
+                constraint_type TEXT,
+                model TEXT NOT NULL,
+                source TEXT NOT NULL,
+                prompt_tokens INTEGER,
+                response_tokens INTEGER,
+                latency_ms INTEGER NOT NULL,
+                retries INTEGER NOT NULL DEFAULT 0,
+                cost REAL NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id)
+            )
+        ''')
+
+        # Daily activity counts for logs past the retention window
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS activity_rollups (
+                user_id INTEGER NOT NULL,
+                action_type TEXT NOT NULL,
+                day DATE NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, action_type, day),
+                FOREIGN KEY (user_id) REFERENCES users(id)
             )
         ''')
 
@@ -82,142 +283,835 @@ def init_db():
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS binder_items (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_handle TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
                 bell_ringer_id INTEGER NOT NULL,
                 original_id INTEGER,
+                catalog_id INTEGER,
                 added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_handle) REFERENCES users(handle),
+                FOREIGN KEY (user_id) REFERENCES users(id),
                 FOREIGN KEY (bell_ringer_id) REFERENCES bell_ringers(id),
-                UNIQUE(user_handle, bell_ringer_id)
+                UNIQUE(user_id, bell_ringer_id)
             )
         ''')
 
+        # Binder items removed by deletes, so offline clients can sync removals
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS binder_tombstones (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                bell_ringer_id INTEGER NOT NULL,
+                removed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id)
+            )
+        ''')
+
+        # Standards each bell ringer is aligned to (codes like "2.3.5", domain "2")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS bell_ringer_standards (
+                bell_ringer_id INTEGER NOT NULL,
+                standard_code TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                PRIMARY KEY (bell_ringer_id, standard_code),
+                FOREIGN KEY (bell_ringer_id) REFERENCES bell_ringers(id)
+            ) WITHOUT ROWID
+        ''')
+
+        # Bell ringers per standard, kept up to date by every write (admin dashboard)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS standard_coverage (
+                standard_code TEXT PRIMARY KEY,
+                domain TEXT NOT NULL,
+                bell_ringers INTEGER NOT NULL DEFAULT 0,
+                published INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+
+        # Schema upgrades for databases created by older versions
+        _copy_legacy_user_tables(cursor, legacy_tables)
+        # Rows copied from a legacy table got the new columns' defaults, not computed values
+        bell_ringers_rebuilt = 'bell_ringers' in legacy_tables
+        _add_column(cursor, 'binder_items', 'catalog_id', 'INTEGER')
+        _add_column(cursor, 'users', 'binder_version', 'INTEGER NOT NULL DEFAULT 0')
+        if _add_column(cursor, 'bell_ringers', 'hot_score', 'REAL NOT NULL DEFAULT 0') or bell_ringers_rebuilt:
+            cursor.execute('UPDATE bell_ringers SET hot_score = hot_score(binder_count, created_at)')
+        _add_column(cursor, 'bell_ringers', 'approved_at', 'TIMESTAMP')
+        excerpt_added = _add_column(cursor, 'bell_ringers', 'excerpt', "TEXT NOT NULL DEFAULT ''")
+        sections_added = _add_column(cursor, 'bell_ringers', 'sections', "TEXT NOT NULL DEFAULT '[]'")
+        if excerpt_added or sections_added or bell_ringers_rebuilt:
+            _backfill_summaries(cursor)
+
+        # Retention deletes old activity logs by timestamp
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_activity_logs_timestamp
+            ON activity_logs (timestamp)
+        ''')
+
+        # Cost views read a date range, overall and per user
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_generation_logs_created
+            ON generation_logs (created_at)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_generation_logs_user
+            ON generation_logs (user_id, created_at)
+        ''')
+
+        # Feed and moderation queue filter on visibility, newest first
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_bell_ringers_visibility
+            ON bell_ringers (is_public, is_approved, created_at)
+        ''')
+
+        # Deletes and approvals find every binder holding a bell ringer
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_binder_items_bell_ringer
+            ON binder_items (bell_ringer_id)
+        ''')
+
+        # Binder sync reads a user's recent removals; retention deletes old ones
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_binder_tombstones_user
+            ON binder_tombstones (user_id, removed_at)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_binder_tombstones_removed
+            ON binder_tombstones (removed_at)
+        ''')
+
+        # Feed and binder filters find bell ringers by standard or domain
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_bell_ringer_standards_code
+            ON bell_ringer_standards (standard_code, bell_ringer_id)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_bell_ringer_standards_domain
+            ON bell_ringer_standards (domain, bell_ringer_id)
+        ''')
+
+        # The "hot" feed reads this index in order instead of sorting the table
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_bell_ringers_hot
+            ON bell_ringers (is_public, is_approved, hot_score DESC)
+        ''')
+
         conn.commit()
 
 
-def create_user(handle):
-    """Create a new user with anonymous handle"""
-    with get_db() as conn:
+# Columns that referenced users(handle) before the move to integer user ids
+LEGACY_USER_COLUMNS = {
+    'bell_ringers': ('owner_handle', 'owner_id'),
+    'activity_logs': ('user_handle', 'user_id'),
+    'activity_rollups': ('user_handle', 'user_id'),
+    'binder_items': ('user_handle', 'user_id'),
+}
+
+
+def _table_columns(cursor, table):
+    """Map of column name to declared type ({} if the table doesn't exist)"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    return {row['name']: row['type'] for row in cursor.fetchall()}
+
+
+def _rename_legacy_user_tables(cursor):
+    """Rename tables that still key users by handle to <table>_legacy
+
+    Returns:
+        Names of the renamed tables
+    """
+    renamed = []
+    for table, (handle_column, _) in LEGACY_USER_COLUMNS.items():
+        if handle_column in _table_columns(cursor, table):
+            # Indexes follow the renamed table; drop them so the new table can reuse the names
+            cursor.execute('''
+                SELECT name FROM sqlite_master
+                WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL
+            ''', (table,))
+            for (index_name,) in cursor.fetchall():
+                cursor.execute(f'DROP INDEX {index_name}')
+            cursor.execute(f'ALTER TABLE {table} RENAME TO {table}_legacy')
+            renamed.append(table)
+    return renamed
+
+
+def _copy_legacy_user_tables(cursor, tables):
+    """Copy rows from renamed handle-keyed tables into the new tables, then drop them
+
+    Every handle is given a users row first, so no rows are lost to
+    handles that were never registered (e.g. imported owners).
+    """
+    for table in tables:
+        handle_column, _ = LEGACY_USER_COLUMNS[table]
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO users (handle)
+            SELECT DISTINCT {handle_column} FROM {table}_legacy
+        ''')
+
+    for table in tables:
+        handle_column, id_column = LEGACY_USER_COLUMNS[table]
+        legacy_columns = _table_columns(cursor, f'{table}_legacy')
+        columns = [column for column in legacy_columns if column != handle_column]
+        # Keep extra columns added outside init_db (e.g. the catalog's tenant and source_id)
+        for column in columns:
+            _add_column(cursor, table, column, legacy_columns[column])
+
+        cursor.execute(f'''
+            INSERT INTO {table} ({id_column}, {', '.join(columns)})
+            SELECT u.id, {', '.join(f'l.{column}' for column in columns)}
+            FROM {table}_legacy l
+            INNER JOIN users u ON u.handle = l.{handle_column}
+        ''')
+
+    for table in tables:
+        cursor.execute(f'DROP TABLE {table}_legacy')
+
+
+def _add_column(cursor, table, column, definition):
+    """Add a column to an existing table if an older schema lacks it
+
+    Returns:
+        True if the column was added
+    """
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column in {row['name'] for row in cursor.fetchall()}:
+        return False
+    cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return True
+
+
+def _backfill_summaries(cursor):
+    """Compute the excerpt and sections of bell ringers saved before they were stored"""
+    cursor.execute('SELECT id, content FROM bell_ringers')
+    rows = cursor.fetchall()
+    cursor.executemany('UPDATE bell_ringers SET excerpt = ?, sections = ? WHERE id = ?',
+                       [excerpts.summarize(row['content']) + (row['id'],) for row in rows])
+
+
+def init_catalog(path):
+    """Initialize the shared public catalog used by the feed in sharding mode
+
+    The catalog has the regular schema plus the tenant and source id of
+    every bell ringer, so merges can upsert rows in place, and the owner's
+    handle, since owner ids only mean something inside their own shard.
+    """
+    init_db(path)
+    with get_db(path) as conn:
         cursor = conn.cursor()
+        # Readers keep going while the merge job writes
+        cursor.execute('PRAGMA journal_mode = WAL')
+        _add_column(cursor, 'bell_ringers', 'tenant', 'TEXT')
+        _add_column(cursor, 'bell_ringers', 'source_id', 'INTEGER')
+        _add_column(cursor, 'bell_ringers', 'owner_handle', 'TEXT')
+        # Rows carried over by the integer key migration own catalog-local users rows
+        cursor.execute('''
+            UPDATE bell_ringers
+            SET owner_handle = (SELECT handle FROM users WHERE users.id = bell_ringers.owner_id)
+            WHERE owner_handle IS NULL
+        ''')
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_bell_ringers_source
+            ON bell_ringers (tenant, source_id)
+        ''')
+
+
+# Bell ringer rows with the owner's handle, for templates and exports
+BELL_RINGER_SELECT = '''
+    SELECT br.*, u.handle AS owner_handle FROM bell_ringers br
+    INNER JOIN users u ON u.id = br.owner_id
+'''
+
+# Everything list pages show: the excerpt and sections instead of the full content
+SUMMARY_COLUMNS = '''
+    br.id, br.owner_id, br.topic, br.format, br.constraint_type, br.excerpt, br.sections,
+    br.is_public, br.is_approved, br.binder_count, br.created_at, br.hot_score, br.approved_at
+'''
+
+BELL_RINGER_SUMMARY_SELECT = f'''
+    SELECT {SUMMARY_COLUMNS}, u.handle AS owner_handle FROM bell_ringers br
+    INNER JOIN users u ON u.id = br.owner_id
+'''
+
+
+def create_user(handle):
+    """Create a new user with anonymous handle
+
+    Returns:
+        The new user's id, or None if the handle is taken
+    """
+    def write(cursor):
         try:
             cursor.execute('INSERT INTO users (handle) VALUES (?)', (handle,))
-            log_activity(handle, 'user_created', 'New user registered', cursor=cursor)
-            return True
+            user_id = cursor.lastrowid
+            log_activity(user_id, 'user_created', 'New user registered', cursor=cursor)
+            return user_id
         except sqlite3.IntegrityError:
-            return False
+            return None
+
+    return _write(write)
 
 
 def user_exists(handle):
     """Check if a user exists"""
+    return get_user_id(handle) is not None
+
+
+def get_user_id(handle):
+    """Look up a user's id by handle (None if there is no such user)"""
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT id FROM users WHERE handle = ?', (handle,))
-        return cursor.fetchone() is not None
+        row = cursor.fetchone()
+        return row['id'] if row else None
 
 
-def update_last_active(handle):
-    """Update user's last active timestamp"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            'UPDATE users SET last_active = CURRENT_TIMESTAMP WHERE handle = ?',
-            (handle,)
-        )
+def get_or_create_user(handle):
+    """Return the id for a handle, creating the user if needed"""
+    return get_user_id(handle) or create_user(handle) or get_user_id(handle)
 
 
-def save_bell_ringer(owner_handle, topic, format_type, constraint, content, is_public=False):
-    """Save a bell ringer to the database"""
-    with get_db() as conn:
-        cursor = conn.cursor()
+def update_last_active(user_id):
+    """Update user's last active timestamp
+
+    Returns:
+        True if the user exists
+    """
+    return touch_user(user_id) is not None
+
+
+def touch_user(user_id):
+    """Update a user's last active timestamp and return their binder version
+
+    The version comes back from the same UPDATE (RETURNING), so per-request
+    session handling gets it without another query.
+
+    Returns:
+        Dict with binder_version and created_at, or None if there is no such user
+    """
+    def write(cursor):
+        cursor.execute('''
+            UPDATE users SET last_active = CURRENT_TIMESTAMP
+            WHERE id = ?
+            RETURNING binder_version, created_at
+        ''', (user_id,))
+        rows = cursor.fetchall()  # Step the statement to completion before commit
+        return dict(rows[0]) if rows else None
+
+    return _write(write)
+
+
+def _bump_binder_version(cursor, user_id):
+    """Invalidate cached copies of one user's binder"""
+    cursor.execute('UPDATE users SET binder_version = binder_version + 1 WHERE id = ?', (user_id,))
+
+
+def _bump_binder_versions_for_items(cursor, bell_ringer_ids):
+    """Invalidate cached binders of every user holding any of these bell ringers"""
+    cursor.executemany('''
+        UPDATE users SET binder_version = binder_version + 1
+        WHERE id IN (SELECT user_id FROM binder_items WHERE bell_ringer_id = ?)
+    ''', [(bell_ringer_id,) for bell_ringer_id in bell_ringer_ids])
+
+
+def _set_standards(cursor, bell_ringer_id, standards, published):
+    """Record a new bell ringer's standards and count it in standard_coverage"""
+    cursor.executemany('''
+        INSERT OR IGNORE INTO bell_ringer_standards (bell_ringer_id, standard_code, domain)
+        VALUES (?, ?, ?)
+    ''', [(bell_ringer_id, code, domain) for code, domain in standards])
+    _adjust_coverage(cursor, [(code, domain, 1, int(published)) for code, domain in standards])
+
+
+def _adjust_coverage(cursor, changes):
+    """Apply (code, domain, bell_ringers delta, published delta) changes to standard_coverage"""
+    cursor.executemany('''
+        INSERT INTO standard_coverage (standard_code, domain, bell_ringers, published)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (standard_code) DO UPDATE SET
+            bell_ringers = bell_ringers + excluded.bell_ringers,
+            published = published + excluded.published
+    ''', changes)
+
+
+def _item_standards(cursor, bell_ringer_ids, condition='1'):
+    """(code, domain, published) rows for the standards of these bell ringers"""
+    placeholders = ', '.join('?' for _ in bell_ringer_ids)
+    cursor.execute(f'''
+        SELECT s.standard_code, s.domain, (br.is_public = 1 AND br.is_approved = 1) AS published
+        FROM bell_ringer_standards s
+        INNER JOIN bell_ringers br ON br.id = s.bell_ringer_id
+        WHERE br.id IN ({placeholders}) AND {condition}
+    ''', list(bell_ringer_ids))
+    return cursor.fetchall()
+
+
+def save_bell_ringer(owner_id, topic, format_type, constraint, content, is_public=False, standards=()):
+    """Save a bell ringer to the database
+
+    Args:
+        standards: (code, domain) tuples it is aligned to (see standards.resolve_codes)
+    """
+    excerpt, sections = excerpts.summarize(content)
+
+    def write(cursor):
         cursor.execute('''
             INSERT INTO bell_ringers
-            (owner_handle, topic, format, constraint_type, content, is_public, is_approved)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (owner_handle, topic, format_type, constraint, content, is_public, 0 if is_public else 1))
+            (owner_id, topic, format, constraint_type, content, excerpt, sections, is_public, is_approved, hot_score)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, hot_score(0, CURRENT_TIMESTAMP))
+        ''', (owner_id, topic, format_type, constraint, content, excerpt, sections,
+              is_public, 0 if is_public else 1))
 
         bell_ringer_id = cursor.lastrowid
 
         # Add to user's binder
         cursor.execute('''
-            INSERT INTO binder_items (user_handle, bell_ringer_id)
+            INSERT INTO binder_items (user_id, bell_ringer_id)
             VALUES (?, ?)
-        ''', (owner_handle, bell_ringer_id))
+        ''', (owner_id, bell_ringer_id))
+
+        _set_standards(cursor, bell_ringer_id, standards, published=False)
+        _bump_binder_version(cursor, owner_id)
 
         action_type = 'publish' if is_public else 'save'
-        log_activity(owner_handle, action_type, f'Bell ringer created: {topic} - {format_type}', cursor=cursor)
+        log_activity(owner_id, action_type, f'Bell ringer created: {topic} - {format_type}', cursor=cursor)
 
         return bell_ringer_id
 
+    return _write(write)
+
+
+def bulk_insert_bell_ringers(records):
+    """Insert a batch of bell ringers in a single transaction
+
+    Owners are created if missing and each bell ringer is added to its
+    owner's binder. No activity is logged for imported rows.
+
+    Args:
+        records: List of dicts with owner_handle, topic, format,
+            constraint_type, content and optional is_public, is_approved,
+            binder_count and created_at keys
+
+    Returns:
+        Number of bell ringers inserted
+    """
+    def write(cursor):
+        handles = {record['owner_handle'] for record in records}
+        cursor.executemany('INSERT OR IGNORE INTO users (handle) VALUES (?)', [(handle,) for handle in handles])
+
+        # Resolve each owner once per batch rather than once per row
+        owner_ids = {}
+        for handle in handles:
+            cursor.execute('SELECT id FROM users WHERE handle = ?', (handle,))
+            owner_ids[handle] = cursor.fetchone()[0]
+
+        binder_rows = []
+        for record in records:
+            owner_id = owner_ids[record['owner_handle']]
+            excerpt, sections = excerpts.summarize(record['content'])
+            cursor.execute('''
+                INSERT INTO bell_ringers
+                (owner_id, topic, format, constraint_type, content, excerpt, sections,
+                 is_public, is_approved, binder_count, created_at, hot_score)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP),
+                        hot_score(?, COALESCE(?, CURRENT_TIMESTAMP)))
+            ''', (owner_id, record['topic'], record['format'],
+                  record['constraint_type'], record['content'], excerpt, sections,
+                  record.get('is_public', 0), record.get('is_approved', 0),
+                  record.get('binder_count', 0), record.get('created_at'),
+                  record.get('binder_count', 0), record.get('created_at')))
+            binder_rows.append((owner_id, cursor.lastrowid))
+
+        cursor.executemany('''
+            INSERT INTO binder_items (user_id, bell_ringer_id)
+            VALUES (?, ?)
+        ''', binder_rows)
+        for owner_id in owner_ids.values():
+            _bump_binder_version(cursor, owner_id)
+
+        return len(binder_rows)
+
+    return _write(write)
+
 
 def get_bell_ringer(bell_ringer_id):
     """Get a specific bell ringer by ID"""
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM bell_ringers WHERE id = ?', (bell_ringer_id,))
+        cursor.execute(f'{BELL_RINGER_SELECT} WHERE br.id = ?', (bell_ringer_id,))
         return cursor.fetchone()
 
 
-def get_user_binder(handle):
+def get_user_binder(user_id, standard=None, domain=None, summary=False):
     """Get all bell ringers in a user's binder"""
+    return list(iter_user_binder(user_id, standard, domain, summary))
+
+
+def iter_user_binder(user_id, standard=None, domain=None, summary=False):
+    """Yield the bell ringers in a user's binder one row at a time
+
+    The cursor is consumed lazily, so callers can stream large binders
+    without building the whole result list in memory.
+
+    Args:
+        user_id: User's id
+        standard: Optional standard code the bell ringers must be aligned to
+        domain: Optional standards domain number
+        summary: Read the excerpt and sections instead of the full content (list pages)
+    """
+    standard_clause, params = _standard_filter(standard, domain)
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT br.* FROM bell_ringers br
+        cursor.execute(f'''
+            {BELL_RINGER_SUMMARY_SELECT if summary else BELL_RINGER_SELECT}
             INNER JOIN binder_items bi ON br.id = bi.bell_ringer_id
-            WHERE bi.user_handle = ?
+            WHERE bi.user_id = ?{standard_clause}
             ORDER BY bi.added_at DESC
-        ''', (handle,))
-        return cursor.fetchall()
+        ''', [user_id] + params)
+        yield from cursor
 
 
-def get_public_feed(sort_by='new'):
-    """Get all public, approved bell ringers for the feed"""
+def get_binder_bell_ringer(user_id, bell_ringer_id):
+    """Get a bell ringer from a user's binder, or None if it isn't in it"""
     with get_db() as conn:
         cursor = conn.cursor()
-        order_clause = 'created_at DESC' if sort_by == 'new' else 'binder_count DESC, created_at DESC'
         cursor.execute(f'''
-            SELECT * FROM bell_ringers
-            WHERE is_public = 1 AND is_approved = 1
-            ORDER BY {order_clause}
+            {BELL_RINGER_SELECT}
+            INNER JOIN binder_items bi ON br.id = bi.bell_ringer_id
+            WHERE bi.user_id = ? AND br.id = ?
+        ''', (user_id, bell_ringer_id))
+        return cursor.fetchone()
+
+
+def get_binder_changes(user_id, since=None):
+    """Binder items added or changed, and ids removed, since a sync cursor
+
+    Cursors are database timestamps. Rows from the cursor's own second are
+    returned again, so a write racing the previous sync is never missed;
+    clients apply changes idempotently.
+
+    Args:
+        user_id: User's id
+        since: Cursor returned by the previous call (None for the whole binder)
+
+    Returns:
+        Dict with cursor (for the next call), added (rows) and removed (bell ringer ids)
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        # Taken first, so anything written during the reads below is in the next sync
+        cursor.execute('SELECT CURRENT_TIMESTAMP')
+        sync_cursor = cursor.fetchone()[0]
+
+        if since is None:
+            cursor.execute(f'''
+                {BELL_RINGER_SELECT}
+                INNER JOIN binder_items bi ON br.id = bi.bell_ringer_id
+                WHERE bi.user_id = ?
+                ORDER BY bi.added_at DESC
+            ''', (user_id,))
+            return {'cursor': sync_cursor, 'added': cursor.fetchall(), 'removed': []}
+
+        # Approvals change how an item is shown, so they count as changes too
+        cursor.execute(f'''
+            {BELL_RINGER_SELECT}
+            INNER JOIN binder_items bi ON br.id = bi.bell_ringer_id
+            WHERE bi.user_id = ? AND (bi.added_at >= ? OR br.approved_at >= ?)
+            ORDER BY bi.added_at DESC
+        ''', (user_id, since, since))
+        added = cursor.fetchall()
+
+        cursor.execute('''
+            SELECT DISTINCT bell_ringer_id FROM binder_tombstones
+            WHERE user_id = ? AND removed_at >= ?
+        ''', (user_id, since))
+        removed = [row[0] for row in cursor.fetchall()]
+
+        return {'cursor': sync_cursor, 'added': added, 'removed': removed}
+
+
+def iter_public_corpus():
+    """Yield every public, approved bell ringer one row at a time (oldest first)"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            {BELL_RINGER_SELECT}
+            WHERE br.is_public = 1 AND br.is_approved = 1
+            ORDER BY br.id
         ''')
-        return cursor.fetchall()
+        yield from cursor
 
 
-def add_to_binder(user_handle, bell_ringer_id):
-    """Add a public bell ringer to user's binder"""
+def iter_activity_logs(start=None, end=None):
+    """Yield activity log rows one at a time
+
+    Args:
+        start: Optional inclusive lower bound ('YYYY-MM-DD' or timestamp)
+        end: Optional exclusive upper bound ('YYYY-MM-DD' or timestamp)
+    """
+    conditions = []
+    params = []
+    if start:
+        conditions.append('al.timestamp >= ?')
+        params.append(start)
+    if end:
+        conditions.append('al.timestamp < ?')
+        params.append(end)
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
     with get_db() as conn:
         cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT al.id, u.handle AS user_handle, al.action_type, al.details, al.timestamp
+            FROM activity_logs al
+            INNER JOIN users u ON u.id = al.user_id
+            {where_clause}
+            ORDER BY al.id
+        ''', params)
+        yield from cursor
+
+
+FEED_ORDER = {
+    'new': 'br.created_at DESC',
+    'popular': 'br.binder_count DESC, br.created_at DESC',
+    'hot': 'br.hot_score DESC',
+}
+
+
+def _feed_select(summary=False):
+    """SELECT for feed rows; catalog rows carry the owner handle themselves
+
+    Args:
+        summary: Select the excerpt and sections instead of the full content
+    """
+    if CATALOG_PATH:
+        columns = f'{SUMMARY_COLUMNS}, br.owner_handle' if summary else 'br.*'
+        return f'SELECT {columns} FROM bell_ringers br'
+    return BELL_RINGER_SUMMARY_SELECT if summary else BELL_RINGER_SELECT
+
+
+def _standard_filter(standard=None, domain=None):
+    """Extra WHERE conditions (and parameters) limiting br rows to a standard and/or domain"""
+    clause = ''
+    params = []
+    if standard:
+        clause += '''
+            AND br.id IN (SELECT bell_ringer_id FROM bell_ringer_standards WHERE standard_code = ?)'''
+        params.append(standard)
+    if domain:
+        clause += '''
+            AND br.id IN (SELECT bell_ringer_id FROM bell_ringer_standards WHERE domain = ?)'''
+        params.append(domain)
+    return clause, params
+
+
+def get_public_feed(sort_by='new', standard=None, domain=None):
+    """Get all public, approved bell ringers for the feed"""
+    return list(iter_public_feed(sort_by, standard, domain))
+
+
+def iter_public_feed(sort_by='new', standard=None, domain=None):
+    """Yield public, approved bell ringers for the feed one row at a time
+
+    In sharding mode the feed is read from the shared catalog. Rows carry
+    the excerpt and sections, not the full content (see get_feed_bell_ringer).
+
+    Args:
+        sort_by: Key of FEED_ORDER
+        standard: Optional standard code the bell ringers must be aligned to
+        domain: Optional standards domain number
+    """
+    standard_clause, params = _standard_filter(standard, domain)
+    with get_db(CATALOG_PATH, read_only=bool(CATALOG_PATH)) as conn:
+        cursor = conn.cursor()
+        order_clause = FEED_ORDER.get(sort_by, FEED_ORDER['popular'])
+        cursor.execute(f'''
+            {_feed_select(summary=True)}
+            WHERE br.is_public = 1 AND br.is_approved = 1{standard_clause}
+            ORDER BY {order_clause}
+        ''', params)
+        yield from cursor
+
+
+def get_feed_bell_ringer(bell_ringer_id):
+    """Get a public, approved bell ringer by its feed id (catalog id in sharding mode)"""
+    with get_db(CATALOG_PATH, read_only=bool(CATALOG_PATH)) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            {_feed_select()}
+            WHERE br.id = ? AND br.is_public = 1 AND br.is_approved = 1
+        ''', (bell_ringer_id,))
+        return cursor.fetchone()
+
+
+def get_feed_summaries(bell_ringer_ids):
+    """Summary rows (excerpt, no content) of the given feed items that are still public and approved"""
+    if not bell_ringer_ids:
+        return []
+    placeholders = ', '.join('?' for _ in bell_ringer_ids)
+    with get_db(CATALOG_PATH, read_only=bool(CATALOG_PATH)) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            {_feed_select(summary=True)}
+            WHERE br.id IN ({placeholders}) AND br.is_public = 1 AND br.is_approved = 1
+        ''', list(bell_ringer_ids))
+        return cursor.fetchall()
+
+
+def get_feed_ids():
+    """Ids of every public, approved bell ringer (catalog ids in sharding mode)
+
+    Read from the visibility index alone, so it is cheap enough to poll.
+    """
+    with get_db(CATALOG_PATH, read_only=bool(CATALOG_PATH)) as conn:
+        cursor = conn.cursor()
+        # Plain tuples: building a Row per id would dominate the scan
+        cursor.row_factory = None
+        cursor.execute('SELECT id FROM bell_ringers WHERE is_public = 1 AND is_approved = 1')
+        return [row[0] for row in cursor.fetchall()]
+
+
+# Ids per query when reading feed items by id (well under SQLite's variable limit)
+FEED_DOCUMENT_BATCH = 500
+
 
+def iter_feed_documents(bell_ringer_ids=None):
+    """Yield the text and metadata of feed items for the similarity index
+
+    Rows have id, topic, format, constraint_type, content and standards
+    (the aligned standard codes, comma-separated, or None).
+
+    Args:
+        bell_ringer_ids: Feed ids to read (default: the whole feed)
+    """
+    select = '''
+        SELECT br.id, br.topic, br.format, br.constraint_type, br.content,
+               (SELECT GROUP_CONCAT(s.standard_code) FROM bell_ringer_standards s
+                WHERE s.bell_ringer_id = br.id) AS standards
+        FROM bell_ringers br
+        WHERE br.is_public = 1 AND br.is_approved = 1
+    '''
+    with get_db(CATALOG_PATH, read_only=bool(CATALOG_PATH)) as conn:
+        cursor = conn.cursor()
+        if bell_ringer_ids is None:
+            cursor.execute(select)
+            yield from cursor
+            return
+        bell_ringer_ids = list(bell_ringer_ids)
+        for start in range(0, len(bell_ringer_ids), FEED_DOCUMENT_BATCH):
+            batch = bell_ringer_ids[start:start + FEED_DOCUMENT_BATCH]
+            placeholders = ', '.join('?' for _ in batch)
+            cursor.execute(f'{select} AND br.id IN ({placeholders})', batch)
+            yield from cursor.fetchall()
+
+
+def get_bell_ringer_standards(bell_ringer_id, path=None):
+    """(code, domain) tuples a bell ringer is aligned to
+
+    Args:
+        path: Database to read (e.g. the catalog; defaults to the current database)
+    """
+    with get_db(path, read_only=bool(path)) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT standard_code, domain FROM bell_ringer_standards
+            WHERE bell_ringer_id = ?
+            ORDER BY standard_code
+        ''', (bell_ringer_id,))
+        return [tuple(row) for row in cursor.fetchall()]
+
+
+def add_to_binder(user_id, bell_ringer_id):
+    """Add a public bell ringer to user's binder"""
+    def write(cursor):
         # Check if already in binder
         cursor.execute('''
             SELECT id FROM binder_items
-            WHERE user_handle = ? AND bell_ringer_id = ?
-        ''', (user_handle, bell_ringer_id))
+            WHERE user_id = ? AND bell_ringer_id = ?
+        ''', (user_id, bell_ringer_id))
 
         if cursor.fetchone():
             return False
 
         # Add to binder
         cursor.execute('''
-            INSERT INTO binder_items (user_handle, bell_ringer_id, original_id)
+            INSERT INTO binder_items (user_id, bell_ringer_id, original_id)
             VALUES (?, ?, ?)
-        ''', (user_handle, bell_ringer_id, bell_ringer_id))
+        ''', (user_id, bell_ringer_id, bell_ringer_id))
 
-        # Increment binder count
+        # Increment binder count (right-hand sides see the old binder_count)
         cursor.execute('''
-            UPDATE bell_ringers SET binder_count = binder_count + 1
+            UPDATE bell_ringers
+            SET binder_count = binder_count + 1,
+                hot_score = hot_score(binder_count + 1, created_at)
             WHERE id = ?
         ''', (bell_ringer_id,))
 
-        log_activity(user_handle, 'add_to_binder', f'Added bell ringer {bell_ringer_id} to binder', cursor=cursor)
+        _bump_binder_version(cursor, user_id)
+        log_activity(user_id, 'add_to_binder', f'Added bell ringer {bell_ringer_id} to binder', cursor=cursor)
+        return True
+
+    return _write(write)
+
+
+def add_catalog_copy_to_binder(user_id, catalog_item, standards=()):
+    """Add a copy of another tenant's catalog bell ringer to a user's binder
+
+    Used in sharding mode, where feed items from other schools live in
+    other database files. The copy is private to this shard and remembers
+    the catalog id so it is only added once per user. It keeps the
+    original's standards, given as (code, domain) tuples.
+
+    Returns:
+        True if added, False if the user already has this catalog item
+    """
+    def write(cursor):
+        cursor.execute('''
+            SELECT id FROM binder_items
+            WHERE user_id = ? AND catalog_id = ?
+        ''', (user_id, catalog_item['id']))
+
+        if cursor.fetchone():
+            return False
+
+        cursor.execute('''
+            INSERT INTO bell_ringers
+            (owner_id, topic, format, constraint_type, content, excerpt, sections, is_public, is_approved, hot_score)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 0, 1, hot_score(0, CURRENT_TIMESTAMP))
+        ''', (user_id, catalog_item['topic'], catalog_item['format'],
+              catalog_item['constraint_type'], catalog_item['content'])
+              + excerpts.summarize(catalog_item['content']))
+        bell_ringer_id = cursor.lastrowid
+
+        cursor.execute('''
+            INSERT INTO binder_items (user_id, bell_ringer_id, catalog_id)
+            VALUES (?, ?, ?)
+        ''', (user_id, bell_ringer_id, catalog_item['id']))
+
+        _set_standards(cursor, bell_ringer_id, standards, published=False)
+        _bump_binder_version(cursor, user_id)
+        log_activity(user_id, 'add_to_binder',
+                     f'Added catalog bell ringer {catalog_item["id"]} to binder', cursor=cursor)
         return True
 
+    return _write(write)
+
+
+def increment_binder_count(bell_ringer_id):
+    """Count one more binder use of a bell ringer (e.g. from another tenant)"""
+    def write(cursor):
+        cursor.execute('''
+            UPDATE bell_ringers
+            SET binder_count = binder_count + 1,
+                hot_score = hot_score(binder_count + 1, created_at)
+            WHERE id = ?
+        ''', (bell_ringer_id,))
+
+    return _write(write)
 
-def log_activity(user_handle, action_type, details='', cursor=None):
+
+def log_activity(user_id, action_type, details='', cursor=None):
     """Log user activity for statistics
 
     Args:
-        user_handle: User's handle
+        user_id: User's id
         action_type: Type of action performed
         details: Additional details about the action
         cursor: Optional database cursor to use (for nested transactions)
@@ -225,73 +1119,295 @@ def log_activity(user_handle, action_type, details='', cursor=None):
     if cursor:
         # Use the provided cursor (nested transaction)
         cursor.execute('''
-            INSERT INTO activity_logs (user_handle, action_type, details)
+            INSERT INTO activity_logs (user_id, action_type, details)
             VALUES (?, ?, ?)
-        ''', (user_handle, action_type, details))
+        ''', (user_id, action_type, details))
     else:
-        # Create new connection (standalone call)
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO activity_logs (user_handle, action_type, details)
-                VALUES (?, ?, ?)
-            ''', (user_handle, action_type, details))
+        # Standalone call: its own write transaction
+        _write(lambda cursor: log_activity(user_id, action_type, details, cursor=cursor))
+
+
+def log_generation(user_id, topic, format_type, constraint, generation):
+    """Record a generation's usage and log it as 'generate' activity
+
+    Args:
+        generation: Result dict from gemini_api.generate()
+    """
+    def write(cursor):
+        cursor.execute('''
+            INSERT INTO generation_logs
+            (user_id, topic, format, constraint_type, model, source, prompt_tokens, response_tokens,
+             latency_ms, retries, cost, error)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, topic, format_type, constraint, generation['model'], generation['source'],
+              generation['prompt_tokens'], generation['response_tokens'], generation['latency_ms'],
+              generation['retries'], generation['cost'], generation['error']))
+        log_activity(user_id, 'generate', f'{topic} - {format_type} - {constraint}', cursor=cursor)
+
+    return _write(write)
+
+
+# Aggregates shared by the generation cost views; latency only counts Gemini
+# calls, not feed items served in their place (source 'similar')
+GENERATION_TOTALS = '''
+    COUNT(*) AS generations,
+    COALESCE(SUM(gl.prompt_tokens), 0) AS prompt_tokens,
+    COALESCE(SUM(gl.response_tokens), 0) AS response_tokens,
+    COALESCE(SUM(gl.cost), 0) AS cost,
+    COALESCE(AVG(CASE WHEN gl.source != 'similar' THEN gl.latency_ms END), 0) AS avg_latency_ms,
+    COALESCE(MAX(CASE WHEN gl.source != 'similar' THEN gl.latency_ms END), 0) AS max_latency_ms,
+    COALESCE(SUM(gl.retries), 0) AS retries,
+    COALESCE(SUM(gl.source = 'error'), 0) AS errors,
+    COALESCE(SUM(gl.source = 'similar'), 0) AS reused
+'''
+
+
+def get_generation_costs(days=30, limit=20):
+    """Generation cost and latency over the last days (admin dashboard)
+
+    Args:
+        days: Number of days to report
+        limit: Maximum rows in the per-user and per-topic/format views
+
+    Returns:
+        Dict with totals (one row) and by_user, by_combo (topic/format) and
+        by_day lists, the first two most expensive first
+    """
+    since = f'-{int(days)} days'
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {GENERATION_TOTALS} FROM generation_logs gl
+            WHERE gl.created_at >= datetime('now', ?)
+        ''', (since,))
+        totals = cursor.fetchone()
+
+        cursor.execute(f'''
+            SELECT u.handle, {GENERATION_TOTALS} FROM generation_logs gl
+            INNER JOIN users u ON u.id = gl.user_id
+            WHERE gl.created_at >= datetime('now', ?)
+            GROUP BY gl.user_id
+            ORDER BY cost DESC, generations DESC
+            LIMIT ?
+        ''', (since, limit))
+        by_user = cursor.fetchall()
+
+        cursor.execute(f'''
+            SELECT gl.topic, gl.format, {GENERATION_TOTALS} FROM generation_logs gl
+            WHERE gl.created_at >= datetime('now', ?)
+            GROUP BY gl.topic, gl.format
+            ORDER BY cost DESC, generations DESC
+            LIMIT ?
+        ''', (since, limit))
+        by_combo = cursor.fetchall()
+
+        cursor.execute(f'''
+            SELECT date(gl.created_at) AS day, {GENERATION_TOTALS} FROM generation_logs gl
+            WHERE gl.created_at >= datetime('now', ?)
+            GROUP BY day
+            ORDER BY day DESC
+        ''', (since,))
+        by_day = cursor.fetchall()
+
+        return {'totals': totals, 'by_user': by_user, 'by_combo': by_combo, 'by_day': by_day}
 
 
 def get_pending_approvals():
     """Get all bell ringers pending admin approval"""
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM bell_ringers
-            WHERE is_public = 1 AND is_approved = 0
-            ORDER BY created_at DESC
+        cursor.execute(f'''
+            {BELL_RINGER_SELECT}
+            WHERE br.is_public = 1 AND br.is_approved = 0
+            ORDER BY br.created_at DESC
         ''')
         return cursor.fetchall()
 
 
-def approve_bell_ringer(bell_ringer_id):
-    """Approve a bell ringer for public display"""
+def get_moderation_queue(status='pending', topic=None, format_type=None, owner=None,
+                         max_age_days=None, page=1, per_page=24):
+    """Get one page of public bell ringers for the admin moderation queue
+
+    Args:
+        status: 'pending' for items awaiting approval, 'approved' for live items
+        topic: Optional topic to filter by
+        format_type: Optional format to filter by
+        owner: Optional owner handle to filter by
+        max_age_days: Optional age limit in days
+        page: 1-based page number
+        per_page: Number of items per page
+
+    Returns:
+        Tuple of (summary rows for the requested page, total number of matching rows)
+    """
+    conditions = ['br.is_public = 1', 'br.is_approved = ?']
+    params = [1 if status == 'approved' else 0]
+
+    if topic:
+        conditions.append('br.topic = ?')
+        params.append(topic)
+    if format_type:
+        conditions.append('br.format = ?')
+        params.append(format_type)
+    if owner:
+        conditions.append('u.handle = ?')
+        params.append(owner)
+    if max_age_days:
+        conditions.append("br.created_at >= datetime('now', ?)")
+        params.append(f'-{int(max_age_days)} days')
+
+    where_clause = ' AND '.join(conditions)
+
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE bell_ringers SET is_approved = 1
-            WHERE id = ?
-        ''', (bell_ringer_id,))
+        cursor.execute(f'''
+            SELECT COUNT(*) FROM bell_ringers br
+            INNER JOIN users u ON u.id = br.owner_id
+            WHERE {where_clause}
+        ''', params)
+        total = cursor.fetchone()[0]
+
+        cursor.execute(f'''
+            {BELL_RINGER_SUMMARY_SELECT}
+            WHERE {where_clause}
+            ORDER BY br.created_at DESC, br.id DESC
+            LIMIT ? OFFSET ?
+        ''', params + [per_page, (max(page, 1) - 1) * per_page])
+        return cursor.fetchall(), total
+
+
+def approve_bell_ringer(bell_ringer_id):
+    """Approve a bell ringer for public display"""
+    return approve_bell_ringers([bell_ringer_id])
+
+
+def approve_bell_ringers(bell_ringer_ids):
+    """Approve several bell ringers in a single transaction
+
+    Only public bell ringers waiting for approval are changed; private or
+    already approved ids are skipped.
+
+    Returns:
+        Number of bell ringers approved
+    """
+    def write(cursor):
+        placeholders = ', '.join('?' for _ in bell_ringer_ids)
+        cursor.execute(f'''
+            SELECT id FROM bell_ringers
+            WHERE id IN ({placeholders}) AND is_public = 1 AND is_approved = 0
+        ''', list(bell_ringer_ids))
+        pending = [row['id'] for row in cursor.fetchall()]
+        if not pending:
+            return 0
+
+        # Standards of the items about to become visible in the feed
+        newly_published = _item_standards(cursor, pending)
+        cursor.executemany('''
+            UPDATE bell_ringers
+            SET is_approved = 1, hot_score = hot_score(binder_count, created_at),
+                approved_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND is_public = 1 AND is_approved = 0
+        ''', [(bell_ringer_id,) for bell_ringer_id in pending])
+        approved = cursor.rowcount
+        _adjust_coverage(cursor, [(code, domain, 0, 1) for code, domain, _ in newly_published])
+        # Binders show the approval status
+        _bump_binder_versions_for_items(cursor, pending)
+        return approved
+
+    return _write(write)
 
 
 def delete_bell_ringer(bell_ringer_id):
     """Delete a bell ringer (admin only)"""
-    with get_db() as conn:
-        cursor = conn.cursor()
+    return delete_bell_ringers([bell_ringer_id])
+
+
+def delete_bell_ringers(bell_ringer_ids):
+    """Delete several bell ringers in a single transaction (admin only)
+
+    Returns:
+        Number of bell ringers deleted
+    """
+    params = [(bell_ringer_id,) for bell_ringer_id in bell_ringer_ids]
+    def write(cursor):
+        _bump_binder_versions_for_items(cursor, bell_ringer_ids)
+        removed = _item_standards(cursor, bell_ringer_ids)
+        _adjust_coverage(cursor, [(code, domain, -1, -published) for code, domain, published in removed])
+        cursor.executemany('DELETE FROM bell_ringer_standards WHERE bell_ringer_id = ?', params)
+        cursor.executemany('''
+            INSERT INTO binder_tombstones (user_id, bell_ringer_id)
+            SELECT user_id, bell_ringer_id FROM binder_items WHERE bell_ringer_id = ?
+        ''', params)
         # Delete from binder items first
-        cursor.execute('DELETE FROM binder_items WHERE bell_ringer_id = ?', (bell_ringer_id,))
-        # Delete the bell ringer
-        cursor.execute('DELETE FROM bell_ringers WHERE id = ?', (bell_ringer_id,))
+        cursor.executemany('DELETE FROM binder_items WHERE bell_ringer_id = ?', params)
+        # Delete the bell ringers
+        cursor.executemany('DELETE FROM bell_ringers WHERE id = ?', params)
+        return cursor.rowcount
+
+    return _write(write)
 
 
 def get_user_statistics():
-    """Get statistics for all users (admin dashboard)"""
+    """Get statistics for all users (admin dashboard)
+
+    Activity counts combine the raw logs still inside the retention window
+    with the daily rollups of older logs.
+    """
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
+            WITH activity AS (
+                SELECT user_id, action_type, COUNT(*) AS n
+                FROM activity_logs
+                GROUP BY user_id, action_type
+                UNION ALL
+                SELECT user_id, action_type, SUM(count) AS n
+                FROM activity_rollups
+                GROUP BY user_id, action_type
+            ),
+            user_activity AS (
+                SELECT
+                    user_id,
+                    SUM(CASE WHEN action_type = 'generate' THEN n ELSE 0 END) as api_requests,
+                    SUM(CASE WHEN action_type IN ('save', 'publish') THEN n ELSE 0 END) as saves,
+                    SUM(CASE WHEN action_type = 'login' THEN n ELSE 0 END) as logins
+                FROM activity
+                GROUP BY user_id
+            ),
+            user_binders AS (
+                SELECT user_id, COUNT(*) as binder_items
+                FROM binder_items
+                GROUP BY user_id
+            )
             SELECT
                 u.handle,
                 u.created_at,
                 u.last_active,
-                COUNT(DISTINCT CASE WHEN al.action_type = 'generate' THEN al.id END) as api_requests,
-                COUNT(DISTINCT CASE WHEN al.action_type IN ('save', 'publish') THEN al.id END) as saves,
-                COUNT(DISTINCT CASE WHEN al.action_type = 'login' THEN al.id END) as logins,
-                COUNT(DISTINCT bi.id) as binder_items
+                COALESCE(ua.api_requests, 0) as api_requests,
+                COALESCE(ua.saves, 0) as saves,
+                COALESCE(ua.logins, 0) as logins,
+                COALESCE(ub.binder_items, 0) as binder_items
             FROM users u
-            LEFT JOIN activity_logs al ON u.handle = al.user_handle
-            LEFT JOIN binder_items bi ON u.handle = bi.user_handle
-            GROUP BY u.handle
+            LEFT JOIN user_activity ua ON u.id = ua.user_id
+            LEFT JOIN user_binders ub ON u.id = ub.user_id
             ORDER BY api_requests DESC
         ''')
         return cursor.fetchall()
 
 
+def get_standard_coverage():
+    """Bell ringer counts per standard code (admin dashboard)
+
+    Returns:
+        Dict mapping standard code to a row with bell_ringers (all saved)
+        and published (public and approved) counts
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT standard_code, domain, bell_ringers, published FROM standard_coverage')
+        return {row['standard_code']: row for row in cursor.fetchall()}
+
+
 def get_activity_summary():
     """Get overall activity summary for admin dashboard"""
     with get_db() as conn:
@@ -310,7 +1426,12 @@ def get_activity_summary():
         cursor.execute('SELECT COUNT(*) FROM bell_ringers WHERE is_public = 1 AND is_approved = 0')
         pending_approvals = cursor.fetchone()[0]
 
-        cursor.execute('SELECT COUNT(*) FROM activity_logs WHERE action_type = "generate"')
+        # Recent raw logs plus rolled-up history
+        cursor.execute('''
+            SELECT
+                (SELECT COUNT(*) FROM activity_logs WHERE action_type = 'generate') +
+                (SELECT COALESCE(SUM(count), 0) FROM activity_rollups WHERE action_type = 'generate')
+        ''')
         total_api_requests = cursor.fetchone()[0]
 
         return {
@@ -322,6 +1443,151 @@ def get_activity_summary():
         }
 
 
+def rollup_activity_logs(retention_days, batch_size=5000):
+    """Fold activity logs older than the retention window into daily rollups
+
+    Each batch aggregates up to batch_size raw rows into activity_rollups and
+    deletes them in the same transaction, so dashboard totals never double
+    count or drop rows. Batches are separate writes (queued like any other
+    with DB_WRITE_QUEUE), so none holds the write lock for long. Freed pages
+    are returned with an incremental vacuum once they have committed.
+
+    Args:
+        retention_days: Number of whole days of raw logs to keep
+        batch_size: Maximum raw rows per transaction
+
+    Returns:
+        Dict with the number of rows rolled up and batches run
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT date('now', ?)", (f'-{int(retention_days)} days',))
+        cutoff = cursor.fetchone()[0]
+
+    def roll_up_batch(cursor):
+        cursor.execute('''
+            SELECT MAX(id) FROM (
+                SELECT id FROM activity_logs
+                WHERE timestamp < ?
+                ORDER BY id
+                LIMIT ?
+            )
+        ''', (cutoff, batch_size))
+        last_id = cursor.fetchone()[0]
+        if last_id is None:
+            return None
+
+        cursor.execute('''
+            INSERT INTO activity_rollups (user_id, action_type, day, count)
+            SELECT user_id, action_type, date(timestamp), COUNT(*)
+            FROM activity_logs
+            WHERE timestamp < ? AND id <= ?
+            GROUP BY user_id, action_type, date(timestamp)
+            ON CONFLICT (user_id, action_type, day)
+            DO UPDATE SET count = count + excluded.count
+        ''', (cutoff, last_id))
+
+        cursor.execute('''
+            DELETE FROM activity_logs
+            WHERE timestamp < ? AND id <= ?
+        ''', (cutoff, last_id))
+        return cursor.rowcount
+
+    rows_rolled_up = 0
+    batches = 0
+    while True:
+        rolled_up = _write(roll_up_batch)
+        if rolled_up is None:
+            break
+        rows_rolled_up += rolled_up
+        batches += 1
+
+    # Not inside a transaction (and so not on the writer thread's batch)
+    with get_db() as conn:
+        conn.execute('PRAGMA incremental_vacuum').fetchall()
+
+    return {'rows_rolled_up': rows_rolled_up, 'batches': batches, 'cutoff': cutoff}
+
+
+def prune_binder_tombstones(retention_days, batch_size=5000):
+    """Delete tombstones older than the retention window, batch_size rows per write
+
+    Clients whose last sync is older than that get a full resync instead.
+
+    Returns:
+        Number of tombstones deleted
+    """
+    def delete_batch(cursor):
+        cursor.execute('''
+            DELETE FROM binder_tombstones WHERE id IN (
+                SELECT id FROM binder_tombstones
+                WHERE removed_at < datetime('now', ?)
+                ORDER BY id
+                LIMIT ?
+            )
+        ''', (f'-{int(retention_days)} days', batch_size))
+        return cursor.rowcount
+
+    deleted = 0
+    while True:
+        batch = _write(delete_batch)
+        deleted += batch
+        if batch < batch_size:
+            return deleted
+
+
+def refresh_hot_scores(batch_size=5000):
+    """Recompute stored hot scores that no longer match hot_score()
+
+    Scores are kept current by every write that changes binder_count, so
+    this only repairs rows changed some other way (older versions, manual
+    edits) or rescored after HOT_SCORE_DECAY_SECONDS changes.
+
+    Rows are rescored in id ranges of batch_size, one write each (queued
+    like any other with DB_WRITE_QUEUE), so none holds the write lock for long.
+
+    Returns:
+        Number of rows updated
+    """
+    def refresh_batch(cursor, last_id):
+        cursor.execute('''
+            SELECT MAX(id) FROM (
+                SELECT id FROM bell_ringers WHERE id > ? ORDER BY id LIMIT ?
+            )
+        ''', (last_id, batch_size))
+        batch_end = cursor.fetchone()[0]
+        if batch_end is None:
+            return None, 0
+
+        cursor.execute('''
+            UPDATE bell_ringers SET hot_score = hot_score(binder_count, created_at)
+            WHERE id > ? AND id <= ? AND hot_score != hot_score(binder_count, created_at)
+        ''', (last_id, batch_end))
+        return batch_end, cursor.rowcount
+
+    updated = 0
+    last_id = 0
+    while True:
+        last_id, rescored = _write(lambda cursor: refresh_batch(cursor, last_id))
+        if last_id is None:
+            return updated
+        updated += rescored
+
+
+def enable_incremental_vacuum(path=None):
+    """Switch an existing database to incremental auto-vacuum (runs a full VACUUM once)
+
+    Args:
+        path: Database file to convert (defaults to the current database)
+    """
+    conn = sqlite3.connect(path or current_db_path(), timeout=10.0)
+    try:
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+
+
 def verify_admin(username, password_hash):
     """Verify admin credentials"""
     with get_db() as conn:
@@ -334,8 +1600,7 @@ def verify_admin(username, password_hash):
 
 def create_admin(username, password_hash):
     """Create a new admin user"""
-    with get_db() as conn:
-        cursor = conn.cursor()
+    def write(cursor):
         try:
             cursor.execute('''
                 INSERT INTO admins (username, password_hash)
@@ -344,3 +1609,7 @@ def create_admin(username, password_hash):
             return True
         except sqlite3.IntegrityError:
             return False
+
+    return _write(write)
+
+
@@ -0,0 +1,98 @@
+"""
+Plain-text excerpts and section metadata for bell ringers
+Computed once when a bell ringer is saved, so list pages (the feed, the
+binder, the moderation queue) can show a summary without reading or
+sending the full HTML content. The full content is fetched on expand.
+"""
+import json
+from html.parser import HTMLParser
+
+EXCERPT_LENGTH = 200
+
+# Sections left out of the excerpt (the feed shouldn't give answers away)
+HIDDEN_SECTIONS = {'answer-key'}
+
+
+class _ContentParser(HTMLParser):
+    """Collects section headings and the visible text outside headings and hidden sections
+
+    Generated content looks like:
+    <div class="bell-ringer-content"><h2>Bell Ringer: Topic</h2>
+        <div class="section problem"><h3>Problem</h3>...</div>...</div>
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.sections = []
+        self.text = []
+        self._stack = []  # (tag, section kind or None) for each open element
+        self._heading = None
+
+    def _section(self):
+        """Kind of the innermost enclosing section, or None"""
+        for _, kind in reversed(self._stack):
+            if kind:
+                return kind
+        return None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('br', 'hr', 'img', 'input', 'meta', 'link', 'wbr'):
+            self.text.append(' ')
+            return
+        classes = (dict(attrs).get('class') or '').split()
+        kind = None
+        if 'section' in classes:
+            kind = next((c for c in classes if c != 'section'), 'section')
+        self._stack.append((tag, kind))
+        if tag in ('h2', 'h3'):
+            self._heading = []
+
+    def handle_endtag(self, tag):
+        # Pop up to the matching open tag (tolerates unclosed elements)
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                del self._stack[i:]
+                break
+        if tag in ('h2', 'h3') and self._heading is not None:
+            title = ' '.join(''.join(self._heading).split())
+            kind = self._section()
+            if tag == 'h3' and kind and title:
+                self.sections.append({'kind': kind, 'title': title})
+            self._heading = None
+        self.text.append(' ')
+
+    def handle_data(self, data):
+        if self._heading is not None:
+            self._heading.append(data)
+        elif self._section() not in HIDDEN_SECTIONS:
+            self.text.append(data)
+
+
+def truncate(text, length=EXCERPT_LENGTH):
+    """Shorten text to at most length characters, at a word boundary"""
+    if len(text) <= length:
+        return text
+    cut = text[:length - 3].rsplit(' ', 1)[0] or text[:length - 3]
+    return cut.rstrip(' ,.;:') + '...'
+
+
+def summarize(content):
+    """Excerpt and section metadata for a bell ringer's HTML content
+
+    Returns:
+        (excerpt, sections): plain text of at most EXCERPT_LENGTH characters,
+        and a JSON list of {"kind", "title"} for each section, in order
+    """
+    parser = _ContentParser()
+    parser.feed(content or '')
+    parser.close()
+    text = ' '.join(''.join(parser.text).split())
+    return truncate(text), json.dumps(parser.sections)
+
+
+def section_titles(sections):
+    """Section titles from stored section metadata (for templates)"""
+    try:
+        return [section['title'] for section in json.loads(sections or '[]')]
+    except (TypeError, ValueError, KeyError):
+        return []
@@ -1,38 +1,75 @@
 """
 Google Gemini API integration for generating bell ringers
 """
+import asyncio
 import os
-import google.generativeai as genai
+import random
+import time
+from contextlib import contextmanager, nullcontext
+from . import limits
+from . import metrics
 from . import standards as standards_module
 
+# The Gemini SDK is slow to import, so it is loaded on the first generation
+# rather than on every worker start (see load_genai())
+_genai = None
+
+
+def load_genai():
+    """Import google.generativeai on first use and return the module"""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        _genai = genai
+    return _genai
+
 
 def configure_gemini():
-    """Configure Gemini API with API key from environment"""
+    """Configure Gemini API with API key from environment
+
+    Returns:
+        The configured google.generativeai module
+    """
     api_key = os.environ.get('GEMINI_API_KEY')
     if not api_key:
         raise ValueError("GEMINI_API_KEY environment variable not set")
+    genai = load_genai()
     genai.configure(api_key=api_key)
+    return genai
 
 
-def generate_bell_ringer(topic, format_type, constraint, standard_codes=[], user_prompt=""):
-    """
-    Generate a bell ringer using Gemini 2.0 Flash model
+MODEL_NAME = 'gemini-2.0-flash-exp'
 
-    Args:
-        topic: CS topic (e.g., Variables, Loops, Data Structures)
-        format_type: Question format (e.g., Debug the Code, Predict Output)
-        constraint: Teaching constraint (e.g., 5-Minute Timer, AP-Level Review)
-        standard_codes: List of CS standard codes to align with
-        user_prompt: Optional user-provided keyword or phrase to customize content
+# Where a generation's content came from (stored in generation_logs.source)
+SOURCE_GEMINI = 'gemini'
+SOURCE_ERROR = 'error'
+# A close match from the feed, served instead of calling Gemini (see similarity.reuse())
+SOURCE_SIMILAR = 'similar'
 
-    Returns:
-        Generated bell ringer content as formatted HTML
+# Retries after a failed Gemini call, the base backoff between them (seconds),
+# and USD prices per million prompt and response tokens; set from the app
+# config by configure()
+max_retries = 2
+retry_backoff = 1.0
+input_price_per_million = 0.10
+output_price_per_million = 0.40
+
+
+def configure(config):
+    """Set retries, backoff and token prices
+
+    Args:
+        config: Mapping with the GEMINI_* settings (e.g. app.config)
     """
-    configure_gemini()
+    global max_retries, retry_backoff, input_price_per_million, output_price_per_million
+    max_retries = config.get('GEMINI_MAX_RETRIES', max_retries)
+    retry_backoff = config.get('GEMINI_RETRY_BACKOFF', retry_backoff)
+    input_price_per_million = config.get('GEMINI_INPUT_PRICE_PER_MILLION', input_price_per_million)
+    output_price_per_million = config.get('GEMINI_OUTPUT_PRICE_PER_MILLION', output_price_per_million)
 
-    # Use the gemini-2.0-flash model
-    model = genai.GenerativeModel('gemini-2.0-flash-exp')
 
+def build_prompt(topic, format_type, constraint, standard_codes=(), user_prompt=""):
+    """Build the generation prompt for a topic/format/constraint combination"""
     # Get standard descriptions if provided
     standard_text = ""
     if standard_codes and len(standard_codes) > 0:
@@ -48,7 +85,7 @@ def generate_bell_ringer(topic, format_type, constraint, standard_codes=[], user
         prompt_text = f"\n- **User Focus**: Incorporate or relate to: {user_prompt}"
 
     # Craft a detailed prompt for the specific combination
-    ai_prompt = f"""You are an expert Computer Science teacher creating a high-quality bell ringer (warm-up exercise) for a CS class.
+    return f"""You are an expert Computer Science teacher creating a high-quality bell ringer (warm-up exercise) for a CS class.
 
 Generate a bell ringer with these specifications:
 - **Topic**: {topic}
@@ -92,74 +129,220 @@ IMPORTANT:
 - Do NOT include any markdown formatting
 - Only include the <div class="bell-ringer-content"> and its contents, no other HTML wrapper"""
 
-    try:
-        response = model.generate_content(ai_prompt)
-        content = response.text
 
-        # Clean up any markdown that might have slipped through
-        content = content.replace('```python', '<pre><code class="language-python">')
-        content = content.replace('```', '</code></pre>')
+def clean_content(content):
+    """Normalize model output into a bell-ringer-content HTML fragment"""
+    # Clean up any markdown that might have slipped through
+    content = content.replace('```python', '<pre><code class="language-python">')
+    content = content.replace('```', '</code></pre>')
+
+    # Remove any 'html' or '```html' tags that Gemini might add
+    content = content.replace('```html', '').replace('```', '')
+    content = content.strip()
+
+    # Ensure content starts and ends cleanly
+    if '<div class="bell-ringer-content">' not in content:
+        # Model didn't follow format, wrap it
+        content = f'<div class="bell-ringer-content">{content}</div>'
+
+    return content
 
-        # Remove any 'html' or '```html' tags that Gemini might add
-        content = content.replace('```html', '').replace('```', '')
-        content = content.strip()
 
-        # Ensure content starts and ends cleanly
-        if '<div class="bell-ringer-content">' not in content:
-            # Model didn't follow format, wrap it
-            content = f'<div class="bell-ringer-content">{content}</div>'
+def error_content(error):
+    """HTML fragment shown in place of a bell ringer when generation fails"""
+    return f'<div class="bell-ringer-content"><div class="error">Error generating bell ringer: {str(error)}</div></div>'
 
-        return content
+
+@contextmanager
+def observe_generation():
+    """Record latency and outcome metrics for one Gemini call"""
+    started = time.perf_counter()
+    try:
+        yield
     except Exception as e:
-        return f'<div class="bell-ringer-content"><div class="error">Error generating bell ringer: {str(e)}</div></div>'
+        metrics.inc('bellringers_gemini_requests_total', {'outcome': 'error', 'error': type(e).__name__})
+        raise
+    finally:
+        metrics.observe('bellringers_gemini_request_duration_seconds', time.perf_counter() - started)
+    metrics.inc('bellringers_gemini_requests_total', {'outcome': 'success'})
+
+
+def generation_cost(prompt_tokens, response_tokens):
+    """Cost in USD of a generation's tokens at the configured prices"""
+    return ((prompt_tokens or 0) * input_price_per_million
+            + (response_tokens or 0) * output_price_per_million) / 1_000_000
+
+
+def retry_delay(attempt):
+    """Seconds to wait before retry number attempt (exponential, with jitter)"""
+    return retry_backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+
+
+def _generation(content, source, started, retries, response=None, error=None):
+    """Result dict for a finished generation, with token usage from the SDK response"""
+    usage = getattr(response, 'usage_metadata', None)
+    prompt_tokens = getattr(usage, 'prompt_token_count', None)
+    response_tokens = getattr(usage, 'candidates_token_count', None)
+    if prompt_tokens:
+        metrics.inc('bellringers_gemini_tokens_total', {'kind': 'prompt'}, prompt_tokens)
+    if response_tokens:
+        metrics.inc('bellringers_gemini_tokens_total', {'kind': 'response'}, response_tokens)
+    return {
+        'content': content,
+        'model': MODEL_NAME,
+        'source': source,
+        'prompt_tokens': prompt_tokens,
+        'response_tokens': response_tokens,
+        'latency_ms': round((time.perf_counter() - started) * 1000),
+        'retries': retries,
+        'cost': generation_cost(prompt_tokens, response_tokens),
+        'error': type(error).__name__ if error else None,
+    }
+
+
+def generate(topic, format_type, constraint, standard_codes=(), user_prompt="", slot=nullcontext):
+    """
+    Generate a bell ringer using Gemini 2.0 Flash model, retrying failed calls
+
+    Args:
+        topic: CS topic (e.g., Variables, Loops, Data Structures)
+        format_type: Question format (e.g., Debug the Code, Predict Output)
+        constraint: Teaching constraint (e.g., 5-Minute Timer, AP-Level Review)
+        standard_codes: List of CS standard codes to align with
+        user_prompt: Optional user-provided keyword or phrase to customize content
+        slot: Returns a context manager held around each Gemini call (e.g.
+            limits.admit); it is released during the backoff between retries
+
+    Returns:
+        Dict with content (formatted HTML), model, source, prompt_tokens,
+        response_tokens, latency_ms (including retries), retries, cost (USD)
+        and error (exception name if every attempt failed)
+
+    Raises:
+        limits.Rejected: slot() turned the request away before the first attempt
+            (on a retry, the failed attempts are returned as an error instead,
+            so they are still logged)
+    """
+    genai = configure_gemini()
+    model = genai.GenerativeModel(MODEL_NAME)
+    ai_prompt = build_prompt(topic, format_type, constraint, standard_codes, user_prompt)
+
+    started = time.perf_counter()
+    for attempt in range(max_retries + 1):
+        try:
+            with slot():
+                try:
+                    with observe_generation():
+                        response = model.generate_content(ai_prompt)
+                        content = response.text
+                    return _generation(clean_content(content), SOURCE_GEMINI, started, attempt, response)
+                except Exception as e:
+                    error = e
+        except limits.Rejected:
+            if attempt == 0:
+                raise
+            # The earlier attempts were made (and may be billed), so report them
+            return _generation(error_content(error), SOURCE_ERROR, started, attempt - 1, error=error)
+        if attempt == max_retries:
+            return _generation(error_content(error), SOURCE_ERROR, started, attempt, error=error)
+        # Sleeping requests don't hold a slot, so an outage can't fill admission with them
+        time.sleep(retry_delay(attempt))
+
+
+async def generate_async(topic, format_type, constraint, standard_codes=(), user_prompt="", slot=nullcontext):
+    """Async version of generate() using the SDK's generate_content_async
+
+    Waiting on Gemini does not hold a thread, so one process can have many
+    generations in flight (see asgi.py). slot returns an async context manager.
+    """
+    genai = configure_gemini()
+    model = genai.GenerativeModel(MODEL_NAME)
+    ai_prompt = build_prompt(topic, format_type, constraint, standard_codes, user_prompt)
+
+    started = time.perf_counter()
+    for attempt in range(max_retries + 1):
+        try:
+            async with slot():
+                try:
+                    with observe_generation():
+                        response = await model.generate_content_async(ai_prompt)
+                        content = response.text
+                    return _generation(clean_content(content), SOURCE_GEMINI, started, attempt, response)
+                except Exception as e:
+                    error = e
+        except limits.Rejected:
+            if attempt == 0:
+                raise
+            return _generation(error_content(error), SOURCE_ERROR, started, attempt - 1, error=error)
+        if attempt == max_retries:
+            return _generation(error_content(error), SOURCE_ERROR, started, attempt, error=error)
+        await asyncio.sleep(retry_delay(attempt))
+
+
+def generate_bell_ringer(topic, format_type, constraint, standard_codes=[], user_prompt=""):
+    """Generate a bell ringer and return just its HTML content (see generate())"""
+    return generate(topic, format_type, constraint, standard_codes, user_prompt)['content']
+
+
+async def generate_bell_ringer_async(topic, format_type, constraint, standard_codes=(), user_prompt=""):
+    """Async version of generate_bell_ringer() (see generate_async())"""
+    return (await generate_async(topic, format_type, constraint, standard_codes, user_prompt))['content']
+
+
+# Option catalogs are fixed, so they are built once at import time
+TOPIC_OPTIONS = (
+    "Variables",
+    "Loops",
+    "Conditionals",
+    "Functions",
+    "Data Structures",
+    "Object-Oriented Programming",
+    "Recursion",
+    "Algorithms",
+    "AI & Machine Learning",
+    "Cybersecurity",
+    "Binary & Number Systems",
+    "Web Development",
+    "Databases",
+)
+
+FORMAT_OPTIONS = (
+    "Debug the Code",
+    "Predict the Output",
+    "Vocabulary Match",
+    "Code Tracing",
+    "Short Answer",
+    "Pseudocode Challenge",
+    "Fill in the Blanks",
+    "Multiple Choice",
+    "Code Completion",
+    "Real-World Application",
+)
+
+CONSTRAINT_OPTIONS = (
+    "5-Minute Timer",
+    "Partner Discussion",
+    "No Computers",
+    "Analogy Time",
+    "Introductory Level",
+    "Intermediate Level",
+    "AP-Level Review",
+    "Think-Pair-Share",
+    "Visual Diagram",
+    "Quiz Prep",
+)
 
 
 def get_topic_options():
     """Return list of available topics"""
-    return [
-        "Variables",
-        "Loops",
-        "Conditionals",
-        "Functions",
-        "Data Structures",
-        "Object-Oriented Programming",
-        "Recursion",
-        "Algorithms",
-        "AI & Machine Learning",
-        "Cybersecurity",
-        "Binary & Number Systems",
-        "Web Development",
-        "Databases"
-    ]
+    return list(TOPIC_OPTIONS)
 
 
 def get_format_options():
     """Return list of available formats"""
-    return [
-        "Debug the Code",
-        "Predict the Output",
-        "Vocabulary Match",
-        "Code Tracing",
-        "Short Answer",
-        "Pseudocode Challenge",
-        "Fill in the Blanks",
-        "Multiple Choice",
-        "Code Completion",
-        "Real-World Application"
-    ]
+    return list(FORMAT_OPTIONS)
 
 
 def get_constraint_options():
     """Return list of available constraints"""
-    return [
-        "5-Minute Timer",
-        "Partner Discussion",
-        "No Computers",
-        "Analogy Time",
-        "Introductory Level",
-        "Intermediate Level",
-        "AP-Level Review",
-        "Think-Pair-Share",
-        "Visual Diagram",
-        "Quiz Prep"
-    ]
+    return list(CONSTRAINT_OPTIONS)
@@ -3,8 +3,17 @@ Database initialization script
 Run this once to set up the database
 """
 import hashlib
-from database import init_db, create_admin
-from config import Config
+import os
+import sys
+
+if __package__:
+    from .database import init_db, create_admin
+    from .config import Config
+else:
+    # Run as a script from inside the bellringers/ directory
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from bellringers.database import init_db, create_admin
+    from bellringers.config import Config
 
 
 def setup_database():
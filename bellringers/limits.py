@@ -0,0 +1,349 @@
+"""
+Admission control and per-user rate limits for generation
+Every generation holds a Gemini call (and, on the Flask path, a worker
+thread) for seconds, so two limits protect the quota and the worker pool:
+
+- An admission controller caps generations in flight per process. Up to
+  a fixed number of further requests wait for a free slot for a bounded
+  time; anything beyond that is shed at once with 503 + Retry-After.
+- Token buckets per user handle cap how often one user can generate
+  (429 + Retry-After). Buckets live in process memory, or in a small
+  SQLite file when RATE_LIMIT_DB is set so all worker processes share them.
+"""
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+
+from . import metrics
+
+
+class Rejected(Exception):
+    """A request was not admitted
+
+    Attributes:
+        reason: 'rate_limited', 'queue_full' or 'queue_timeout'
+        retry_after: Whole seconds the client should wait before retrying
+    """
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def status(self):
+        """HTTP status for the response"""
+        return 429 if self.reason == 'rate_limited' else 503
+
+    @property
+    def message(self):
+        """Error message for the JSON response"""
+        if self.reason == 'rate_limited':
+            return f'Too many bell ringers generated; try again in {self.retry_after} seconds'
+        return f'The generator is busy; try again in {self.retry_after} seconds'
+
+
+class _SlotTiming:
+    """Moving average of how long a slot is held, for Retry-After estimates"""
+
+    def __init__(self, initial=5.0):
+        self.average = initial
+
+    def record(self, seconds):
+        self.average += 0.2 * (seconds - self.average)
+
+    def retry_after(self, waiting, max_concurrent):
+        """Seconds until the queue ahead of a new request has likely drained"""
+        return max(1, math.ceil(self.average * (waiting + 1) / max_concurrent))
+
+
+class AdmissionController:
+    """Bounded concurrency with a bounded, timed wait queue (threads)"""
+
+    def __init__(self, max_concurrent, max_queue=0, queue_timeout=10.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.timing = _SlotTiming()
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if needed
+
+        Raises:
+            Rejected: The queue is full, or no slot freed up in time
+        """
+        with self._condition:
+            if self.active < self.max_concurrent:
+                self.active += 1
+                return
+            if self.waiting >= self.max_queue:
+                raise Rejected('queue_full', self.timing.retry_after(self.waiting, self.max_concurrent))
+
+            self.waiting += 1
+            started = time.monotonic()
+            try:
+                deadline = started + self.queue_timeout
+                while self.active >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Rejected('queue_timeout', self.timing.retry_after(self.waiting, self.max_concurrent))
+                    self._condition.wait(remaining)
+                self.active += 1
+            finally:
+                self.waiting -= 1
+                metrics.observe('bellringers_generate_queue_wait_seconds', time.monotonic() - started,
+                                {'path': 'sync'})
+
+    def release(self, held_seconds=None):
+        """Free a slot and wake the next waiting request"""
+        with self._condition:
+            self.active -= 1
+            if held_seconds is not None:
+                self.timing.record(held_seconds)
+            self._condition.notify()
+
+    @contextmanager
+    def slot(self):
+        """Hold a slot for the with-block (raises Rejected if none is available)"""
+        self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+
+class AsyncAdmissionController:
+    """Bounded concurrency with a bounded, timed wait queue (one event loop)"""
+
+    def __init__(self, max_concurrent, max_queue=0, queue_timeout=10.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.timing = _SlotTiming()
+        self._condition = None
+
+    async def acquire(self):
+        """Take a slot, waiting in the queue if needed (raises Rejected)"""
+        if self._condition is None:
+            # Created on first use so it belongs to the server's event loop
+            self._condition = asyncio.Condition()
+
+        async with self._condition:
+            if self.active < self.max_concurrent:
+                self.active += 1
+                return
+            if self.waiting >= self.max_queue:
+                raise Rejected('queue_full', self.timing.retry_after(self.waiting, self.max_concurrent))
+
+            self.waiting += 1
+            started = time.monotonic()
+            try:
+                await asyncio.wait_for(
+                    self._condition.wait_for(lambda: self.active < self.max_concurrent),
+                    self.queue_timeout)
+                self.active += 1
+            except asyncio.TimeoutError:
+                raise Rejected('queue_timeout', self.timing.retry_after(self.waiting, self.max_concurrent)) from None
+            finally:
+                self.waiting -= 1
+                metrics.observe('bellringers_generate_queue_wait_seconds', time.monotonic() - started,
+                                {'path': 'async'})
+
+    async def release(self, held_seconds=None):
+        """Free a slot and wake the next waiting request"""
+        async with self._condition:
+            self.active -= 1
+            if held_seconds is not None:
+                self.timing.record(held_seconds)
+            self._condition.notify()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a slot for the async with-block (raises Rejected if none is available)"""
+        await self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            await self.release(time.monotonic() - started)
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets kept in process memory
+
+    Each key may spend `burst` requests at once, refilled at `per_minute`
+    tokens per minute. Only the most recently used `max_keys` buckets are
+    kept; a forgotten key starts again with a full bucket.
+    """
+
+    shared = False
+
+    def __init__(self, per_minute, burst, max_keys=10000):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Spend one token for key
+
+        Returns:
+            0 if allowed, otherwise seconds until a token is available
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0 if allowed else (1 - tokens) / self.rate
+
+
+class SQLiteTokenBucketLimiter:
+    """Token buckets shared by every process through a SQLite file
+
+    Same behavior as TokenBucketLimiter. Each check is one atomic UPSERT,
+    so concurrent processes never lose an update.
+    """
+
+    shared = True
+
+    def __init__(self, path, per_minute, burst):
+        self.path = path
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL,
+                granted INTEGER NOT NULL
+            )
+        ''')
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5.0)
+        return conn
+
+    def take(self, key):
+        """Spend one token for key (0 if allowed, else seconds until one is available)"""
+        conn = self._connection()
+        # Wall-clock time, since the buckets are shared between processes
+        params = {'key': key, 'now': time.time(), 'rate': self.rate, 'burst': self.burst}
+        rows = conn.execute('''
+            INSERT INTO rate_limits (key, tokens, updated, granted)
+            VALUES (:key, :burst - 1, :now, 1)
+            ON CONFLICT (key) DO UPDATE SET
+                granted = MIN(:burst, tokens + MAX(:now - updated, 0) * :rate) >= 1,
+                tokens = MIN(:burst, tokens + MAX(:now - updated, 0) * :rate)
+                         - (MIN(:burst, tokens + MAX(:now - updated, 0) * :rate) >= 1),
+                updated = :now
+            RETURNING tokens, granted
+        ''', params).fetchall()
+        conn.commit()
+        tokens, granted = rows[0]
+        return 0 if granted else (1 - tokens) / self.rate
+
+
+# Configured from the app config by configure()
+generation = None
+rate_limiter = None
+
+
+def configure(config):
+    """Create the generation admission controller and rate limiter
+
+    Args:
+        config: Mapping with the GENERATE_* and RATE_LIMIT_DB settings (e.g. app.config)
+    """
+    global generation, rate_limiter
+    generation = None
+    if config.get('GENERATE_MAX_CONCURRENT'):
+        generation = AdmissionController(config['GENERATE_MAX_CONCURRENT'],
+                                         config.get('GENERATE_MAX_QUEUE', 0),
+                                         config.get('GENERATE_QUEUE_TIMEOUT', 10.0))
+
+    rate_limiter = None
+    per_minute = config.get('GENERATE_RATE_PER_MINUTE')
+    if per_minute:
+        burst = config.get('GENERATE_BURST') or per_minute
+        if config.get('RATE_LIMIT_DB'):
+            rate_limiter = SQLiteTokenBucketLimiter(config['RATE_LIMIT_DB'], per_minute, burst)
+        else:
+            rate_limiter = TokenBucketLimiter(per_minute, burst)
+
+
+def admit():
+    """Context manager holding a generation slot (does nothing when unlimited)
+
+    Raises:
+        Rejected: No slot became available
+    """
+    return generation.slot() if generation is not None else nullcontext()
+
+
+def user_key(handle, tenant=None):
+    """Rate limit key for a user handle (handles are only unique per tenant)"""
+    return f'{tenant}:{handle}' if tenant else handle
+
+
+def check_rate(key):
+    """Spend a token for key
+
+    Raises:
+        Rejected: The user is over their rate limit
+    """
+    if rate_limiter is None:
+        return
+    wait = rate_limiter.take(key)
+    if wait:
+        raise Rejected('rate_limited', max(1, math.ceil(wait)))
+
+
+def prune_rate_limits(path, idle_seconds=24 * 60 * 60):
+    """Delete shared buckets unused for idle_seconds (they would be full again anyway)
+
+    Returns:
+        Number of buckets deleted
+    """
+    if not os.path.exists(path):
+        return 0
+    conn = sqlite3.connect(path, timeout=5.0)
+    try:
+        deleted = conn.execute('DELETE FROM rate_limits WHERE updated < ?',
+                               (time.time() - idle_seconds,)).rowcount
+        conn.commit()
+        return deleted
+    finally:
+        conn.close()
+
+
+def record_rejection(rejected, path):
+    """Count a rejected generation request"""
+    metrics.inc('bellringers_generate_rejections_total', {'reason': rejected.reason, 'path': path})
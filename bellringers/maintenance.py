@@ -0,0 +1,70 @@
+"""
+Periodic maintenance jobs for Bell Ringers
+Run from cron or a PythonAnywhere scheduled task (from the project root):
+    python -m bellringers.maintenance
+"""
+import argparse
+
+from . import database as db
+from . import limits
+from . import shards
+from .config import Config
+
+
+def run_maintenance(retention_days=None, batch_size=None):
+    """Run all maintenance jobs and return a dict of their results"""
+    results = {}
+    retention_days = retention_days if retention_days is not None else Config.ACTIVITY_RETENTION_DAYS
+    batch_size = batch_size or Config.ACTIVITY_ROLLUP_BATCH_SIZE
+
+    if shards.enabled:
+        for tenant in shards.list_tenants():
+            with db.use_database(shards.shard_path(tenant)):
+                results[f'activity_rollup[{tenant}]'] = db.rollup_activity_logs(retention_days, batch_size)
+                results[f'hot_scores_refreshed[{tenant}]'] = db.refresh_hot_scores(batch_size)
+                results[f'binder_tombstones_pruned[{tenant}]'] = db.prune_binder_tombstones(
+                    Config.BINDER_TOMBSTONE_RETENTION_DAYS, batch_size)
+        results['catalog_merge'] = shards.merge_catalog()
+    else:
+        results['activity_rollup'] = db.rollup_activity_logs(retention_days, batch_size)
+        results['hot_scores_refreshed'] = db.refresh_hot_scores(batch_size)
+        results['binder_tombstones_pruned'] = db.prune_binder_tombstones(
+            Config.BINDER_TOMBSTONE_RETENTION_DAYS, batch_size)
+
+    if Config.RATE_LIMIT_DB:
+        results['rate_limits_pruned'] = limits.prune_rate_limits(Config.RATE_LIMIT_DB)
+
+    return results
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Run Bell Ringers maintenance jobs')
+    parser.add_argument('--retention-days', type=int,
+                        help=f'Days of raw activity logs to keep (default: {Config.ACTIVITY_RETENTION_DAYS})')
+    parser.add_argument('--batch-size', type=int,
+                        help=f'Rows per rollup transaction (default: {Config.ACTIVITY_ROLLUP_BATCH_SIZE})')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='One-time conversion of an existing database to incremental auto-vacuum')
+    args = parser.parse_args(argv)
+
+    shards.configure_from_config()
+
+    if args.enable_incremental_vacuum:
+        print("Enabling incremental auto-vacuum (full VACUUM)...")
+        if shards.enabled:
+            db.close_cached_connections()
+            for tenant in shards.list_tenants():
+                db.enable_incremental_vacuum(shards.shard_path(tenant))
+                print(f"  {tenant}")
+            db.enable_incremental_vacuum(shards.catalog_path())
+            print("  catalog")
+        else:
+            db.enable_incremental_vacuum()
+
+    for job, result in run_maintenance(args.retention_days, args.batch_size).items():
+        print(f"{job}: {result}")
+
+
+if __name__ == '__main__':
+    main()
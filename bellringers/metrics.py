@@ -0,0 +1,354 @@
+"""
+In-process metrics for Bell Ringers
+Counters and latency histograms exposed in Prometheus text format.
+
+Each worker process keeps its own registry. When METRICS_DIR is configured,
+every process periodically writes a snapshot of its registry to a file in
+that directory (one file per process), and the metrics endpoint sums all
+snapshots so counts are correct across multiple worker processes. Snapshots
+of workers that have exited are folded into one retired snapshot, so the
+directory doesn't grow as workers are recycled.
+"""
+import atexit
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+
+try:
+    import fcntl
+except ImportError:  # Windows: exited workers' snapshots are kept as they are
+    fcntl = None
+
+
+# Latency buckets in seconds (upper bounds; +Inf is implicit)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Buckets for small per-request counts
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+# Minimum seconds between snapshot writes in multi-process mode
+FLUSH_INTERVAL = 5.0
+
+# Totals of exited workers, merged from their snapshots (see retire_snapshots)
+RETIRED_SNAPSHOT = 'metrics-retired.json'
+RETIRE_LOCK = 'metrics-retired.lock'
+
+METRIC_HELP = {
+    'bellringers_requests_total': 'HTTP requests handled, by endpoint, method and status',
+    'bellringers_request_duration_seconds': 'Time from request start until the response body has been sent',
+    'bellringers_request_db_seconds': 'Time spent holding database connections per request',
+    'bellringers_request_db_queries': 'SQL statements executed per request (DB_PROFILE only)',
+    'bellringers_gemini_requests_total': 'Gemini generation calls, by outcome',
+    'bellringers_gemini_request_duration_seconds': 'Gemini generation call latency',
+    'bellringers_gemini_tokens_total': 'Gemini tokens used by successful generations, by prompt/response kind',
+    'bellringers_cache_requests_total': 'Cache lookups, by cache name and hit/miss result',
+    'bellringers_generate_rejections_total': 'Generation requests turned away, by reason and sync/async path',
+    'bellringers_generate_queue_wait_seconds': 'Time generation requests waited for a free slot',
+    'bellringers_db_write_batches_total': 'Write queue transactions, by committed/error result',
+    'bellringers_db_write_batch_size': 'Write operations committed per write queue transaction',
+    'bellringers_db_write_batch_seconds': 'Time from the start of a write queue batch until it committed',
+    'bellringers_db_write_busy_retries_total': 'Write queue batches retried because another process held the lock',
+    'bellringers_similarity_query_seconds': 'Similarity index lookups, by related/reuse kind (including any sync)',
+    'bellringers_similarity_sync_seconds': 'Time to apply feed changes to a similarity index',
+    'bellringers_generations_reused_total': 'Generation requests served a feed item instead of calling Gemini',
+}
+
+
+class MetricsRegistry:
+    """Thread-safe store of counters and histograms for one process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, labels=None, amount=1):
+        """Increment a counter"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels=None, buckets=DEFAULT_BUCKETS):
+        """Record a value in a histogram"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    'buckets': list(buckets), 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0
+                }
+            for i, upper_bound in enumerate(histogram['buckets']):
+                if value <= upper_bound:
+                    histogram['counts'][i] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        """Return a JSON-serializable copy of the registry"""
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'histograms': [
+                    [name, list(labels), dict(h, counts=list(h['counts']))]
+                    for (name, labels), h in self._histograms.items()
+                ],
+            }
+
+
+def _label_key(labels):
+    """Turn a labels dict into a hashable, ordered key"""
+    return tuple(sorted((labels or {}).items()))
+
+
+registry = MetricsRegistry()
+
+_metrics_dir = None
+_snapshot_path = None
+_last_flush = 0.0
+
+
+def configure(metrics_dir=None):
+    """Enable multi-process aggregation through snapshot files in metrics_dir"""
+    global _metrics_dir, _snapshot_path
+    if not metrics_dir:
+        return
+    os.makedirs(metrics_dir, exist_ok=True)
+    _metrics_dir = metrics_dir
+    # Unique per process lifetime, so a recycled PID never overwrites a dead worker's totals.
+    # The host name keeps workers on other machines sharing the directory from looking dead.
+    _snapshot_path = os.path.join(
+        metrics_dir, f'metrics-{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+    atexit.register(flush)
+    retire_snapshots()
+
+
+def flush(force=True):
+    """Write this process's snapshot file (multi-process mode only)"""
+    global _last_flush
+    if not _snapshot_path:
+        return
+    now = time.monotonic()
+    if not force and now - _last_flush < FLUSH_INTERVAL:
+        return
+    _last_flush = now
+
+    _write_snapshot(_snapshot_path, registry.snapshot())
+
+
+def _write_snapshot(path, snapshot):
+    """Replace a snapshot file atomically"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+def _snapshot_owner(filename):
+    """(host, pid) of a per-process snapshot file name, or None for other files"""
+    if not filename.startswith('metrics-') or not filename.endswith('.json'):
+        return None
+    parts = filename[len('metrics-'):-len('.json')].rsplit('-', 2)
+    if len(parts) == 2:
+        # Written before snapshot names included the host
+        parts.insert(0, socket.gethostname())
+    elif len(parts) != 3:
+        return None  # The retired snapshot
+    try:
+        return parts[0], int(parts[1])
+    except ValueError:
+        return None
+
+
+def _is_running(pid):
+    """True if a process with this pid exists on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def retire_snapshots():
+    """Merge the snapshots of exited workers on this host into RETIRED_SNAPSHOT
+
+    Their files are deleted once merged, so the totals stay the same while
+    the number of files stays bounded by the live workers.
+
+    Returns:
+        Number of snapshot files merged
+    """
+    if not _metrics_dir or fcntl is None:
+        return 0
+    host = socket.gethostname()
+    dead = []
+    for filename in os.listdir(_metrics_dir):
+        owner = _snapshot_owner(filename)
+        if owner is not None and owner[0] == host and not _is_running(owner[1]):
+            dead.append(os.path.join(_metrics_dir, filename))
+    if not dead:
+        return 0
+
+    with open(os.path.join(_metrics_dir, RETIRE_LOCK), 'a') as lock:
+        # One process merges at a time, so no snapshot is counted twice
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        retired_path = os.path.join(_metrics_dir, RETIRED_SNAPSHOT)
+        snapshots = []
+        merged = []
+        for path in [retired_path] + dead:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except FileNotFoundError:
+                continue  # No retired totals yet, or merged by another process
+            except ValueError:
+                if path == retired_path:
+                    return 0  # Don't overwrite totals we can't read
+                continue
+            if path != retired_path:
+                merged.append(path)
+        if not merged:
+            return 0
+
+        counters, histograms = _merge(snapshots)
+        _write_snapshot(retired_path, {
+            'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+            'histograms': [[name, list(labels), h] for (name, labels), h in histograms.items()],
+        })
+        for path in merged:
+            os.remove(path)
+    return len(merged)
+
+
+def inc(name, labels=None, amount=1):
+    """Increment a counter in the process registry"""
+    registry.inc(name, labels, amount)
+
+
+def observe(name, value, labels=None, buckets=DEFAULT_BUCKETS):
+    """Record a histogram observation in the process registry"""
+    registry.observe(name, value, labels, buckets)
+
+
+@contextmanager
+def timer(name, labels=None):
+    """Observe the duration of the with-block in a histogram"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, labels)
+
+
+def record_cache_lookup(cache_name, hit):
+    """Count a cache hit or miss (hit ratio = hits / all lookups)"""
+    inc('bellringers_cache_requests_total', {'cache': cache_name, 'result': 'hit' if hit else 'miss'})
+
+
+def record_db_time(seconds):
+    """Add time spent on a database connection to the current request's total"""
+    if has_request_context():
+        g.db_seconds = g.get('db_seconds', 0.0) + seconds
+
+
+# ===== Aggregation & Exposition =====
+
+def collect():
+    """Merge snapshots from every worker process (or just this one)"""
+    snapshots = [registry.snapshot()]
+
+    if _metrics_dir:
+        flush()
+        retire_snapshots()
+        snapshots = []
+        for filename in os.listdir(_metrics_dir):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(_metrics_dir, filename), encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # Being replaced or unreadable; picked up on the next scrape
+    return _merge(snapshots)
+
+
+def _merge(snapshots):
+    """Sum snapshots into (counters, histograms) keyed by (name, labels)"""
+    counters = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, h in snapshot['histograms']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = dict(h, counts=list(h['counts']))
+            else:
+                if merged['buckets'] == h['buckets']:
+                    merged['counts'] = [a + b for a, b in zip(merged['counts'], h['counts'])]
+                else:
+                    # Written by a build with other buckets: add each count under its own
+                    # upper bound, so nothing is dropped and the cumulative counts still hold
+                    counts = dict(zip(merged['buckets'], merged['counts']))
+                    for upper_bound, count in zip(h['buckets'], h['counts']):
+                        counts[upper_bound] = counts.get(upper_bound, 0) + count
+                    merged['buckets'] = sorted(counts)
+                    merged['counts'] = [counts[upper_bound] for upper_bound in merged['buckets']]
+                merged['sum'] += h['sum']
+                merged['count'] += h['count']
+    return counters, histograms
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label_value(value)}"' for key, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus():
+    """Render all metrics in the Prometheus text exposition format"""
+    counters, histograms = collect()
+    lines = []
+    seen = set()
+
+    def header(name, metric_type):
+        if name not in seen:
+            seen.add(name)
+            if name in METRIC_HELP:
+                lines.append(f'# HELP {name} {METRIC_HELP[name]}')
+            lines.append(f'# TYPE {name} {metric_type}')
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, 'counter')
+        lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+    for (name, labels), h in sorted(histograms.items()):
+        header(name, 'histogram')
+        cumulative = 0
+        for upper_bound, count in zip(h['buckets'], h['counts']):
+            cumulative += count
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", upper_bound)])} {cumulative}')
+        lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {h["count"]}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(h["sum"])}')
+        lines.append(f'{name}_count{_format_labels(labels)} {h["count"]}')
+
+    return '\n'.join(lines) + '\n'
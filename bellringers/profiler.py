@@ -0,0 +1,215 @@
+"""
+Opt-in SQL profiler for Bell Ringers
+When enabled (DB_PROFILE=1), get_db() opens ProfilingConnection objects that:
+- time every statement and count the rows it returned or changed
+- log statements slower than DB_SLOW_QUERY_MS with their EXPLAIN QUERY PLAN
+- count statements and connections per request (set_trace_callback), warn
+  about statements repeated many times in one request (N+1 patterns) and
+  report the totals in X-DB-* response headers
+"""
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+from flask import g, has_request_context
+
+
+logger = logging.getLogger('bellringers.db')
+
+enabled = False
+slow_query_seconds = 0.1
+
+# Warn when the same statement runs this many times in one request
+REPEATED_STATEMENT_THRESHOLD = 5
+
+_stats_lock = threading.Lock()
+_statement_stats = {}
+
+
+def configure(enable=False, slow_query_ms=100):
+    """Turn profiling on or off and set the slow query threshold"""
+    global enabled, slow_query_seconds
+    enabled = bool(enable)
+    slow_query_seconds = slow_query_ms / 1000.0
+
+
+def normalize_sql(sql):
+    """Collapse whitespace so the same statement always has the same key"""
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+class StatementRecord:
+    """Timing and row count for one execution of a statement"""
+
+    __slots__ = ('sql', 'parameters', 'seconds', 'rows')
+
+    def __init__(self, sql, parameters):
+        self.sql = normalize_sql(sql)
+        self.parameters = parameters
+        self.seconds = 0.0
+        self.rows = 0
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    """Cursor that times execution and fetching and counts rows"""
+
+    _record = None
+
+    def _start(self, sql, parameters):
+        self._record = StatementRecord(sql, parameters)
+        self.connection.track(self._record)
+        return self._record
+
+    def execute(self, sql, parameters=()):
+        record = self._start(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record.seconds += time.perf_counter() - started
+            if self.rowcount > 0:
+                record.rows += self.rowcount
+
+    def executemany(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        record = self._start(sql, seq_of_parameters[0] if seq_of_parameters else ())
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record.seconds += time.perf_counter() - started
+            if self.rowcount > 0:
+                record.rows += self.rowcount
+
+    def _timed_fetch(self, fetch, *args):
+        started = time.perf_counter()
+        result = fetch(*args)
+        if self._record is not None:
+            self._record.seconds += time.perf_counter() - started
+        return result
+
+    def fetchone(self):
+        row = self._timed_fetch(super().fetchone)
+        if row is not None and self._record is not None:
+            self._record.rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed_fetch(super().fetchmany, size or self.arraysize)
+        if self._record is not None:
+            self._record.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed_fetch(super().fetchall)
+        if self._record is not None:
+            self._record.rows += len(rows)
+        return rows
+
+    def __next__(self):
+        row = self._timed_fetch(super().__next__)
+        if self._record is not None:
+            self._record.rows += 1
+        return row
+
+
+class ProfilingConnection(sqlite3.Connection):
+    """Connection whose cursors are profiled; call finish() before closing"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._records = []
+        self.set_trace_callback(_count_statement)
+
+    def cursor(self, factory=ProfilingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def track(self, record):
+        self._records.append(record)
+
+    def finish(self):
+        """Fold the statements run since the last finish() into the stats and log slow ones"""
+        records, self._records = self._records, []
+
+        with _stats_lock:
+            for record in records:
+                stats = _statement_stats.setdefault(
+                    record.sql, {'calls': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'rows': 0}
+                )
+                stats['calls'] += 1
+                stats['total_seconds'] += record.seconds
+                stats['max_seconds'] = max(stats['max_seconds'], record.seconds)
+                stats['rows'] += record.rows
+
+        if has_request_context():
+            g.db_query_seconds = g.get('db_query_seconds', 0.0) + sum(r.seconds for r in records)
+
+        for record in records:
+            if record.seconds >= slow_query_seconds:
+                logger.warning("Slow query (%.1f ms, %d rows): %s\n%s",
+                               record.seconds * 1000, record.rows, record.sql, self._explain(record))
+
+    def _explain(self, record):
+        """Return the EXPLAIN QUERY PLAN for a statement as indented text"""
+        self.set_trace_callback(None)
+        try:
+            plan = sqlite3.Connection.execute(self, f'EXPLAIN QUERY PLAN {record.sql}', record.parameters)
+            return '\n'.join(f'  {row[3]}' for row in plan.fetchall()) or '  (no query plan rows)'
+        except sqlite3.Error as e:
+            return f'  (no query plan: {e})'
+        finally:
+            self.set_trace_callback(_count_statement)
+
+
+def record_checkout():
+    """Count a get_db() connection checkout for the current request"""
+    if enabled and has_request_context():
+        g.db_connections = g.get('db_connections', 0) + 1
+
+
+def _count_statement(sql):
+    """Trace callback: count every statement run during the current request"""
+    if not has_request_context():
+        return
+    g.db_queries = g.get('db_queries', 0) + 1
+    counts = g.setdefault('db_statement_counts', {})
+    # Expanded SQL includes bound values; strip literals so N+1 calls share a key
+    key = re.sub(r"'[^']*'|\b\d+\b", '?', normalize_sql(sql))
+    counts[key] = counts.get(key, 0) + 1
+
+
+def request_summary():
+    """Per-request totals (statements, connections, seconds) for the current request"""
+    return {
+        'queries': g.get('db_queries', 0),
+        'connections': g.get('db_connections', 0),
+        'seconds': g.get('db_query_seconds', 0.0),
+    }
+
+
+def repeated_statements(threshold=REPEATED_STATEMENT_THRESHOLD):
+    """Statements executed at least threshold times in the current request"""
+    return {sql: count for sql, count in g.get('db_statement_counts', {}).items() if count >= threshold}
+
+
+def get_statement_stats():
+    """Aggregated per-statement stats, slowest total time first"""
+    with _stats_lock:
+        items = [dict(stats, sql=sql) for sql, stats in _statement_stats.items()]
+    for item in items:
+        item['avg_ms'] = round(item['total_seconds'] * 1000 / item['calls'], 3) if item['calls'] else 0
+    return sorted(items, key=lambda item: item['total_seconds'], reverse=True)
+
+
+def reset_statement_stats():
+    """Clear the aggregated per-statement stats"""
+    with _stats_lock:
+        _statement_stats.clear()
@@ -1,11 +1,22 @@
 """
 Main routes for Bell Ringers blueprint
 """
-from flask import render_template, request, jsonify, session
+from flask import (render_template, request, jsonify, session, Response, stream_with_context, current_app, g,
+                   send_from_directory)
+from datetime import datetime, timedelta, timezone
+import json
+import os
 import random
+from . import cache
 from . import database as db
 from . import gemini_api
+from . import limits
+from . import metrics
 from . import standards as standards_module
+from . import shards
+from . import similarity
+from . import transfer
+from .streaming import stream_page
 
 
 def register_routes(bp):
@@ -18,18 +29,42 @@ def register_routes(bp):
                              topics=gemini_api.get_topic_options(),
                              formats=gemini_api.get_format_options(),
                              constraints=gemini_api.get_constraint_options(),
-                             standards=standards_module.get_standards_list())
+                             frameworks=standards_module.get_frameworks())
+
+    @bp.route('/api/standards/search')
+    def search_standards():
+        """Typeahead search over the standards catalog
+
+        Query: q (code prefix like "2.3" or keywords), framework (optional id),
+        limit (default 10, at most 50).
+        Returns JSON: {results: [{code, description, framework, domain_name}]}
+        """
+        try:
+            limit = min(max(int(request.args.get('limit', standards_module.SEARCH_LIMIT)), 1),
+                        standards_module.MAX_SEARCH_LIMIT)
+        except ValueError:
+            limit = standards_module.SEARCH_LIMIT
+
+        results = standards_module.search_standards(request.args.get('q', ''),
+                                                    request.args.get('framework') or None, limit)
+        response = jsonify({'results': results})
+        # The catalog only changes on restart; let the browser reuse repeated keystrokes
+        response.headers['Cache-Control'] = 'private, max-age=300'
+        return response
 
     @bp.route('/api/generate', methods=['POST'])
     def generate():
         """
         Generate a bell ringer based on parameters
-        Expects JSON: {topic, format, constraint, prompt, standards: []}
+        Expects JSON: {topic, format, constraint, prompt, standards: [], fresh}
+
+        With SIMILAR_REUSE_THRESHOLD set, a matching feed item is returned
+        instead (source "similar", with its similar_id) unless fresh is true.
         """
         data = request.get_json()
-        user_handle = session.get('user_handle')
+        user_id = session.get('user_id')
 
-        if not user_handle:
+        if not user_id:
             return jsonify({'error': 'No user session'}), 401
 
         topic = data.get('topic')
@@ -38,21 +73,36 @@ def register_routes(bp):
         prompt = data.get('prompt', '')
         standard_codes = data.get('standards', [])
 
-        # Generate using Gemini API
+        # Generate using Gemini API, unless the feed already has a match
         try:
-            content = gemini_api.generate_bell_ringer(topic, format_type, constraint, standard_codes, prompt)
-
-            # Log the API request
-            db.log_activity(user_handle, 'generate', f'{topic} - {format_type} - {constraint}')
-            db.update_last_active(user_handle)
+            generation = None
+            if not data.get('fresh'):
+                generation = similarity.reuse(topic, format_type, constraint, standard_codes, prompt)
+            if generation is None:
+                limits.check_rate(limits.user_key(session.get('user_handle'), session.get('user_tenant')))
+                generation = gemini_api.generate(topic, format_type, constraint, standard_codes, prompt,
+                                                 slot=limits.admit)
+
+            # Log the API request with its token usage
+            db.log_generation(user_id, topic, format_type, constraint, generation)
+            db.update_last_active(user_id)
 
             return jsonify({
                 'success': True,
-                'content': content,
+                'content': generation['content'],
                 'topic': topic,
                 'format': format_type,
-                'constraint': constraint
+                'constraint': constraint,
+                # Sent back with save/publish so the alignment is stored
+                'standards': standard_codes,
+                'source': generation['source'],
+                'similar_id': generation.get('similar_id')
             })
+        except limits.Rejected as rejected:
+            limits.record_rejection(rejected, 'sync')
+            response = jsonify({'error': rejected.message})
+            response.headers['Retry-After'] = str(rejected.retry_after)
+            return response, rejected.status
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
@@ -68,13 +118,13 @@ def register_routes(bp):
         result = {}
 
         if not locked.get('topic'):
-            result['topic'] = random.choice(gemini_api.get_topic_options())
+            result['topic'] = random.choice(gemini_api.TOPIC_OPTIONS)
 
         if not locked.get('format'):
-            result['format'] = random.choice(gemini_api.get_format_options())
+            result['format'] = random.choice(gemini_api.FORMAT_OPTIONS)
 
         if not locked.get('constraint'):
-            result['constraint'] = random.choice(gemini_api.get_constraint_options())
+            result['constraint'] = random.choice(gemini_api.CONSTRAINT_OPTIONS)
 
         return jsonify(result)
 
@@ -82,19 +132,20 @@ def register_routes(bp):
     def save():
         """Save a bell ringer to user's private binder"""
         data = request.get_json()
-        user_handle = session.get('user_handle')
+        user_id = session.get('user_id')
 
-        if not user_handle:
+        if not user_id:
             return jsonify({'error': 'No user session'}), 401
 
         try:
             bell_ringer_id = db.save_bell_ringer(
-                owner_handle=user_handle,
+                owner_id=user_id,
                 topic=data.get('topic'),
                 format_type=data.get('format'),
                 constraint=data.get('constraint'),
                 content=data.get('content'),
-                is_public=False
+                is_public=False,
+                standards=standards_module.resolve_codes(data.get('standards'))
             )
 
             return jsonify({'success': True, 'id': bell_ringer_id})
@@ -105,19 +156,20 @@ def register_routes(bp):
     def publish():
         """Publish a bell ringer to the public feed (requires admin approval)"""
         data = request.get_json()
-        user_handle = session.get('user_handle')
+        user_id = session.get('user_id')
 
-        if not user_handle:
+        if not user_id:
             return jsonify({'error': 'No user session'}), 401
 
         try:
             bell_ringer_id = db.save_bell_ringer(
-                owner_handle=user_handle,
+                owner_id=user_id,
                 topic=data.get('topic'),
                 format_type=data.get('format'),
                 constraint=data.get('constraint'),
                 content=data.get('content'),
-                is_public=True
+                is_public=True,
+                standards=standards_module.resolve_codes(data.get('standards'))
             )
 
             return jsonify({
@@ -131,13 +183,17 @@ def register_routes(bp):
     @bp.route('/api/add-to-binder/<int:bell_ringer_id>', methods=['POST'])
     def add_to_binder(bell_ringer_id):
         """Add a public bell ringer to user's binder"""
-        user_handle = session.get('user_handle')
+        user_id = session.get('user_id')
 
-        if not user_handle:
+        if not user_id:
             return jsonify({'error': 'No user session'}), 401
 
         try:
-            success = db.add_to_binder(user_handle, bell_ringer_id)
+            # Feed ids are catalog ids in sharding mode
+            if shards.enabled:
+                success = shards.add_to_binder_from_catalog(user_id, bell_ringer_id)
+            else:
+                success = db.add_to_binder(user_id, bell_ringer_id)
             if success:
                 return jsonify({'success': True, 'message': 'Added to your binder!'})
             else:
@@ -148,16 +204,116 @@ def register_routes(bp):
     @bp.route('/binder')
     def binder():
         """My Binder page - user's private collection"""
-        user_handle = session.get('user_handle')
+        user_id = session.get('user_id')
 
-        print(f"Binder page - Session data: {dict(session)}")  # Debug logging
+        current_app.logger.debug("Binder page for user: %s", session.get('user_handle'))
 
-        if not user_handle:
+        filters = standard_filters()
+
+        if not user_id:
             error_msg = 'No user session. Please reload the page to create a session.'
-            return render_template('bellringers/binder.html', bell_ringers=[], error=error_msg)
+            return render_template('bellringers/binder.html', bell_ringers=[], error=error_msg, **filters)
+
+        user = g.get('user')
+        if user is None or filters['standard'] or filters['domain']:
+            # Rows are read from the cursor while the page streams out
+            return stream_page('bellringers/binder.html',
+                               bell_ringers=db.iter_user_binder(user_id, filters['standard'], filters['domain'],
+                                                                summary=True),
+                               **filters)
+
+        # The binder version (read by check_session) changes whenever the page would
+        etag = cache.binder_etag(user_id, user)
+        if request.if_none_match.contains_weak(etag):
+            metrics.record_cache_lookup('binder_etag', True)
+            response = Response(status=304)
+        else:
+            metrics.record_cache_lookup('binder_etag', False)
+            db_path = db.current_db_path()
+            rows = cache.get_binder(db_path, user_id, user['binder_version'])
+            if rows is None:
+                # Stream from the cursor and keep the rows for the next visit
+                rows = cache.cache_binder_rows(db_path, user_id, user['binder_version'],
+                                               db.iter_user_binder(user_id, summary=True))
+            response = stream_page('bellringers/binder.html', bell_ringers=rows, **filters)
+
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    @bp.route('/api/binder/<int:bell_ringer_id>/content')
+    def binder_content(bell_ringer_id):
+        """Full content of a binder item, loaded when its card is expanded"""
+        user_id = session.get('user_id')
+
+        if not user_id:
+            return jsonify({'error': 'No user session'}), 401
+
+        bell_ringer = db.get_binder_bell_ringer(user_id, bell_ringer_id)
+        if not bell_ringer:
+            return jsonify({'error': 'Bell ringer not found'}), 404
+
+        return content_response(bell_ringer)
+
+    @bp.route('/api/binder/changes')
+    def binder_changes():
+        """Binder changes since a previous sync, for the offline service worker
+
+        Query: since (cursor from the last response; omit for the whole binder)
+        and version (binder version from the last response).
+        Returns JSON: {user, version, cursor, full, added: [rows], removed: [ids]}
+        """
+        user_id = session.get('user_id')
+        user = g.get('user')
+
+        if not user_id or user is None:
+            return jsonify({'error': 'No user session'}), 401
+
+        since = parse_sync_cursor(request.args.get('since'))
+        payload = {'user': cache.user_stamp(user_id, user), 'version': user['binder_version']}
+
+        # Nothing was written to the binder since the last sync
+        if since is not None and request.args.get('version') == str(user['binder_version']):
+            return jsonify(dict(payload, cursor=request.args['since'], full=False, added=[], removed=[]))
+
+        # Removals older than the tombstone retention are gone; start over
+        retention = timedelta(days=current_app.config.get('BINDER_TOMBSTONE_RETENTION_DAYS', 30))
+        if since is not None and since < datetime.now(timezone.utc).replace(tzinfo=None) - retention:
+            since = None
+
+        changes = db.get_binder_changes(user_id, since and request.args['since'])
+        return jsonify(dict(payload,
+                            cursor=changes['cursor'],
+                            full=since is None,
+                            added=[dict(row) for row in changes['added']],
+                            removed=changes['removed']))
+
+    @bp.route('/sw.js')
+    def service_worker():
+        """Offline binder service worker, served from here so its scope covers /bellringers/"""
+        response = send_from_directory(os.path.join(bp.static_folder, 'bellringers', 'js'), 'sw.js',
+                                       mimetype='text/javascript', max_age=0)
+        # Browsers check for a new worker on navigation; always revalidate
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    @bp.route('/api/export/binder')
+    def export_binder():
+        """Stream the current user's binder as NDJSON or CSV"""
+        user_id = session.get('user_id')
+
+        if not user_id:
+            return jsonify({'error': 'No user session'}), 401
 
-        bell_ringers = db.get_user_binder(user_handle)
-        return render_template('bellringers/binder.html', bell_ringers=bell_ringers)
+        fmt = request.args.get('format', 'ndjson')
+        if fmt not in transfer.FORMATS:
+            return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+
+        return Response(
+            stream_with_context(transfer.export_user_binder(user_id, fmt)),
+            mimetype=transfer.MIMETYPES[fmt],
+            headers={'Content-Disposition': f'attachment; filename=binder.{fmt}'}
+        )
 
     @bp.route('/api/debug/session')
     def debug_session():
@@ -177,13 +333,57 @@ def register_routes(bp):
     def feed():
         """The Feed page - public bell ringers"""
         sort_by = request.args.get('sort', 'new')
-        bell_ringers = db.get_public_feed(sort_by)
         user_handle = session.get('user_handle')
+        filters = standard_filters()
+
+        # Rows are read from the cursor while the page streams out
+        return stream_page('bellringers/feed.html',
+                           bell_ringers=db.iter_public_feed(sort_by, filters['standard'], filters['domain']),
+                           sort_by=sort_by,
+                           user_handle=user_handle,
+                           **filters)
+
+    @bp.route('/api/feed/<int:bell_ringer_id>/content')
+    def feed_content(bell_ringer_id):
+        """Full content of a feed item (by feed id), loaded when its card is expanded"""
+        bell_ringer = db.get_feed_bell_ringer(bell_ringer_id)
+
+        if not bell_ringer:
+            return jsonify({'error': 'Bell ringer not found'}), 404
+
+        return content_response(bell_ringer)
 
-        return render_template('bellringers/feed.html',
-                             bell_ringers=bell_ringers,
-                             sort_by=sort_by,
-                             user_handle=user_handle)
+    @bp.route('/api/feed/<int:bell_ringer_id>/related')
+    def feed_related(bell_ringer_id):
+        """Feed items most similar to a feed item ("More like this")
+
+        Query: limit (default 5, at most 20).
+        Returns JSON: {results: [{id, topic, format, constraint, owner_handle, excerpt, sections, score}]}
+        """
+        try:
+            limit = min(max(int(request.args.get('limit', similarity.RELATED_LIMIT)), 1),
+                        similarity.MAX_RELATED_LIMIT)
+        except ValueError:
+            limit = similarity.RELATED_LIMIT
+
+        related = similarity.related(bell_ringer_id, limit)
+        if related is None:
+            return jsonify({'error': 'Bell ringer not found'}), 404
+
+        rows = {row['id']: row for row in db.get_feed_summaries([item_id for item_id, _ in related])}
+        response = jsonify({'results': [{
+            'id': item_id,
+            'topic': rows[item_id]['topic'],
+            'format': rows[item_id]['format'],
+            'constraint': rows[item_id]['constraint_type'],
+            'owner_handle': rows[item_id]['owner_handle'],
+            'excerpt': rows[item_id]['excerpt'],
+            'sections': json.loads(rows[item_id]['sections'] or '[]'),
+            'score': score,
+        } for item_id, score in related if item_id in rows]})
+        # The feed changes slowly; repeated clicks on the same card can reuse the answer
+        response.headers['Cache-Control'] = 'private, max-age=300'
+        return response
 
     @bp.route('/print/<int:bell_ringer_id>')
     def print_view(bell_ringer_id):
@@ -194,3 +394,48 @@ def register_routes(bp):
             return "Bell ringer not found", 404
 
         return render_template('bellringers/print.html', bell_ringer=bell_ringer)
+
+    @bp.route('/feed/print/<int:bell_ringer_id>')
+    def feed_print_view(bell_ringer_id):
+        """Print-optimized view for a feed bell ringer (served from the shared catalog when sharded)"""
+        bell_ringer = db.get_feed_bell_ringer(bell_ringer_id)
+
+        if not bell_ringer:
+            return "Bell ringer not found", 404
+
+        return render_template('bellringers/print.html', bell_ringer=bell_ringer)
+
+
+def content_response(bell_ringer):
+    """JSON response with a bell ringer's full HTML content and section metadata
+
+    Content never changes after saving, so browsers may reuse it for a while.
+    """
+    response = jsonify({
+        'id': bell_ringer['id'],
+        'content': bell_ringer['content'],
+        'sections': json.loads(bell_ringer['sections'] or '[]'),
+    })
+    response.headers['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+
+def standard_filters():
+    """Standard/domain filter from the query string, plus the domain choices for the filter form
+
+    Standards are typed into a search box (see /api/standards/search) rather
+    than listed, since the catalog can hold several frameworks.
+    """
+    return {
+        'standard': request.args.get('standard', '').strip() or None,
+        'domain': request.args.get('domain', '').strip() or None,
+        'domain_options': standards_module.get_domains(),
+    }
+
+
+def parse_sync_cursor(value):
+    """Parse a binder sync cursor (a database timestamp), or None if missing or invalid"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    except (TypeError, ValueError):
+        return None
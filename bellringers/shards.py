@@ -0,0 +1,364 @@
+"""
+Per-tenant database sharding for multi-school deployments
+
+When SHARDING_ENABLED is set, every tenant (school/domain) gets its own
+SQLite file under SHARD_DIR/tenants/, selected per request from the host
+name (or SHARD_TENANT_HEADER when behind a proxy). Each shard has its own
+users, binders, logs, admins and writer lock. Shards are provisioned ahead
+of time with the create command; requests for any other tenant get a 404.
+
+The public feed is served from a shared catalog (SHARD_DIR/catalog.db)
+that the maintenance job rebuilds by merging every shard's approved public
+bell ringers. Feed pages open it read-only.
+
+Command line usage (from the project root):
+    python -m bellringers.shards list
+    python -m bellringers.shards create tenant [--admin-username name]
+    python -m bellringers.shards migrate [tenant]
+    python -m bellringers.shards vacuum [tenant]
+    python -m bellringers.shards merge
+"""
+import argparse
+import getpass
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+
+from flask import abort, g, request
+
+from . import database as db
+from .config import Config
+
+
+enabled = False
+shard_dir = None
+tenant_header = ''
+
+DEFAULT_TENANT = 'default'
+
+_initialized = set()
+_init_lock = threading.Lock()
+
+
+def configure(enable=False, directory=None, header=''):
+    """Turn sharding on or off and point the catalog at SHARD_DIR"""
+    global enabled, shard_dir, tenant_header
+    enabled = bool(enable)
+    shard_dir = directory or os.path.join(os.path.dirname(__file__), 'shards')
+    tenant_header = header or ''
+
+    db.CACHE_CONNECTIONS = enabled
+    db.CATALOG_PATH = catalog_path() if enabled else None
+    if enabled:
+        os.makedirs(os.path.join(shard_dir, 'tenants'), exist_ok=True)
+        if not os.path.exists(catalog_path()):
+            db.init_catalog(catalog_path())
+
+
+def configure_from_config(config=Config):
+    """Configure from a Config class (command line tools)"""
+    configure(config.SHARDING_ENABLED, config.SHARD_DIR, config.SHARD_TENANT_HEADER)
+
+
+def catalog_path():
+    """Path of the shared public catalog"""
+    return os.path.join(shard_dir, 'catalog.db')
+
+
+def normalize_tenant(name):
+    """Turn a host name or header value into a safe shard name"""
+    name = (name or '').split(':')[0].strip().lower()
+    name = re.sub(r'[^a-z0-9.-]', '', name).strip('.-')
+    return name or DEFAULT_TENANT
+
+
+def shard_path(tenant):
+    """Path of a tenant's database file"""
+    return os.path.join(shard_dir, 'tenants', f'{normalize_tenant(tenant)}.db')
+
+
+def list_tenants():
+    """Names of all tenants that have a shard"""
+    tenants_dir = os.path.join(shard_dir, 'tenants')
+    if not os.path.isdir(tenants_dir):
+        return []
+    return sorted(filename[:-3] for filename in os.listdir(tenants_dir) if filename.endswith('.db'))
+
+
+def ensure_shard(tenant):
+    """Bring a provisioned tenant's shard up to date on first use in this process
+
+    Unknown tenants are never created here (see create_shard), so a made-up
+    host name can't add shard files or get an admin account.
+
+    Returns:
+        Path of the shard, or None if the tenant has not been provisioned
+    """
+    path = shard_path(tenant)
+    if path in _initialized:
+        return path
+    if not os.path.exists(path):
+        return None
+
+    with _init_lock:
+        if path not in _initialized:
+            db.init_db(path)
+            _initialized.add(path)
+    return path
+
+
+def create_shard(tenant, admin_username, admin_password):
+    """Provision a tenant's shard with its own admin account
+
+    Returns:
+        Path of the shard
+
+    Raises:
+        ValueError: The tenant already has a shard
+    """
+    path = shard_path(tenant)
+    if os.path.exists(path):
+        raise ValueError(f"Tenant {normalize_tenant(tenant)} already exists")
+
+    with _init_lock:
+        db.init_db(path)
+        password_hash = hashlib.sha256(admin_password.encode()).hexdigest()
+        with db.use_database(path):
+            db.create_admin(admin_username, password_hash)
+        _initialized.add(path)
+    return path
+
+
+def tenant_from_host(host, header_value=None):
+    """Tenant for a request's Host header (or the SHARD_TENANT_HEADER value)"""
+    if tenant_header:
+        return normalize_tenant(header_value)
+    return normalize_tenant(host)
+
+
+def resolve_tenant():
+    """Tenant for the current request"""
+    return tenant_from_host(request.host, request.headers.get(tenant_header) if tenant_header else None)
+
+
+def select_shard(tenant):
+    """Shard path for a tenant of the current request (404 if not provisioned)"""
+    path = ensure_shard(tenant)
+    if path is None:
+        abort(404)
+    return path
+
+
+def current_tenant():
+    """Tenant selected for the current request"""
+    return g.get('tenant', DEFAULT_TENANT)
+
+
+def add_to_binder_from_catalog(user_id, catalog_id):
+    """Add a feed (catalog) bell ringer to the current tenant user's binder
+
+    Items from the user's own tenant are added directly. Items from other
+    tenants are copied into this shard, and the binder count is bumped in
+    the source shard so the next merge carries it into the catalog.
+
+    Returns:
+        True if added, False if already in the binder or not in the catalog
+    """
+    item = db.get_feed_bell_ringer(catalog_id)
+    if item is None:
+        return False
+
+    if item['tenant'] == current_tenant():
+        return db.add_to_binder(user_id, item['source_id'])
+
+    standards = db.get_bell_ringer_standards(catalog_id, catalog_path())
+    added = db.add_catalog_copy_to_binder(user_id, item, standards)
+    source_path = ensure_shard(item['tenant'])
+    if added and source_path is not None:
+        with db.use_database(source_path):
+            db.increment_binder_count(item['source_id'])
+    return added
+
+
+# ===== Maintenance =====
+
+def merge_catalog():
+    """Upsert every shard's approved public bell ringers into the catalog
+
+    Rows are matched on (tenant, source_id) so catalog ids stay stable
+    between merges; rows no longer public in their shard are removed.
+
+    Returns:
+        Dict mapping tenant to the number of catalog rows it now has
+    """
+    db.init_catalog(catalog_path())
+    tenants = list_tenants()
+    results = {}
+
+    conn = sqlite3.connect(catalog_path(), timeout=30.0)
+    try:
+        catalog_columns = [row[1] for row in conn.execute('PRAGMA main.table_info(bell_ringers)')]
+
+        for tenant in tenants:
+            conn.execute('ATTACH DATABASE ? AS shard', (shard_path(tenant),))
+            try:
+                shard_columns = {row[1] for row in conn.execute('PRAGMA shard.table_info(bell_ringers)')}
+                columns = [c for c in catalog_columns
+                           if c in shard_columns and c not in ('id', 'tenant', 'source_id')]
+                column_list = ', '.join(columns)
+                updates = ', '.join(f'{c} = excluded.{c}' for c in columns)
+
+                conn.execute(f'''
+                    INSERT INTO main.bell_ringers (tenant, source_id, {column_list})
+                    SELECT ?, id, {column_list} FROM shard.bell_ringers
+                    WHERE is_public = 1 AND is_approved = 1
+                    ON CONFLICT (tenant, source_id) DO UPDATE SET {updates}
+                ''', (tenant,))
+                # Owner ids are shard-local; the catalog shows the handle instead
+                conn.execute('''
+                    UPDATE main.bell_ringers
+                    SET owner_handle = (SELECT handle FROM shard.users WHERE shard.users.id = main.bell_ringers.owner_id)
+                    WHERE tenant = ? AND owner_handle IS NULL
+                ''', (tenant,))
+                conn.execute('''
+                    DELETE FROM main.bell_ringers
+                    WHERE tenant = ? AND source_id NOT IN (
+                        SELECT id FROM shard.bell_ringers WHERE is_public = 1 AND is_approved = 1
+                    )
+                ''', (tenant,))
+                _merge_standards(conn, tenant)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.execute('DETACH DATABASE shard')
+
+            results[tenant] = conn.execute(
+                'SELECT COUNT(*) FROM bell_ringers WHERE tenant = ?', (tenant,)
+            ).fetchone()[0]
+
+        # Drop catalog rows of shards that no longer exist
+        placeholders = ', '.join('?' for _ in tenants)
+        conn.execute(f'DELETE FROM bell_ringers WHERE tenant NOT IN ({placeholders})', tenants)
+        conn.execute('''
+            DELETE FROM bell_ringer_standards
+            WHERE bell_ringer_id NOT IN (SELECT id FROM bell_ringers)
+        ''')
+        conn.commit()
+    finally:
+        conn.close()
+
+    return results
+
+
+def _merge_standards(conn, tenant):
+    """Replace the catalog's standards rows for one attached shard's bell ringers"""
+    conn.execute('''
+        DELETE FROM main.bell_ringer_standards
+        WHERE bell_ringer_id IN (SELECT id FROM main.bell_ringers WHERE tenant = ?)
+    ''', (tenant,))
+    # Shards not opened since the upgrade don't have the table yet
+    if conn.execute("SELECT 1 FROM shard.sqlite_master WHERE name = 'bell_ringer_standards'").fetchone():
+        conn.execute('''
+            INSERT INTO main.bell_ringer_standards (bell_ringer_id, standard_code, domain)
+            SELECT c.id, s.standard_code, s.domain
+            FROM shard.bell_ringer_standards s
+            INNER JOIN main.bell_ringers c ON c.tenant = ? AND c.source_id = s.bell_ringer_id
+        ''', (tenant,))
+
+
+def shard_info(tenant):
+    """Size and row counts for one shard"""
+    path = shard_path(tenant)
+    with db.get_db(path, read_only=True) as conn:
+        cursor = conn.cursor()
+        cursor.execute('PRAGMA page_count')
+        page_count = cursor.fetchone()[0]
+        cursor.execute('PRAGMA freelist_count')
+        free_pages = cursor.fetchone()[0]
+        cursor.execute('SELECT COUNT(*) FROM users')
+        users = cursor.fetchone()[0]
+        cursor.execute('SELECT COUNT(*) FROM bell_ringers')
+        bell_ringers = cursor.fetchone()[0]
+
+    return {
+        'tenant': tenant,
+        'path': path,
+        'size_bytes': os.path.getsize(path),
+        'pages': page_count,
+        'free_pages': free_pages,
+        'users': users,
+        'bell_ringers': bell_ringers,
+    }
+
+
+def migrate_shard(tenant):
+    """Bring a shard's schema up to date (idempotent)"""
+    db.init_db(shard_path(tenant))
+
+
+def vacuum_shard(tenant):
+    """Rebuild a shard's file to reclaim free pages"""
+    db.close_cached_connections()
+    conn = sqlite3.connect(shard_path(tenant), timeout=30.0)
+    try:
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Manage Bell Ringers tenant shards')
+    parser.add_argument('command', choices=('list', 'create', 'migrate', 'vacuum', 'merge'))
+    parser.add_argument('tenant', nargs='?',
+                        help='Tenant to create, or limit migrate/vacuum to one tenant (default: all)')
+    parser.add_argument('--admin-username', default=Config.DEFAULT_ADMIN_USERNAME,
+                        help='Admin account for a new tenant (create only)')
+    args = parser.parse_args(argv)
+
+    configure_from_config()
+    if not enabled:
+        print("Note: SHARDING_ENABLED is not set; operating on SHARD_DIR anyway.")
+        configure(True, Config.SHARD_DIR, Config.SHARD_TENANT_HEADER)
+
+    tenants = [normalize_tenant(args.tenant)] if args.tenant else list_tenants()
+
+    if args.tenant and args.command != 'create' and not os.path.exists(shard_path(args.tenant)):
+        parser.error(f"Unknown tenant {tenants[0]} (see the create command)")
+
+    if args.command == 'create':
+        if not args.tenant:
+            parser.error('create needs a tenant name')
+        password = getpass.getpass(f"Password for {args.admin_username} on {tenants[0]}: ")
+        if not password:
+            parser.error('the admin password must not be empty')
+        try:
+            path = create_shard(tenants[0], args.admin_username, password)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Created {tenants[0]} at {path}")
+    elif args.command == 'list':
+        print(f"{'tenant':<32}{'size (KiB)':>12}{'free pages':>12}{'users':>8}{'bell ringers':>14}")
+        for tenant in tenants:
+            info = shard_info(tenant)
+            print(f"{tenant:<32}{info['size_bytes'] // 1024:>12}{info['free_pages']:>12}"
+                  f"{info['users']:>8}{info['bell_ringers']:>14}")
+    elif args.command == 'migrate':
+        for tenant in tenants:
+            migrate_shard(tenant)
+            print(f"Migrated {tenant}")
+    elif args.command == 'vacuum':
+        for tenant in tenants:
+            vacuum_shard(tenant)
+            print(f"Vacuumed {tenant}")
+    else:
+        for tenant, count in merge_catalog().items():
+            print(f"{tenant}: {count} public bell ringers in catalog")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,473 @@
+"""
+"More like this": an in-process similarity index over the public feed
+Each feed item is a sparse TF-IDF vector of the words and word pairs in its
+text (all of it, answer key included), plus its topic, format, constraint
+and standards as extra features. Features are hashed into N_FEATURES
+buckets, so there is no vocabulary to build or share between processes.
+
+The vectors are kept feature-major (one posting list per feature, as NumPy
+arrays), so scoring a query against the whole feed only touches the
+postings of the query's features: a gather and a bincount.
+
+Every worker process builds its index on first use and then keeps it in
+step with the database incrementally. Comparing the feed's ids (a scan of
+the visibility index) with the indexed ones shows which items were
+approved, merged into the catalog or deleted by any process; only those
+items are then read and added or removed. New items get their own small set of posting lists and removed
+ones are masked out, so a change costs about as much as the items changed;
+once enough changes add up, everything is compacted into one set of posting
+lists again, with IDF weights refreshed from the per-item document
+frequencies, in one vectorized pass.
+
+The index also backs SIMILAR_REUSE_THRESHOLD: a generation request that an
+existing feed item already answers is served that item instead of calling
+Gemini (see reuse()).
+"""
+import html
+import random
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from . import database as db
+from . import gemini_api
+from . import metrics
+
+N_FEATURES = 2 ** 18
+# Combines two word hashes into the hash of the pair (odd, and small enough
+# that a 32-bit hash times it fits in 64 bits)
+PAIR_MULTIPLIER = 1000003
+
+# Topic, format, constraint and standard features weigh as much as a word
+# that appears this many times
+METADATA_WEIGHT = 3.0
+
+RELATED_LIMIT = 5
+MAX_RELATED_LIMIT = 20
+# Neighbors scoring below this (cosine similarity) aren't worth showing
+MIN_SCORE = 0.05
+
+# Seconds between checks for feed changes made by other processes
+SYNC_SECONDS = 2.0
+
+# Items added or removed since the last compaction are kept apart (added ones
+# in a small second set of postings, removed ones masked out) until there are
+# more than COMPACT_RATIO of the index (and at least COMPACT_MIN_CHANGES)
+COMPACT_RATIO = 0.1
+COMPACT_MIN_CHANGES = 256
+
+# Recorded as the model of generations served from the feed
+REUSE_MODEL = 'similarity-index'
+
+STOP_WORDS = frozenset('''
+    a an and are as at be by can do does for from has have how if in into is it its of on or so
+    than that the their then there these this to was what when which while who will with you your
+'''.split())
+
+_WORD_RE = re.compile(r'[a-z0-9_]+')
+_TAG_RE = re.compile(r'<[^>]*>')
+
+# Minimum prompt coverage for reuse (0 disables it); set by configure()
+reuse_threshold = 0.0
+
+
+def configure(config):
+    """Set the reuse threshold
+
+    Args:
+        config: Mapping with SIMILAR_REUSE_THRESHOLD (e.g. app.config)
+    """
+    global reuse_threshold
+    reuse_threshold = float(config.get('SIMILAR_REUSE_THRESHOLD') or 0.0)
+
+
+def content_text(content):
+    """Text of a bell ringer's HTML content (a plain tag strip: cheaper than parsing it)"""
+    return html.unescape(_TAG_RE.sub(' ', content or ''))
+
+
+def tokenize(text):
+    """Words of text, lowercased, without stop words"""
+    return [word for word in _WORD_RE.findall((text or '').lower())
+            if len(word) > 1 and word not in STOP_WORDS]
+
+
+def metadata_tokens(topic, format_type, constraint, standard_codes=()):
+    """Feature names for a bell ringer's slots and standards (never produced by tokenize())"""
+    names = [f'topic:{topic}', f'format:{format_type}', f'constraint:{constraint}']
+    return [name.lower() for name in names] + [f'standard:{code}' for code in standard_codes]
+
+
+# crc32 of recently seen words; most words of a new item were seen before
+_word_hashes = {}
+WORD_HASH_CACHE_SIZE = 1 << 17
+
+
+def _hashes(tokens):
+    """crc32 of each token (int64)"""
+    global _word_hashes
+    if len(_word_hashes) > WORD_HASH_CACHE_SIZE:
+        # Replaced rather than cleared, since other threads may be reading it
+        _word_hashes = {}
+    known = _word_hashes
+    for token in set(tokens).difference(known):
+        known[token] = zlib.crc32(token.encode('utf-8'))
+    return np.fromiter(map(known.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+
+
+def vectorize(words, metadata=(), pairs=True):
+    """Sparse term weights of words and (with pairs) adjacent word pairs
+
+    Each distinct feature weighs 1 + log(count), plus METADATA_WEIGHT per
+    metadata feature. Word pairs are hashed from their words' hashes, so
+    only words go through crc32.
+
+    Returns:
+        (features, weights): sorted unique feature ids (int32) and their weights (float32)
+    """
+    hashes = _hashes(words)
+    if pairs and len(hashes) > 1:
+        hashes = np.concatenate([hashes, hashes[:-1] * PAIR_MULTIPLIER + hashes[1:]])
+    features, counts = np.unique(hashes % N_FEATURES, return_counts=True)
+    weights = 1.0 + np.log(counts)
+    if metadata:
+        features, inverse = np.unique(np.concatenate([features, _hashes(metadata) % N_FEATURES]),
+                                      return_inverse=True)
+        weights = np.bincount(inverse, weights=np.concatenate([weights, np.full(len(metadata), METADATA_WEIGHT)]))
+    return features.astype(np.int32), weights.astype(np.float32)
+
+
+def slot_key(topic, format_type, constraint):
+    """Key matching requests and items with the same topic, format and constraint"""
+    return '\x1f'.join(str(value or '').lower() for value in (topic, format_type, constraint))
+
+
+class _Document:
+    """One feed item's vector and what reuse() matches on"""
+    __slots__ = ('features', 'weights', 'slots', 'standards')
+
+    def __init__(self, row):
+        standards = row['standards'].split(',') if row['standards'] else []
+        self.features, self.weights = vectorize(
+            tokenize(content_text(row['content'])),
+            metadata_tokens(row['topic'], row['format'], row['constraint_type'], standards))
+        self.slots = slot_key(row['topic'], row['format'], row['constraint_type'])
+        self.standards = frozenset(standards)
+
+
+class _Postings:
+    """Immutable feature-major arrays for a set of documents
+
+    postings[start[f]:start[f + 1]] hold the positions of the documents
+    containing feature f, and values the matching TF-IDF weights (using the
+    idf given, so one set of IDF weights can be shared by several).
+    """
+
+    def __init__(self, ids, documents, idf):
+        self.ids = np.array(ids, dtype=np.int64)
+        self.position = {bell_ringer_id: i for i, bell_ringer_id in enumerate(ids)}
+        self.documents = documents
+        self.slots = np.array([document.slots for document in documents], dtype=object)
+        self.norms = np.ones(len(documents))
+        if not documents:
+            return
+
+        lengths = np.array([len(document.features) for document in documents])
+        rows = np.repeat(np.arange(len(documents), dtype=np.int32), lengths)
+        features = np.concatenate([document.features for document in documents])
+        values = np.concatenate([document.weights for document in documents]) * idf[features]
+
+        norms = np.sqrt(np.bincount(rows, weights=values.astype(np.float64) ** 2, minlength=len(documents)))
+        self.norms = np.maximum(norms, 1e-9)
+
+        # Order within a posting list doesn't matter, so the sort needn't be stable
+        order = np.argsort(features)
+        self.postings = rows[order]
+        self.values = values[order]
+        self.start = np.zeros(N_FEATURES + 1, dtype=np.int64)
+        np.cumsum(np.bincount(features, minlength=N_FEATURES), out=self.start[1:])
+
+    def scores(self, features, weights, presence=False):
+        """Sum of weights[i] * value over the postings of features[i], per document
+
+        Args:
+            presence: Count each posting as 1 instead of its TF-IDF weight
+        """
+        scores = np.zeros(len(self.ids), dtype=np.float64)
+        if not len(self.ids):
+            return scores
+        starts = self.start[features]
+        lengths = self.start[features + 1] - starts
+        total = int(lengths.sum())
+        if not total:
+            return scores
+        # Positions of every posting of every query feature, without a Python loop
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        contributions = np.repeat(weights, lengths)
+        if not presence:
+            contributions = contributions * self.values[offsets]
+        return np.bincount(self.postings[offsets], weights=contributions, minlength=len(self.ids))
+
+
+class _View:
+    """What queries read: the compacted postings, plus those of the items added
+    since the last compaction, minus the items removed since (masked out)
+
+    Positions run over the compacted documents first, then the added ones.
+    """
+
+    def __init__(self, base, added, removed, idf):
+        self.base = base
+        self.added = added
+        self.idf = idf
+        self.ids = np.concatenate([base.ids, added.ids])
+        self.slots = np.concatenate([base.slots, added.slots])
+        self.live = np.ones(len(self.ids), dtype=bool)
+        self.live[[base.position[bell_ringer_id] for bell_ringer_id in removed]] = False
+
+    def position(self, bell_ringer_id):
+        """Position of a feed item, or None if it isn't in the feed"""
+        position = self.added.position.get(bell_ringer_id)
+        if position is not None:
+            return len(self.base.ids) + position
+        position = self.base.position.get(bell_ringer_id)
+        return position if position is not None and self.live[position] else None
+
+    def document(self, position):
+        if position < len(self.base.ids):
+            return self.base.documents[position]
+        return self.added.documents[position - len(self.base.ids)]
+
+    def cosine(self, features, weights):
+        """Cosine similarity of a raw term vector to every document (-1 for removed ones)"""
+        query = weights * self.idf[features]
+        query /= np.sqrt(np.dot(query, query)) or 1.0
+        scores = np.concatenate([part.scores(features, query) / part.norms for part in (self.base, self.added)])
+        scores[~self.live] = -1.0
+        return scores
+
+    def coverage(self, features):
+        """Share of the features' IDF mass that each document contains (1.0 = all of them)"""
+        idf = self.idf[features]
+        idf = idf / (idf.sum() or 1.0)
+        return np.concatenate([part.scores(features, idf, presence=True) for part in (self.base, self.added)])
+
+
+class SimilarityIndex:
+    """Similarity index over the feed of one database file (the catalog when sharded)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._documents = {}
+        self._df = np.zeros(N_FEATURES, dtype=np.int32)
+        self._synced_at = None
+        # Postings and IDF weights as of the last compaction, and the changes since
+        self._base = None
+        self._idf = None
+        self._added = {}
+        self._removed = set()
+        self._view = None
+
+    def expire(self):
+        """Check for feed changes before the next query"""
+        self._synced_at = None
+
+    def _due(self):
+        return self._synced_at is None or time.monotonic() - self._synced_at >= SYNC_SECONDS
+
+    def view(self):
+        """Current view of the feed, after picking up any feed changes"""
+        if self._due():
+            self.sync(only_if_due=True)
+        view = self._view
+        if view is None:
+            with self._lock:
+                if self._view is None:
+                    self._view = self._build_view()
+                view = self._view
+        return view
+
+    def _build_view(self):
+        changes = len(self._added) + len(self._removed)
+        if self._base is None or changes > max(COMPACT_MIN_CHANGES, COMPACT_RATIO * len(self._base.ids)):
+            ids = list(self._documents)
+            self._idf = (np.log((1.0 + len(ids)) / (1.0 + self._df)) + 1.0).astype(np.float32)
+            self._base = _Postings(ids, [self._documents[i] for i in ids], self._idf)
+            self._added = {}
+            self._removed = set()
+        added_ids = list(self._added)
+        added = _Postings(added_ids, [self._added[i] for i in added_ids], self._idf)
+        return _View(self._base, added, self._removed, self._idf)
+
+    def sync(self, only_if_due=False):
+        """Add feed items that are new to the index and drop those no longer in the feed
+
+        Args:
+            only_if_due: Skip the check if another thread just made it
+
+        Returns:
+            (added, removed) item counts
+        """
+        with self._lock:
+            if only_if_due and not self._due():
+                return 0, 0
+            started = time.perf_counter()
+            added = removed = 0
+            with db.use_database(self.path):
+                # The id sets themselves, since any summary of them can collide
+                feed_ids = set(db.get_feed_ids())
+                for bell_ringer_id in self._documents.keys() - feed_ids:
+                    self._remove(bell_ringer_id)
+                    removed += 1
+                new_ids = sorted(feed_ids - self._documents.keys())
+                for row in db.iter_feed_documents(new_ids) if new_ids else ():
+                    self._add(row)
+                    added += 1
+            if added or removed:
+                self._view = None
+                metrics.observe('bellringers_similarity_sync_seconds', time.perf_counter() - started)
+            self._synced_at = time.monotonic()
+            return added, removed
+
+    def _add(self, row):
+        document = _Document(row)
+        self._documents[row['id']] = document
+        self._added[row['id']] = document
+        # Features are unique within a document, so plain fancy indexing adds once each
+        self._df[document.features] += 1
+
+    def _remove(self, bell_ringer_id):
+        document = self._documents.pop(bell_ringer_id)
+        self._added.pop(bell_ringer_id, None)
+        if self._base is not None and bell_ringer_id in self._base.position:
+            self._removed.add(bell_ringer_id)
+        self._df[document.features] -= 1
+
+    def related(self, bell_ringer_id, limit=RELATED_LIMIT):
+        """Feed items most similar to a feed item
+
+        Returns:
+            List of (id, score) pairs, best first, or None if the item isn't in the feed
+        """
+        view = self.view()
+        position = view.position(bell_ringer_id)
+        if position is None:
+            return None
+        document = view.document(position)
+        scores = view.cosine(document.features, document.weights)
+        scores[position] = -1.0
+        return _top(view.ids, scores, limit)
+
+    def find_reusable(self, topic, format_type, constraint, standard_codes=(), user_prompt='', threshold=0.0):
+        """The feed item that best answers a generation request, if any answers it
+
+        Candidates have the same topic, format and constraint and are aligned
+        to every requested standard. With a prompt, a candidate must also
+        contain at least threshold of the prompt's words (IDF-weighted; word
+        order is ignored, since prompts are usually a few keywords).
+        Ties (e.g. every candidate when there's no prompt) are broken at
+        random, so repeated spins don't always serve the same item.
+
+        Returns:
+            (id, score) or None
+        """
+        view = self.view()
+        candidates = np.flatnonzero((view.slots == slot_key(topic, format_type, constraint)) & view.live)
+        if standard_codes:
+            wanted = set(standard_codes)
+            candidates = np.array([i for i in candidates if wanted <= view.document(i).standards],
+                                  dtype=np.int64)
+        if not len(candidates):
+            return None
+
+        prompt_words = tokenize(user_prompt)
+        if prompt_words:
+            features, _ = vectorize(prompt_words, pairs=False)
+            scores = view.coverage(features)[candidates]
+        else:
+            scores = np.ones(len(candidates))
+        best = scores.max()
+        if best < threshold:
+            return None
+        choice = random.choice(candidates[scores == best].tolist())
+        return int(view.ids[choice]), float(best)
+
+
+def _top(ids, scores, limit):
+    """(id, score) of the limit best-scoring documents above MIN_SCORE"""
+    limit = min(limit, len(scores))
+    if limit <= 0:
+        return []
+    best = np.argpartition(-scores, limit - 1)[:limit]
+    best = best[np.argsort(-scores[best], kind='stable')]
+    return [(int(ids[i]), round(float(scores[i]), 4)) for i in best if scores[i] >= MIN_SCORE]
+
+
+# One index per feed database file (the catalog in sharding mode)
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index():
+    """The similarity index for the current feed"""
+    path = db.CATALOG_PATH or db.current_db_path()
+    index = _indexes.get(path)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(path)
+            if index is None:
+                index = _indexes[path] = SimilarityIndex(path)
+    return index
+
+
+def expire():
+    """Make every index check for feed changes on its next query (e.g. after approvals)"""
+    for index in list(_indexes.values()):
+        index.expire()
+
+
+def related(bell_ringer_id, limit=RELATED_LIMIT):
+    """Feed items most similar to a feed item (see SimilarityIndex.related())"""
+    started = time.perf_counter()
+    try:
+        return get_index().related(bell_ringer_id, limit)
+    finally:
+        metrics.observe('bellringers_similarity_query_seconds', time.perf_counter() - started,
+                        {'kind': 'related'})
+
+
+def reuse(topic, format_type, constraint, standard_codes=(), user_prompt=''):
+    """A feed item to serve in place of a new generation, when reuse is enabled and one matches
+
+    Returns:
+        None, or a result dict shaped like gemini_api.generate()'s (source
+        SOURCE_SIMILAR, no tokens, no cost) plus similar_id and score
+    """
+    if reuse_threshold <= 0:
+        return None
+    started = time.perf_counter()
+    match = get_index().find_reusable(topic, format_type, constraint, standard_codes, user_prompt,
+                                      reuse_threshold)
+    metrics.observe('bellringers_similarity_query_seconds', time.perf_counter() - started, {'kind': 'reuse'})
+    bell_ringer = db.get_feed_bell_ringer(match[0]) if match else None
+    if bell_ringer is None:
+        return None
+
+    metrics.inc('bellringers_generations_reused_total')
+    return {
+        'content': bell_ringer['content'],
+        'model': REUSE_MODEL,
+        'source': gemini_api.SOURCE_SIMILAR,
+        'prompt_tokens': None,
+        'response_tokens': None,
+        'latency_ms': round((time.perf_counter() - started) * 1000),
+        'retries': 0,
+        'cost': 0.0,
+        'error': None,
+        'similar_id': bell_ringer['id'],
+        'score': round(match[1], 4),
+    }
@@ -1,77 +1,118 @@
 """
 Standards management for Bell Ringers
-Reads CS standards from markdown file with hierarchical structure:
+Reads CS standards frameworks from markdown files (one framework per file in
+the standards directory) with hierarchical structure:
+- Title (# Framework Name)
 - Domains (## Domain X – Name)
 - Standards (### Standard X.Y – Description)
 - Performance Indicators (* **X.Y.Z** Description)
+
+Every framework is loaded into a SQLite catalog with an FTS5 index for the
+generator's typeahead search. The catalog is rebuilt only when the files
+change. Indicator codes of the default framework (Intro_CS) are used as is
+("2.3.5"); codes from other frameworks are qualified with the framework id,
+which is the file name without .md ("AP_CSP:1.2.1").
 """
+import glob
 import os
 import re
+import sqlite3
 
+from . import database as db
 
-STANDARDS_FILE = os.path.join(os.path.dirname(__file__), 'standards', 'Intro_CS.md')
 
+STANDARDS_DIR = os.path.join(os.path.dirname(__file__), 'standards')
+CATALOG_FILE = os.path.join(os.path.dirname(__file__), 'standards_catalog.db')
 
-def parse_standards_from_markdown(file_path):
-    """Parse standards from a markdown file with hierarchical structure
+# Framework whose codes are stored unqualified (the original single standards file)
+DEFAULT_FRAMEWORK = 'Intro_CS'
 
-    Expected format:
-    ## Domain X – Domain Name
-    ### Standard X.Y – Standard Description
-    * **X.Y.Z** Performance indicator description
+# Bump when the catalog schema changes, so existing catalogs are rebuilt
+CATALOG_SCHEMA_VERSION = 1
+
+# Sorts after any character in a code, so [prefix, prefix + PREFIX_UPPER_BOUND)
+# is the range of codes starting with prefix
+PREFIX_UPPER_BOUND = '\uffff'
+
+# Parsed once per process by load_standards()
+_catalog_path = None
+_standards = None
+_standards_list = None
+_domains = None
+_frameworks = None
+
+TITLE_PATTERN = r'^#\s+([^\n#][^\n]*)'
+DOMAIN_PATTERN = r'##\s+Domain\s+(\d+)\s*[–—-]\s*([^\n]+)'
+STANDARD_PATTERN = r'###\s+Standard\s+([\d\.]+)\s*[–—-]\s*([^\n]+)'
+INDICATOR_PATTERN = r'\*\s+\*\*([\d\.]+)\*\*\s+([^\n]+)'
+
+# Search input that looks like a code ("2.3", "AP_CSP:1.2") rather than keywords
+CODE_QUERY = re.compile(r'^([A-Za-z0-9_-]+:)?\d[\d.]*$')
+
+SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+
+
+def parse_framework_markdown(file_path):
+    """Parse one framework file
 
     Returns:
-        Dictionary mapping performance indicator codes to descriptions
-        Format: {"X.Y.Z": "Indicator description"}
+        (title, indicators): the file's "# " title (or None) and a list of dicts
+        with domain, domain_name, standard, standard_description, code and
+        description keys, in file order
     """
-    standards = {}
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
 
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+    title = re.search(TITLE_PATTERN, content, re.MULTILINE)
+    indicators = []
 
-        # Split by domains (## Domain X)
-        domain_pattern = r'##\s+Domain\s+(\d+)\s*[–—-]\s*([^\n]+)'
-        domain_sections = re.split(domain_pattern, content)
+    # Split by domains (## Domain X); process each domain (skipping the preamble)
+    domain_sections = re.split(DOMAIN_PATTERN, content)
+    for i in range(1, len(domain_sections) - 2, 3):
+        domain_num = domain_sections[i].strip()
+        domain_name = domain_sections[i + 1].strip()
 
-        # Process each domain (skipping the preamble)
-        for i in range(1, len(domain_sections), 3):
-            if i + 2 > len(domain_sections):
-                break
+        # Split by standards (### Standard X.Y)
+        standard_sections = re.split(STANDARD_PATTERN, domain_sections[i + 2])
+        for j in range(1, len(standard_sections) - 2, 3):
+            standard_num = standard_sections[j].strip()
+            standard_desc = standard_sections[j + 1].strip()
 
-            domain_num = domain_sections[i].strip()
-            domain_name = domain_sections[i + 1].strip()
-            domain_content = domain_sections[i + 2]
+            # Extract performance indicators (* **X.Y.Z** Description)
+            for indicator_code, indicator_desc in re.findall(INDICATOR_PATTERN, standard_sections[j + 2]):
+                indicators.append({
+                    'domain': domain_num,
+                    'domain_name': domain_name,
+                    'standard': standard_num,
+                    'standard_description': standard_desc,
+                    'code': indicator_code.strip(),
+                    'description': indicator_desc.strip(),
+                })
 
-            # Split by standards (### Standard X.Y)
-            standard_pattern = r'###\s+Standard\s+([\d\.]+)\s*[–—-]\s*([^\n]+)'
-            standard_sections = re.split(standard_pattern, domain_content)
+    return (title.group(1).strip() if title else None), indicators
 
-            # Process each standard
-            for j in range(1, len(standard_sections), 3):
-                if j + 2 > len(standard_sections):
-                    break
 
-                standard_num = standard_sections[j].strip()
-                standard_desc = standard_sections[j + 1].strip()
-                standard_content = standard_sections[j + 2]
-
-                # Extract performance indicators (* **X.Y.Z** Description)
-                indicator_pattern = r'\*\s+\*\*([\d\.]+)\*\*\s+([^\n]+)'
-                indicators = re.findall(indicator_pattern, standard_content)
+def parse_standards_from_markdown(file_path):
+    """Parse standards from a markdown file with hierarchical structure
 
-                for indicator_code, indicator_desc in indicators:
-                    # Store with just the indicator description
-                    # (Keep it concise for the dropdown)
-                    standards[indicator_code.strip()] = indicator_desc.strip()
+    Expected format:
+    ## Domain X – Domain Name
+    ### Standard X.Y – Standard Description
+    * **X.Y.Z** Performance indicator description
 
+    Returns:
+        Dictionary mapping performance indicator codes to descriptions
+        Format: {"X.Y.Z": "Indicator description"}
+    """
+    try:
+        _, indicators = parse_framework_markdown(file_path)
     except FileNotFoundError:
-        pass  # Will use defaults
+        return {}  # Will use defaults
     except Exception as e:
         print(f"Error parsing standards file: {e}")
-        pass  # Will use defaults
-
-    return standards
+        return {}  # Will use defaults
+    return {indicator['code']: indicator['description'] for indicator in indicators}
 
 
 def get_default_standards():
@@ -101,19 +142,202 @@ def get_default_standards():
     }
 
 
-def get_standards():
-    """Get standards from file or return defaults"""
-    # Try to parse from file first
-    standards = parse_standards_from_markdown(STANDARDS_FILE)
+def qualify(framework, code):
+    """Catalog code for a framework's local indicator code"""
+    return code if framework == DEFAULT_FRAMEWORK else f'{framework}:{code}'
+
+
+def _sort_key(code):
+    """Sortable string for a local code ("2.3.10" after "2.3.9")"""
+    return '.'.join(part.zfill(4) for part in code.split('.'))
+
+
+# ===== Catalog =====
+
+def _source_files(directory):
+    """Framework markdown files, default framework first"""
+    files = sorted(glob.glob(os.path.join(directory, '*.md')))
+    return sorted(files, key=lambda path: _framework_id(path) != DEFAULT_FRAMEWORK)
+
+
+def _framework_id(path):
+    """Framework id from a file name ("AP CSP.md" -> "AP_CSP")"""
+    return re.sub(r'[^A-Za-z0-9_-]', '_', os.path.splitext(os.path.basename(path))[0])
+
+
+def _signature(files):
+    """Identifies the set and versions of source files a catalog was built from"""
+    parts = [f'v{CATALOG_SCHEMA_VERSION}']
+    for path in files:
+        stat = os.stat(path)
+        parts.append(f'{os.path.basename(path)}:{stat.st_mtime_ns}:{stat.st_size}')
+    return ';'.join(parts)
+
+
+def _catalog_signature(catalog_path):
+    """Signature stored in an existing catalog, or None"""
+    try:
+        conn = sqlite3.connect(f'file:{catalog_path}?mode=ro', uri=True)
+    except sqlite3.Error:
+        return None
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+        return row[0] if row else None
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
 
-    # If no standards loaded from file, use defaults
-    if not standards:
-        standards = get_default_standards()
-    else:
-        # Add "None" option to parsed standards
-        standards = {"None": "No specific standard - generate general content", **standards}
 
-    return standards
+def _load_frameworks(files):
+    """(framework id, name, indicators) for every parsable file, or the defaults"""
+    frameworks = []
+    for path in files:
+        try:
+            title, indicators = parse_framework_markdown(path)
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"Error parsing standards file {path}: {e}")
+            continue
+        if indicators:
+            framework = _framework_id(path)
+            frameworks.append((framework, title or framework, indicators))
+
+    if not frameworks:
+        indicators = [{
+            'domain': code.split('.')[0],
+            'domain_name': f"Domain {code.split('.')[0]}",
+            'standard': code.rsplit('.', 1)[0],
+            'standard_description': '',
+            'code': code,
+            'description': description,
+        } for code, description in get_default_standards().items() if code != "None"]
+        frameworks.append((DEFAULT_FRAMEWORK, 'Introduction to Computer Science', indicators))
+    return frameworks
+
+
+def build_catalog(catalog_path, directory):
+    """Parse every framework file into a fresh catalog and swap it in
+
+    The catalog is written to a temporary file and renamed over the old one,
+    so other workers never read a half-built catalog.
+    """
+    files = _source_files(directory)
+    signature = _signature(files)
+    tmp_path = f'{catalog_path}.{os.getpid()}.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript('''
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE frameworks (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                position INTEGER NOT NULL
+            );
+            CREATE TABLE domains (
+                id TEXT PRIMARY KEY,
+                framework TEXT NOT NULL,
+                name TEXT NOT NULL,
+                sort_key TEXT NOT NULL
+            );
+            CREATE TABLE standards (
+                id INTEGER PRIMARY KEY,
+                code TEXT UNIQUE NOT NULL,
+                framework TEXT NOT NULL,
+                local_code TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                domain_name TEXT NOT NULL,
+                standard_description TEXT NOT NULL,
+                description TEXT NOT NULL,
+                sort_key TEXT NOT NULL
+            );
+            -- Code prefix lookups for the typeahead
+            CREATE INDEX idx_standards_local_code ON standards (local_code);
+            -- Keyword lookups for the typeahead
+            CREATE VIRTUAL TABLE standards_fts USING fts5(
+                code, description, standard_description, domain_name,
+                content='standards', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            );
+        ''')
+
+        for position, (framework, name, indicators) in enumerate(_load_frameworks(files)):
+            conn.execute('INSERT INTO frameworks (id, name, position) VALUES (?, ?, ?)',
+                         (framework, name, position))
+            domains = {}
+            for indicator in indicators:
+                domain = qualify(framework, indicator['domain'])
+                domains[domain] = indicator['domain_name']
+                conn.execute('''
+                    INSERT OR IGNORE INTO standards
+                    (code, framework, local_code, domain, domain_name, standard_description, description, sort_key)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (qualify(framework, indicator['code']), framework, indicator['code'], domain,
+                      indicator['domain_name'], indicator['standard_description'], indicator['description'],
+                      f"{position:04d}:{_sort_key(indicator['code'])}"))
+            conn.executemany('INSERT INTO domains (id, framework, name, sort_key) VALUES (?, ?, ?, ?)', [
+                (domain, framework, domain_name, f"{position:04d}:{_sort_key(domain.split(':')[-1])}")
+                for domain, domain_name in domains.items()
+            ])
+
+        conn.execute("INSERT INTO standards_fts (standards_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO meta (key, value) VALUES ('signature', ?)", (signature,))
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, catalog_path)
+
+
+def load_standards(directory=None, catalog_path=None):
+    """Bring the catalog up to date with the standards files and cache the lookups
+
+    Called once at startup; later calls pick up edited or added files.
+
+    Args:
+        directory: Directory of framework markdown files (default: STANDARDS_DIR)
+        catalog_path: Catalog database file (default: CATALOG_FILE)
+    """
+    global _catalog_path, _standards, _standards_list, _domains, _frameworks
+    directory = directory or STANDARDS_DIR
+    catalog_path = catalog_path or CATALOG_FILE
+
+    if _catalog_signature(catalog_path) != _signature(_source_files(directory)):
+        build_catalog(catalog_path, directory)
+        # Cached connections still read the replaced file
+        db.close_cached_connections()
+
+    with db.get_db(catalog_path, read_only=True) as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT code, description FROM standards ORDER BY sort_key')
+        rows = [tuple(row) for row in cursor.fetchall()]
+        cursor.execute('SELECT id, name FROM domains ORDER BY sort_key')
+        domains = [tuple(row) for row in cursor.fetchall()]
+        cursor.execute('''
+            SELECT f.id, f.name, COUNT(s.id) AS standards
+            FROM frameworks f LEFT JOIN standards s ON s.framework = f.id
+            GROUP BY f.id ORDER BY f.position
+        ''')
+        frameworks = [tuple(row) for row in cursor.fetchall()]
+
+    # "None" comes first, then every framework in catalog order
+    _standards_list = [("None", "No specific standard - generate general content")] + rows
+    _standards = dict(_standards_list)
+    _domains = domains
+    _frameworks = frameworks
+    _catalog_path = catalog_path
+
+
+def get_standards():
+    """Get every loaded standard as a code -> description dict
+
+    The dict is shared by all callers; do not modify it.
+    """
+    if _standards is None:
+        load_standards()
+    return _standards
 
 
 def get_standard_description(code):
@@ -125,21 +349,101 @@ def get_standard_description(code):
 def get_standards_list():
     """Get list of (code, description) tuples for dropdown
 
-    Returns sorted list with "None" first, then numerically sorted indicators
+    Returns sorted list with "None" first, then each framework's indicators
+    sorted numerically
+    """
+    if _standards_list is None:
+        load_standards()
+    return _standards_list
+
+
+def get_domains():
+    """Get list of (domain, name) tuples for the domain filter"""
+    if _domains is None:
+        load_standards()
+    return _domains
+
+
+def get_frameworks():
+    """Get list of (framework id, name, indicator count) tuples"""
+    if _frameworks is None:
+        load_standards()
+    return _frameworks
+
+
+def get_domain(code):
+    """Domain of an indicator code ("2.3.5" -> "2", "AP_CSP:1.2.1" -> "AP_CSP:1")"""
+    framework, _, local_code = code.rpartition(':')
+    domain = local_code.split('.', 1)[0]
+    return f'{framework}:{domain}' if framework else domain
+
+
+def resolve_codes(codes):
+    """Keep the known indicator codes from a client-supplied list
+
+    Args:
+        codes: Standard codes as sent by the generator form
+
+    Returns:
+        List of (code, domain) tuples, without duplicates or "None"
     """
+    if not isinstance(codes, (list, tuple)):
+        return []
     standards = get_standards()
+    resolved = {}
+    for code in codes:
+        if isinstance(code, str) and code != "None" and code in standards:
+            resolved[code] = get_domain(code)
+    return list(resolved.items())
 
-    def sort_key(item):
-        code = item[0]
-        # "None" comes first
-        if code == "None":
-            return (0, [])
-        # Parse numeric codes like "2.3.7" and sort numerically
-        try:
-            parts = [int(x) for x in code.split('.')]
-            return (1, parts)
-        except (ValueError, AttributeError):
-            # Fallback for non-numeric codes
-            return (2, [0])
 
-    return sorted(standards.items(), key=sort_key)
+def search_standards(query, framework=None, limit=SEARCH_LIMIT):
+    """Top catalog matches for a typeahead query
+
+    Queries that look like codes ("2.3", "AP_CSP:1.2") match code prefixes
+    in catalog order; anything else is a keyword search over codes,
+    descriptions and domain names, best matches first.
+
+    Args:
+        query: Text typed by the user
+        framework: Optional framework id to search within
+        limit: Maximum number of results
+
+    Returns:
+        List of dicts with code, description, framework and domain_name
+    """
+    query = (query or '').strip()
+    if not query:
+        return []
+    if _catalog_path is None:
+        load_standards()
+
+    framework_clause = 'AND s.framework = ?' if framework else ''
+    framework_params = [framework] if framework else []
+
+    with db.get_db(_catalog_path, read_only=True) as conn:
+        cursor = conn.cursor()
+        if CODE_QUERY.match(query):
+            # Qualified prefixes match the full code, bare ones the code within any framework
+            column = 's.code' if ':' in query else 's.local_code'
+            cursor.execute(f'''
+                SELECT s.code, s.description, s.framework, s.domain_name FROM standards s
+                WHERE {column} >= ? AND {column} < ? {framework_clause}
+                ORDER BY s.sort_key
+                LIMIT ?
+            ''', [query, query + PREFIX_UPPER_BOUND] + framework_params + [limit])
+        else:
+            terms = re.findall(r'\w+', query)
+            if not terms:
+                return []
+            # Every word must match, the last one (still being typed) as a prefix
+            match = ' '.join(f'"{term}"' for term in terms[:-1]) + f' "{terms[-1]}"*'
+            cursor.execute(f'''
+                SELECT s.code, s.description, s.framework, s.domain_name
+                FROM standards_fts
+                INNER JOIN standards s ON s.id = standards_fts.rowid
+                WHERE standards_fts MATCH ? {framework_clause}
+                ORDER BY bm25(standards_fts, 10.0, 4.0, 1.0, 1.0)
+                LIMIT ?
+            ''', [match.strip()] + framework_params + [limit])
+        return [dict(row) for row in cursor.fetchall()]
@@ -122,15 +122,17 @@ function setupGenerator() {
     }
 
     // Generate button handler
-    generateBtn.addEventListener('click', generateBellRinger);
+    generateBtn.addEventListener('click', () => generateBellRinger());
 
     // Clear standards button handler
     if (clearStandardsBtn) {
         clearStandardsBtn.addEventListener('click', () => {
-            document.querySelectorAll('.standards-checkbox').forEach(cb => cb.checked = false);
+            document.getElementById('standardsChecklist').replaceChildren();
         });
     }
 
+    setupStandardsSearch();
+
     // Initialize with random values
     randomizeUnlocked();
 }
@@ -186,7 +188,8 @@ function randomizeUnlocked() {
     }
 }
 
-async function generateBellRinger() {
+async function generateBellRinger(fresh = false) {
+    // fresh: skip feed matches and always call Gemini (keeps the current slots)
     const generateBtn = document.getElementById('generateBtn');
     const resultContainer = document.getElementById('resultContainer');
     const resultContent = document.getElementById('resultContent');
@@ -196,7 +199,7 @@ async function generateBellRinger() {
     generateBtn.innerHTML = '<span class="spinner"></span> Generating...';
 
     // If advanced options are hidden, randomize everything
-    if (!advancedOptionsVisible) {
+    if (!advancedOptionsVisible && !fresh) {
         randomizeUnlocked();
     }
 
@@ -221,7 +224,8 @@ async function generateBellRinger() {
                 format: format,
                 constraint: constraint,
                 prompt: prompt,
-                standards: standards
+                standards: standards,
+                fresh: fresh
             })
         });
 
@@ -235,6 +239,12 @@ async function generateBellRinger() {
                 setTimeout(() => location.reload(), 1000);
                 return;
             }
+            if (response.status === 429 || response.status === 503) {
+                // Rate limited or generator busy: the server says when to retry
+                const data = await response.json();
+                alert(data.error);
+                return;
+            }
             throw new Error(`HTTP ${response.status}: ${response.statusText}`);
         }
 
@@ -244,6 +254,7 @@ async function generateBellRinger() {
         if (data.success) {
             currentGeneration = data;
             resultContent.innerHTML = data.content;
+            document.getElementById('similarNotice').hidden = data.source !== 'similar';
             resultContainer.classList.add('active');
             resultContainer.scrollIntoView({ behavior: 'smooth' });
         } else {
@@ -265,8 +276,13 @@ async function saveBellRinger() {
     const saveBtn = document.getElementById('saveBtn');
     saveBtn.disabled = true;
 
+    // A feed item served instead of a generation is added to the binder, not saved again
+    const url = currentGeneration.similar_id
+        ? `/bellringers/api/add-to-binder/${currentGeneration.similar_id}`
+        : '/bellringers/api/save';
+
     try {
-        const response = await fetch('/bellringers/api/save', {
+        const response = await fetch(url, {
             method: 'POST',
             credentials: 'include',
             headers: { 'Content-Type': 'application/json' },
@@ -277,6 +293,9 @@ async function saveBellRinger() {
 
         if (data.success) {
             showAlert('Saved to your binder!', 'success');
+            requestBinderSync();
+        } else if (data.message) {
+            showAlert(data.message, 'info');
         } else {
             showAlert('Error: ' + data.error, 'error');
         }
@@ -291,6 +310,10 @@ async function saveBellRinger() {
 
 async function publishBellRinger() {
     if (!currentGeneration) return;
+    if (currentGeneration.similar_id) {
+        showAlert('This bell ringer is already in the feed', 'info');
+        return;
+    }
 
     const publishBtn = document.getElementById('publishBtn');
     publishBtn.disabled = true;
@@ -371,6 +394,7 @@ async function addToBinder(bellRingerId, button) {
 
         if (data.success) {
             showAlert(data.message, 'success');
+            requestBinderSync();
             button.textContent = '✓ In Binder';
         } else {
             showAlert(data.message, 'info');
@@ -472,6 +496,288 @@ async function deleteBellRinger(bellRingerId, button) {
     }
 }
 
+// ===== Bulk Moderation =====
+function getSelectedIds() {
+    return Array.from(document.querySelectorAll('.moderation-checkbox:checked'))
+        .map(cb => parseInt(cb.value, 10));
+}
+
+function updateSelection() {
+    const count = getSelectedIds().length;
+    const countDisplay = document.getElementById('selectionCount');
+    if (countDisplay) {
+        countDisplay.textContent = `${count} selected`;
+    }
+
+    ['bulkApproveBtn', 'bulkDeleteBtn'].forEach(id => {
+        const button = document.getElementById(id);
+        if (button) button.disabled = count === 0;
+    });
+}
+
+function toggleSelectAll(checkbox) {
+    document.querySelectorAll('.moderation-checkbox').forEach(cb => cb.checked = checkbox.checked);
+    updateSelection();
+}
+
+async function bulkModerate(action, button) {
+    const ids = getSelectedIds();
+    if (ids.length === 0) return;
+
+    if (action === 'delete' && !confirm(`Are you sure you want to delete ${ids.length} bell ringer(s)?`)) {
+        return;
+    }
+
+    button.disabled = true;
+
+    try {
+        // One request (and one transaction) for the whole selection
+        const response = await fetch(`/bellringers/admin/api/bulk-${action}`, {
+            method: 'POST',
+            credentials: 'include',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ ids: ids })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            // Approved or deleted items both leave the current queue view
+            data.ids.forEach(id => {
+                const card = document.querySelector(`.card[data-id="${id}"]`);
+                if (card) card.remove();
+            });
+            const verb = action === 'approve' ? 'Approved' : 'Deleted';
+            showAlert(`${verb} ${data.count} bell ringer(s)`, 'success');
+        } else {
+            showAlert('Error: ' + data.error, 'error');
+        }
+
+    } catch (error) {
+        console.error('Bulk moderation error:', error);
+        showAlert('Error applying bulk action', 'error');
+    } finally {
+        const selectAll = document.getElementById('selectAllItems');
+        if (selectAll) selectAll.checked = false;
+        updateSelection();
+    }
+}
+
+// ===== Card Expansion =====
+async function toggleContent(button, url) {
+    // Cards show an excerpt; the full content is fetched the first time a card is expanded
+    const card = button.closest('.card');
+    const fullContent = card.querySelector('.card-full-content');
+    const excerpt = card.querySelector('.card-excerpt');
+    const expand = fullContent.hidden;
+
+    if (expand && !fullContent.dataset.loaded) {
+        button.disabled = true;
+        try {
+            const response = await fetch(url);
+            const data = await response.json();
+            if (!response.ok) {
+                showAlert(data.error || 'Failed to load bell ringer', 'error');
+                return;
+            }
+            fullContent.innerHTML = data.content;
+            fullContent.dataset.loaded = 'true';
+        } catch (error) {
+            console.error('Error loading content:', error);
+            showAlert('Failed to load bell ringer', 'error');
+            return;
+        } finally {
+            button.disabled = false;
+        }
+    }
+
+    fullContent.hidden = !expand;
+    if (excerpt) excerpt.hidden = expand;
+    button.textContent = expand ? '▴ Collapse' : '▾ Expand';
+    button.setAttribute('aria-expanded', String(expand));
+}
+
+async function toggleRelated(button, url) {
+    // Similar feed items are fetched the first time "More like this" is opened
+    const related = button.closest('.card').querySelector('.card-related');
+    const show = related.hidden;
+
+    if (show && !related.dataset.loaded) {
+        button.disabled = true;
+        try {
+            const response = await fetch(url);
+            const data = await response.json();
+            if (!response.ok) {
+                showAlert(data.error || 'Failed to load similar bell ringers', 'error');
+                return;
+            }
+            renderRelated(related, data.results);
+            related.dataset.loaded = 'true';
+        } catch (error) {
+            console.error('Error loading similar bell ringers:', error);
+            showAlert('Failed to load similar bell ringers', 'error');
+            return;
+        } finally {
+            button.disabled = false;
+        }
+    }
+
+    related.hidden = !show;
+    button.setAttribute('aria-expanded', String(show));
+}
+
+function renderRelated(container, results) {
+    const heading = document.createElement('h4');
+    heading.textContent = results.length ? 'More like this' : 'No similar bell ringers yet';
+    const items = results.map(item => {
+        const link = document.createElement('a');
+        link.className = 'related-item';
+        link.href = `/bellringers/feed/print/${item.id}`;
+        link.target = '_blank';
+        const title = document.createElement('strong');
+        title.textContent = `${item.topic} · ${item.format} · ${item.constraint}`;
+        const excerpt = document.createElement('span');
+        excerpt.textContent = item.excerpt;
+        link.append(title, excerpt);
+        return link;
+    });
+    container.replaceChildren(heading, ...items);
+}
+
+// ===== Standards Search =====
+const STANDARDS_SEARCH_DELAY = 200;
+
+function debounce(fn, delay) {
+    let timer = null;
+    return (...args) => {
+        clearTimeout(timer);
+        timer = setTimeout(() => fn(...args), delay);
+    };
+}
+
+function standardsSearcher() {
+    // Returns search(query, framework) that cancels the previous request still in flight
+    let controller = null;
+    return async (query, framework) => {
+        if (controller) controller.abort();
+        controller = new AbortController();
+
+        const params = new URLSearchParams({ q: query });
+        if (framework) params.set('framework', framework);
+        try {
+            const response = await fetch(`/bellringers/api/standards/search?${params}`,
+                                         { signal: controller.signal });
+            if (!response.ok) return null;
+            return (await response.json()).results;
+        } catch (error) {
+            if (error.name !== 'AbortError') console.error('Standards search failed:', error);
+            return null;
+        }
+    };
+}
+
+function setupStandardsSearch() {
+    const input = document.getElementById('standardsSearch');
+    const framework = document.getElementById('standardsFramework');
+    const resultsDiv = document.getElementById('standardsResults');
+    if (!input) return;
+
+    const search = standardsSearcher();
+    const update = debounce(async () => {
+        const query = input.value.trim();
+        if (!query) {
+            resultsDiv.replaceChildren();
+            return;
+        }
+        const results = await search(query, framework ? framework.value : '');
+        if (results === null) return;
+
+        resultsDiv.replaceChildren(...results.map(result => {
+            const option = document.createElement('button');
+            option.type = 'button';
+            option.className = 'standards-result';
+            option.setAttribute('role', 'option');
+            const code = document.createElement('strong');
+            code.textContent = result.code;
+            option.append(code, ` - ${result.description}`);
+            option.addEventListener('click', () => {
+                selectStandard(result.code, result.description);
+                input.value = '';
+                resultsDiv.replaceChildren();
+                input.focus();
+            });
+            return option;
+        }));
+        if (!results.length) {
+            resultsDiv.textContent = 'No matching standards';
+        }
+    }, STANDARDS_SEARCH_DELAY);
+
+    input.addEventListener('input', update);
+    if (framework) framework.addEventListener('change', update);
+}
+
+function selectStandard(code, description) {
+    // Adds a checked item to the selected list (generateBellRinger reads the checked boxes)
+    const checklist = document.getElementById('standardsChecklist');
+    const existing = Array.from(checklist.querySelectorAll('.standards-checkbox')).find(cb => cb.value === code);
+    if (existing) {
+        existing.checked = true;
+        return;
+    }
+
+    const item = document.createElement('label');
+    item.className = 'standards-checkbox-item';
+    const checkbox = document.createElement('input');
+    checkbox.type = 'checkbox';
+    checkbox.name = 'standards';
+    checkbox.value = code;
+    checkbox.className = 'standards-checkbox';
+    checkbox.checked = true;
+    const label = document.createElement('span');
+    label.className = 'standards-checkbox-label';
+    const strong = document.createElement('strong');
+    strong.textContent = code;
+    label.append(strong, ` - ${description.length > 60 ? description.slice(0, 60) + '...' : description}`);
+    item.append(checkbox, label);
+    checklist.appendChild(item);
+}
+
+function setupStandardFilter() {
+    // Feed/binder filter: suggest matching codes as the user types
+    const input = document.getElementById('standardFilter');
+    const options = document.getElementById('standardFilterOptions');
+    if (!input || !options) return;
+
+    const search = standardsSearcher();
+    input.addEventListener('input', debounce(async () => {
+        const query = input.value.trim();
+        const results = query ? await search(query, '') : [];
+        if (results === null) return;
+        options.replaceChildren(...results.map(result => {
+            const option = document.createElement('option');
+            option.value = result.code;
+            option.label = result.description;
+            return option;
+        }));
+    }, STANDARDS_SEARCH_DELAY));
+}
+
+// ===== Offline Binder (Service Worker) =====
+function registerServiceWorker() {
+    if (!('serviceWorker' in navigator)) return;
+
+    navigator.serviceWorker.register('/bellringers/sw.js', { scope: '/bellringers/' })
+        .catch(error => console.error('Service worker registration failed:', error));
+}
+
+function requestBinderSync() {
+    // Fetch the new item (and its print view) for offline use right away
+    if (navigator.serviceWorker && navigator.serviceWorker.controller) {
+        navigator.serviceWorker.controller.postMessage({ type: 'sync-binder' });
+    }
+}
+
 // ===== Utility Functions =====
 function showAlert(message, type) {
     const alertDiv = document.createElement('div');
@@ -497,13 +803,21 @@ document.addEventListener('DOMContentLoaded', async () => {
 
     setupNavigation();
     setupGenerator();
+    setupStandardFilter();
+    registerServiceWorker();
 
     // Attach global functions for inline handlers
     window.saveBellRinger = saveBellRinger;
     window.publishBellRinger = publishBellRinger;
     window.printBellRinger = printBellRinger;
     window.addToBinder = addToBinder;
+    window.generateBellRinger = generateBellRinger;
+    window.toggleContent = toggleContent;
+    window.toggleRelated = toggleRelated;
     window.approveBellRinger = approveBellRinger;
     window.deleteBellRinger = deleteBellRinger;
+    window.updateSelection = updateSelection;
+    window.toggleSelectAll = toggleSelectAll;
+    window.bulkModerate = bulkModerate;
     window.adminLogin = adminLogin;
 });
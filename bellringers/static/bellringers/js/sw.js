@@ -0,0 +1,219 @@
+/**
+ * QuickWork - Bell Ringers
+ * Service worker for the offline binder
+ *
+ * Keeps the user's binder items in IndexedDB, synced from
+ * /bellringers/api/binder/changes with small deltas, and stores the
+ * print view of every binder item so classroom printing works offline
+ * and without a server round trip. The last binder page is kept as an
+ * offline fallback.
+ */
+
+const BASE = '/bellringers';
+const CHANGES_URL = `${BASE}/api/binder/changes`;
+const BINDER_URL = `${BASE}/binder`;
+const PRINT_PATH = /^\/bellringers\/print\/(\d+)$/;
+
+const DB_NAME = 'bellringers';
+const DB_VERSION = 1;
+
+self.addEventListener('install', () => self.skipWaiting());
+self.addEventListener('activate', event => event.waitUntil(self.clients.claim()));
+
+// ===== IndexedDB =====
+// Stores: items (binder rows by id), pages (print/binder HTML by path), meta (sync state)
+
+function openDb() {
+    return new Promise((resolve, reject) => {
+        const request = indexedDB.open(DB_NAME, DB_VERSION);
+        request.onupgradeneeded = () => {
+            const db = request.result;
+            db.createObjectStore('items', { keyPath: 'id' });
+            db.createObjectStore('pages');
+            db.createObjectStore('meta');
+        };
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function idbGet(db, store, key) {
+    return new Promise((resolve, reject) => {
+        const request = db.transaction(store).objectStore(store).get(key);
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function idbGetAllKeys(db, store) {
+    return new Promise((resolve, reject) => {
+        const request = db.transaction(store).objectStore(store).getAllKeys();
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function idbWrite(db, stores, work) {
+    // Runs work(transaction) and resolves once everything it queued is committed
+    return new Promise((resolve, reject) => {
+        const transaction = db.transaction(stores, 'readwrite');
+        work(transaction);
+        transaction.oncomplete = () => resolve();
+        transaction.onerror = () => reject(transaction.error);
+        transaction.onabort = () => reject(transaction.error);
+    });
+}
+
+// ===== Delta Sync =====
+
+let syncing = null;
+
+function syncBinder() {
+    // One sync at a time; callers during a sync share its result
+    if (!syncing) {
+        syncing = runSync().catch(error => console.error('Binder sync failed:', error))
+            .finally(() => { syncing = null; });
+    }
+    return syncing;
+}
+
+async function fetchChanges(state) {
+    const params = new URLSearchParams();
+    if (state && state.cursor) {
+        params.set('since', state.cursor);
+        params.set('version', state.version);
+    }
+    const response = await fetch(`${CHANGES_URL}?${params}`, { credentials: 'same-origin' });
+    if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+    }
+    return response.json();
+}
+
+async function runSync() {
+    const db = await openDb();
+    let state = await idbGet(db, 'meta', 'sync');
+    let changes = await fetchChanges(state);
+
+    // A different user (or a reset database) on this browser: start over
+    if (state && state.user !== changes.user && !changes.full) {
+        state = null;
+        changes = await fetchChanges(null);
+    }
+
+    if (state && changes.version === state.version && !changes.full) {
+        return;
+    }
+
+    await idbWrite(db, ['items', 'pages', 'meta'], transaction => {
+        const items = transaction.objectStore('items');
+        const pages = transaction.objectStore('pages');
+        if (changes.full) {
+            items.clear();
+            pages.clear();
+        }
+        for (const item of changes.added) {
+            items.put(item);
+            // The print view shows the approval status; refetch it below
+            pages.delete(printPath(item.id));
+        }
+        for (const id of changes.removed) {
+            items.delete(id);
+            pages.delete(printPath(id));
+        }
+        // The cached binder page no longer matches
+        pages.delete(BINDER_URL);
+        transaction.objectStore('meta').put(
+            { user: changes.user, version: changes.version, cursor: changes.cursor }, 'sync');
+    });
+
+    await prefetchPrintViews(db);
+}
+
+async function prefetchPrintViews(db) {
+    // Store the print view of every binder item that doesn't have one yet
+    const [itemIds, pagePaths] = await Promise.all([idbGetAllKeys(db, 'items'), idbGetAllKeys(db, 'pages')]);
+    const cached = new Set(pagePaths);
+    for (const id of itemIds) {
+        const path = printPath(id);
+        if (cached.has(path)) {
+            continue;
+        }
+        const response = await fetch(path, { credentials: 'same-origin' });
+        if (response.ok) {
+            await storePage(db, path, response);
+        }
+    }
+}
+
+function printPath(id) {
+    return `${BASE}/print/${id}`;
+}
+
+async function storePage(db, path, response) {
+    const html = await response.text();
+    await idbWrite(db, ['pages'], transaction => transaction.objectStore('pages').put(html, path));
+}
+
+function htmlResponse(html) {
+    return new Response(html, { headers: { 'Content-Type': 'text/html; charset=utf-8' } });
+}
+
+// ===== Fetch Handling =====
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) {
+        return;
+    }
+
+    const printMatch = url.pathname.match(PRINT_PATH);
+    if (printMatch && !url.search) {
+        event.respondWith(printView(url.pathname, Number(printMatch[1])));
+    } else if (url.pathname === BINDER_URL && !url.search) {
+        event.respondWith(binderPage(event, request));
+    }
+});
+
+async function printView(path, id) {
+    // Bell ringer content never changes, so a stored print view is served as is
+    const db = await openDb();
+    const html = await idbGet(db, 'pages', path);
+    if (html !== undefined) {
+        return htmlResponse(html);
+    }
+
+    const response = await fetch(path, { credentials: 'same-origin' });
+    if (response.ok && await idbGet(db, 'items', id) !== undefined) {
+        await storePage(db, path, response.clone());
+    }
+    return response;
+}
+
+async function binderPage(event, request) {
+    // Network first (the server answers repeat visits with 304); sync deltas afterwards
+    try {
+        const response = await fetch(request);
+        if (response.ok) {
+            const copy = response.clone();
+            event.waitUntil(syncBinder().then(async () => storePage(await openDb(), BINDER_URL, copy)));
+        }
+        return response;
+    } catch (error) {
+        const html = await idbGet(await openDb(), 'pages', BINDER_URL);
+        if (html !== undefined) {
+            return htmlResponse(html);
+        }
+        throw error;
+    }
+}
+
+self.addEventListener('message', event => {
+    if (event.data && event.data.type === 'sync-binder') {
+        event.waitUntil(syncBinder());
+    }
+});
@@ -0,0 +1,51 @@
+"""
+Streamed page rendering for Bell Ringers
+Renders templates incrementally with Flask's stream_template so the page
+header reaches the browser before the database rows are read, then sends
+the cards in chunks instead of one fully buffered page.
+"""
+from flask import Response, stream_template
+from markupsafe import Markup
+
+
+# Templates place {{ stream_flush }} at points where a partial page is worth sending
+FLUSH_MARKER = Markup('<!--flush-->')
+
+# Buffer at least this much rendered output between flushes after the first one
+CHUNK_BYTES = 16 * 1024
+
+
+def chunk_output(pieces, chunk_bytes=CHUNK_BYTES):
+    """Group rendered template pieces into chunks
+
+    The first flush marker always flushes (that's the page header); later
+    markers flush only once chunk_bytes of output has accumulated. Markers
+    themselves are dropped from the output.
+    """
+    buffer = []
+    size = 0
+    flushed = False
+
+    for piece in pieces:
+        if piece == FLUSH_MARKER:
+            if buffer and (not flushed or size >= chunk_bytes):
+                yield ''.join(buffer)
+                buffer = []
+                size = 0
+                flushed = True
+            continue
+        buffer.append(piece)
+        size += len(piece)
+
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_page(template_name, **context):
+    """Render a template as a streamed HTML response
+
+    Context values may be lazy iterators (e.g. database cursors); they are
+    consumed while the response is being sent.
+    """
+    pieces = stream_template(template_name, stream_flush=FLUSH_MARKER, **context)
+    return Response(chunk_output(pieces), mimetype='text/html')
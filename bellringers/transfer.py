@@ -0,0 +1,318 @@
+"""
+Streaming export and bulk import for Bell Ringers data
+
+Exports are generator pipelines: rows are read lazily from a database
+cursor and serialized to NDJSON or CSV one line at a time, so memory use
+stays flat no matter how large the binder, corpus or log range is.
+
+Imports read NDJSON or CSV line by line and insert in chunked
+transactions.
+
+Command line usage (from the project root):
+    python -m bellringers.transfer export binder --handle clever-python-256 > binder.ndjson
+    python -m bellringers.transfer export public --format csv -o corpus.csv
+    python -m bellringers.transfer export activity --start 2025-01-01 --end 2025-02-01
+    python -m bellringers.transfer import corpus.ndjson --chunk-size 2000
+"""
+import argparse
+import csv
+import io
+import json
+import sqlite3
+import sys
+import time
+
+from . import database as db
+
+
+FORMATS = ('ndjson', 'csv')
+
+MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+BELL_RINGER_COLUMNS = (
+    'id', 'owner_handle', 'topic', 'format', 'constraint_type', 'content',
+    'is_public', 'is_approved', 'binder_count', 'created_at'
+)
+
+ACTIVITY_COLUMNS = ('id', 'user_handle', 'action_type', 'details', 'timestamp')
+
+# Columns an imported record must provide
+REQUIRED_IMPORT_COLUMNS = ('owner_handle', 'topic', 'format', 'constraint_type', 'content')
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+# ===== Serialization =====
+
+def to_ndjson(rows, columns):
+    """Yield one JSON document per row, newline terminated"""
+    for row in rows:
+        yield json.dumps({column: row[column] for column in columns}) + '\n'
+
+
+def to_csv(rows, columns):
+    """Yield a CSV header line followed by one line per row"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    writer.writerow(columns)
+    yield flush()
+    for row in rows:
+        writer.writerow([row[column] for column in columns])
+        yield flush()
+
+
+def serialize(rows, columns, fmt):
+    """Serialize rows lazily in the requested format"""
+    if fmt == 'csv':
+        return to_csv(rows, columns)
+    if fmt == 'ndjson':
+        return to_ndjson(rows, columns)
+    raise ValueError(f"Unsupported export format: {fmt}")
+
+
+# ===== Exports =====
+
+def export_user_binder(user_id, fmt='ndjson'):
+    """Stream a user's binder"""
+    return serialize(db.iter_user_binder(user_id), BELL_RINGER_COLUMNS, fmt)
+
+
+def export_public_corpus(fmt='ndjson'):
+    """Stream the approved public corpus"""
+    return serialize(db.iter_public_corpus(), BELL_RINGER_COLUMNS, fmt)
+
+
+def export_activity_logs(start=None, end=None, fmt='ndjson'):
+    """Stream activity logs for a date range (start inclusive, end exclusive)"""
+    return serialize(db.iter_activity_logs(start, end), ACTIVITY_COLUMNS, fmt)
+
+
+# ===== Imports =====
+
+class ImportFailed(ValueError):
+    """A record could not be imported; the chunks before it are already committed"""
+
+    def __init__(self, reason, rows, line):
+        super().__init__(f"Line {line}: {reason} ({rows} rows were already imported)")
+        self.reason = reason
+        self.rows = rows
+        self.line = line
+
+
+class _LineCounter:
+    """Iterate over lines, remembering the number of the last one read and
+    of the first non-blank one read since mark()"""
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self.line = 0
+        self.start = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = next(self._lines)
+        self.line += 1
+        if self.start is None and line.strip():
+            self.start = self.line
+        return line
+
+    def mark(self):
+        self.start = None
+
+
+def read_records(lines, fmt):
+    """Yield (line number, record dict) for each import record in an iterable of text lines
+
+    The line number is where the record starts; a CSV record with quoted
+    newlines spans several lines.
+
+    Raises:
+        ImportFailed: A line is not valid JSON (rows is 0; see import_bell_ringers)
+    """
+    counter = _LineCounter(lines)
+    if fmt == 'csv':
+        reader = csv.DictReader(counter)
+        if reader.fieldnames is None:
+            return  # Empty file
+        counter.mark()
+        for record in reader:
+            yield counter.start, record
+            counter.mark()
+    elif fmt == 'ndjson':
+        for line in counter:
+            line = line.strip()
+            if line:
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    raise ImportFailed(str(e), 0, counter.line) from e
+                yield counter.line, record
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def normalize_record(record, owner_handle=None):
+    """Convert a raw import record into the shape bulk_insert_bell_ringers expects"""
+    if owner_handle:
+        record = {**record, 'owner_handle': owner_handle}
+
+    missing = [column for column in REQUIRED_IMPORT_COLUMNS if not record.get(column)]
+    if missing:
+        raise ValueError(f"Record is missing {', '.join(missing)}")
+
+    def as_int(value):
+        # CSV gives strings, NDJSON gives bools/ints
+        if value in (None, ''):
+            return 0
+        if isinstance(value, str):
+            value = value.strip().lower()
+            if value in ('true', 'false'):
+                return int(value == 'true')
+        return int(value)
+
+    return {
+        'owner_handle': record['owner_handle'],
+        'topic': record['topic'],
+        'format': record['format'],
+        'constraint_type': record['constraint_type'],
+        'content': record['content'],
+        'is_public': as_int(record.get('is_public')),
+        'is_approved': as_int(record.get('is_approved')),
+        'binder_count': as_int(record.get('binder_count')),
+        'created_at': record.get('created_at') or None,
+    }
+
+
+def import_bell_ringers(lines, fmt='ndjson', chunk_size=DEFAULT_CHUNK_SIZE, owner_handle=None):
+    """Bulk import bell ringers, one transaction per chunk
+
+    Args:
+        lines: Iterable of text lines (an open file works)
+        fmt: 'ndjson' or 'csv'
+        chunk_size: Number of records per transaction
+        owner_handle: Optional handle that overrides each record's owner
+
+    Returns:
+        Dict with rows imported, elapsed seconds and rows per second
+
+    Raises:
+        ImportFailed: A record is invalid or its chunk was rejected (with the
+            number of rows already committed and the failing line)
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+    started = time.perf_counter()
+    imported = 0
+    chunk = []
+    chunk_line = None
+    line = None
+
+    def insert():
+        try:
+            return db.bulk_insert_bell_ringers(chunk)
+        except sqlite3.IntegrityError as e:
+            # The whole chunk was rolled back; point at its first record
+            raise ImportFailed(f"{e} (in the chunk starting at this line)", imported, chunk_line) from e
+
+    try:
+        for line, record in read_records(lines, fmt):
+            if not chunk:
+                chunk_line = line
+            chunk.append(normalize_record(record, owner_handle))
+            if len(chunk) >= chunk_size:
+                imported += insert()
+                chunk = []
+    except ImportFailed as e:
+        if e.rows != imported:
+            raise ImportFailed(e.reason, imported, e.line) from e.__cause__
+        raise
+    except (ValueError, KeyError, TypeError) as e:
+        raise ImportFailed(str(e), imported, line) from e
+    if chunk:
+        imported += insert()
+
+    elapsed = time.perf_counter() - started
+    return {
+        'rows': imported,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(imported / elapsed) if elapsed else imported,
+    }
+
+
+def guess_format(filename, default='ndjson'):
+    """Pick a format from a file extension"""
+    if filename and filename.lower().endswith('.csv'):
+        return 'csv'
+    if filename and filename.lower().endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return default
+
+
+# ===== Command Line =====
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Export or import Bell Ringers data')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = commands.add_parser('export', help='Stream data out as NDJSON or CSV')
+    export_parser.add_argument('dataset', choices=('binder', 'public', 'activity'))
+    export_parser.add_argument('--handle', help='User handle (binder export)')
+    export_parser.add_argument('--start', help='Start date, inclusive (activity export)')
+    export_parser.add_argument('--end', help='End date, exclusive (activity export)')
+    export_parser.add_argument('--format', choices=FORMATS, default='ndjson')
+    export_parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+
+    import_parser = commands.add_parser('import', help='Bulk load bell ringers')
+    import_parser.add_argument('file')
+    import_parser.add_argument('--format', choices=FORMATS, help='Default: from file extension')
+    import_parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    import_parser.add_argument('--owner', help='Assign every imported bell ringer to this handle')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        if args.dataset == 'binder':
+            if not args.handle:
+                parser.error('--handle is required for binder exports')
+            user_id = db.get_user_id(args.handle)
+            if user_id is None:
+                parser.error(f'No user with handle {args.handle}')
+            lines = export_user_binder(user_id, args.format)
+        elif args.dataset == 'public':
+            lines = export_public_corpus(args.format)
+        else:
+            lines = export_activity_logs(args.start, args.end, args.format)
+
+        out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+        try:
+            out.writelines(lines)
+        finally:
+            if args.output:
+                out.close()
+    else:
+        fmt = args.format or guess_format(args.file)
+        with open(args.file, 'r', encoding='utf-8', newline='') as f:
+            try:
+                stats = import_bell_ringers(f, fmt, args.chunk_size, args.owner)
+            except ImportFailed as e:
+                parser.exit(1, f"Import stopped: {e}\n")
+        print(f"Imported {stats['rows']} bell ringers in {stats['seconds']}s "
+              f"({stats['rows_per_second']} rows/second)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
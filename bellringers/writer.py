@@ -0,0 +1,254 @@
+"""
+Single-writer queue for SQLite writes (optional, see DB_WRITE_QUEUE)
+SQLite allows one writer per database file at a time. Without this module
+every request thread opens its own write transaction, and under bursts the
+threads queue up on the file lock (or give up after the busy timeout).
+
+With the queue enabled, each process runs one writer thread per database
+file. It owns a single connection and executes queued write operations
+back to back. Operations that arrive while a transaction is running are
+grouped into the next one: a BEGIN IMMEDIATE ... COMMIT batch with a
+savepoint per operation, so a failing operation is rolled back alone and
+the rest of the batch still commits. Callers wait on a future for their
+operation's result (or exception), which is only resolved after the commit.
+
+Other processes still compete for the file lock. When the batch can't get
+it, the writer retries the whole batch with exponential backoff and jitter
+instead of blocking in SQLite's busy handler.
+"""
+import atexit
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from . import metrics
+from . import profiler
+
+DEFAULT_MAX_BATCH = 64
+DEFAULT_BUSY_RETRIES = 8
+
+# SQLite's own busy wait per attempt; the writer backs off between attempts
+BUSY_TIMEOUT_MS = 100
+BACKOFF_BASE = 0.01
+BACKOFF_CAP = 0.5
+
+_STOP = object()
+
+
+def is_busy_error(error):
+    """True if an OperationalError means another connection holds the lock"""
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def backoff(attempt):
+    """Seconds to sleep before retry number attempt (full jitter)"""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+class WriteQueue:
+    """Writer thread and queue for one database file"""
+
+    def __init__(self, path, max_batch=DEFAULT_MAX_BATCH, busy_retries=DEFAULT_BUSY_RETRIES):
+        self.path = path
+        self.max_batch = max_batch
+        self.busy_retries = busy_retries
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._conn = None
+
+    def submit(self, fn):
+        """Queue fn(cursor) for the writer thread
+
+        Returns:
+            Future resolved with fn's return value once its batch committed
+        """
+        future = Future()
+        self._start()
+        self._queue.put((fn, future))
+        return future
+
+    def run(self, fn):
+        """Run fn(cursor) on the writer thread and wait for its result"""
+        if threading.current_thread() is self._thread:
+            # Already inside an operation (e.g. a write helper calling another)
+            return fn(self._conn.cursor())
+        return self.submit(fn).result()
+
+    def close(self, timeout=10.0):
+        """Finish the queued operations and stop the writer thread"""
+        with self._lock:
+            thread = self._thread if self._pid == os.getpid() else None
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def _start(self):
+        """Start the writer thread on first use (and again in a forked child)"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name=f'bellringers-writer:{os.path.basename(self.path)}',
+                                            daemon=True)
+            self._thread.start()
+
+    def _connect(self):
+        from . import database as db  # database imports this module
+
+        conn = db._connect(self.path)
+        # Transactions are managed explicitly below
+        conn.isolation_level = None
+        conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+        return conn
+
+    def _loop(self):
+        self._conn = self._connect()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    return
+                # Everything that queued up during the previous transaction goes in this one
+                batch = [item]
+                stopping = False
+                while len(batch) < self.max_batch:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                self._execute(batch)
+                if stopping:
+                    return
+        finally:
+            self._conn.close()
+
+    def _execute(self, batch):
+        """Commit a batch, retrying it while other processes hold the lock"""
+        try:
+            self._execute_batch(batch)
+        finally:
+            # The connection outlives every request; fold its statements into the stats per batch
+            if isinstance(self._conn, profiler.ProfilingConnection):
+                self._conn.finish()
+
+    def _execute_batch(self, batch):
+        started = time.perf_counter()
+        for attempt in range(self.busy_retries + 1):
+            try:
+                results = self._apply(batch)
+                break
+            except Exception as e:
+                if self._conn.in_transaction:
+                    self._conn.execute('ROLLBACK')
+                if not (isinstance(e, sqlite3.OperationalError) and is_busy_error(e)) \
+                        or attempt == self.busy_retries:
+                    metrics.inc('bellringers_db_write_batches_total', {'result': 'error'})
+                    for _, future in batch:
+                        future.set_exception(e)
+                    return
+                metrics.inc('bellringers_db_write_busy_retries_total')
+                time.sleep(backoff(attempt))
+
+        metrics.inc('bellringers_db_write_batches_total', {'result': 'committed'})
+        metrics.observe('bellringers_db_write_batch_size', len(batch), buckets=metrics.COUNT_BUCKETS)
+        metrics.observe('bellringers_db_write_batch_seconds', time.perf_counter() - started)
+        for (_, future), (error, value) in zip(batch, results):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(value)
+
+    def _apply(self, batch):
+        """Run a batch in one transaction, each operation in its own savepoint
+
+        Returns:
+            (exception or None, return value) per operation
+
+        Raises:
+            sqlite3.OperationalError: The lock couldn't be taken (the batch is retried)
+        """
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        results = []
+        for fn, _ in batch:
+            conn.execute('SAVEPOINT write_op')
+            try:
+                value = fn(conn.cursor())
+            except sqlite3.OperationalError as e:
+                if is_busy_error(e):
+                    raise
+                conn.execute('ROLLBACK TO write_op')
+                results.append((e, None))
+            except Exception as e:
+                conn.execute('ROLLBACK TO write_op')
+                results.append((e, None))
+            else:
+                results.append((None, value))
+            conn.execute('RELEASE write_op')
+        conn.execute('COMMIT')
+        return results
+
+
+# One queue per database file (shards each get their own); set up by configure()
+_enabled = False
+_max_batch = DEFAULT_MAX_BATCH
+_busy_retries = DEFAULT_BUSY_RETRIES
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def configure(enabled=False, max_batch=DEFAULT_MAX_BATCH, busy_retries=DEFAULT_BUSY_RETRIES):
+    """Turn write serialization on or off for this process"""
+    global _enabled, _max_batch, _busy_retries
+    close_all()
+    _enabled = bool(enabled)
+    _max_batch = max_batch or DEFAULT_MAX_BATCH
+    _busy_retries = DEFAULT_BUSY_RETRIES if busy_retries is None else busy_retries
+
+
+def enabled():
+    """True if writes go through the writer threads"""
+    return _enabled
+
+
+def get_queue(path):
+    """The write queue for a database file"""
+    write_queue = _queues.get(path)
+    if write_queue is None:
+        with _queues_lock:
+            write_queue = _queues.get(path)
+            if write_queue is None:
+                write_queue = _queues[path] = WriteQueue(path, _max_batch, _busy_retries)
+    return write_queue
+
+
+def run(path, fn):
+    """Run fn(cursor) on the writer thread for path and return its result (or raise its exception)"""
+    return get_queue(path).run(fn)
+
+
+def close_all():
+    """Flush and stop every writer thread (at exit, or before reconfiguring)"""
+    with _queues_lock:
+        queues = list(_queues.values())
+        _queues.clear()
+    for write_queue in queues:
+        write_queue.close()
+
+
+atexit.register(close_all)
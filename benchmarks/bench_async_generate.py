@@ -0,0 +1,180 @@
+"""
+Benchmark: concurrent generations per process, sync Flask view vs async ASGI path
+Replaces the Gemini SDK with a simulated model that takes a fixed time to
+answer, fires many generation requests at once, and reports how many
+generations were in flight at the same time and how long the batch took.
+
+The sync path is driven by a fixed pool of worker threads, like a threaded
+WSGI worker; the async path runs every request on one event loop.
+
+Usage (from the project root):
+    python benchmarks/bench_async_generate.py [requests] [latency_seconds] [threads]
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from bellringers import create_blueprint, database as db, gemini_api
+from bellringers.asgi import GENERATE_PATH, create_asgi_app
+from bellringers.config import Config
+
+PAYLOAD = {'topic': 'Loops', 'format': 'Code Tracing', 'constraint': '5-Minute Timer', 'standards': []}
+CONTENT = '<div class="bell-ringer-content"><h2>Bell Ringer: Loops</h2></div>'
+
+
+class SimulatedGemini:
+    """Stands in for google.generativeai: answers after a fixed latency and counts calls in flight"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        simulator = self
+
+        class GenerativeModel:
+            def __init__(self, name):
+                self.name = name
+
+            def generate_content(self, prompt):
+                simulator.enter()
+                try:
+                    time.sleep(simulator.latency)
+                finally:
+                    simulator.leave()
+                return types.SimpleNamespace(text=CONTENT)
+
+            async def generate_content_async(self, prompt):
+                simulator.enter()
+                try:
+                    await asyncio.sleep(simulator.latency)
+                finally:
+                    simulator.leave()
+                return types.SimpleNamespace(text=CONTENT)
+
+        self.GenerativeModel = GenerativeModel
+
+    def configure(self, api_key=None):
+        pass
+
+    def enter(self):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def reset(self):
+        self.in_flight = 0
+        self.peak = 0
+
+
+def build_app():
+    """Flask app on a temporary database, plus a session cookie for one user"""
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    db.init_db()
+    os.environ.setdefault('GEMINI_API_KEY', 'simulated')
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    # Measure raw capacity: no admission control or per-user rate limit
+    app.config.update(GENERATE_MAX_CONCURRENT=0, ASYNC_GENERATE_MAX_CONCURRENT=0, GENERATE_RATE_PER_MINUTE=0)
+    app.register_blueprint(create_blueprint())
+
+    client = app.test_client()
+    client.post('/bellringers/api/register', json={'handle': 'bench-async-user'})
+    cookie = client.get_cookie(app.config['SESSION_COOKIE_NAME']).value
+    return app, cookie
+
+
+def run_sync(app, cookie, requests, threads):
+    """Send requests through the Flask view from a fixed pool of threads"""
+    local = threading.local()
+
+    def one_request(_):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+            local.client.set_cookie(app.config['SESSION_COOKIE_NAME'], cookie)
+        return local.client.post(GENERATE_PATH, json=PAYLOAD).status_code
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(one_request, range(requests)))
+
+
+async def run_async(asgi_app, cookie, requests, session_cookie_name):
+    """Send requests concurrently to the ASGI app on one event loop"""
+    body = json.dumps(PAYLOAD).encode()
+
+    async def one_request():
+        scope = {
+            'type': 'http', 'method': 'POST', 'path': GENERATE_PATH,
+            'headers': [(b'host', b'localhost'), (b'content-type', b'application/json'),
+                        (b'cookie', f'{session_cookie_name}={cookie}'.encode())],
+        }
+        sent = False
+        status = []
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                return {'type': 'http.disconnect'}
+            sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await asgi_app(scope, receive, send)
+        return status[0]
+
+    return await asyncio.gather(*(one_request() for _ in range(requests)))
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+
+    simulator = SimulatedGemini(latency)
+    gemini_api._genai = simulator
+    app, cookie = build_app()
+    asgi_app = create_asgi_app(app)
+
+    print(f"{requests} generation requests, simulated Gemini latency {latency:.1f} s")
+    print(f"{'path':<28}{'peak in flight':>16}{'wall (s)':>12}{'req/s':>10}{'errors':>8}")
+
+    results = {}
+    simulator.reset()
+    started = time.perf_counter()
+    statuses = run_sync(app, cookie, requests, threads)
+    results[f'sync view ({threads} threads)'] = (simulator.peak, time.perf_counter() - started, statuses)
+
+    simulator.reset()
+    started = time.perf_counter()
+    statuses = asyncio.run(run_async(asgi_app, cookie, requests, app.config['SESSION_COOKIE_NAME']))
+    results['async ASGI (1 loop)'] = (simulator.peak, time.perf_counter() - started, statuses)
+
+    for label, (peak, wall, statuses) in results.items():
+        errors = sum(1 for status in statuses if status != 200)
+        print(f"{label:<28}{peak:>16}{wall:>12.2f}{requests / wall:>10.1f}{errors:>8}")
+
+    with db.get_db() as conn:
+        logged = conn.execute("SELECT COUNT(*) FROM activity_logs WHERE action_type = 'generate'").fetchone()[0]
+    print(f"\nGenerations logged: {logged} (expected {2 * requests})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""
+Benchmark: TEXT handle foreign keys vs integer user ids
+Builds a synthetic database with the old handle-keyed schema, migrates a
+copy with init_db(), then compares table/index sizes and the latency of
+the binder and user statistics joins on both.
+
+Usage (from the project root):
+    python benchmarks/bench_integer_keys.py [users] [items_per_user] [logs_per_user]
+"""
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bellringers import database as db
+
+# The handle-keyed schema used before the migration
+LEGACY_SCHEMA = '''
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        handle TEXT UNIQUE NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE bell_ringers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        owner_handle TEXT NOT NULL,
+        topic TEXT NOT NULL,
+        format TEXT NOT NULL,
+        constraint_type TEXT NOT NULL,
+        content TEXT NOT NULL,
+        is_public BOOLEAN DEFAULT 0,
+        is_approved BOOLEAN DEFAULT 0,
+        binder_count INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (owner_handle) REFERENCES users(handle)
+    );
+    CREATE TABLE activity_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_handle TEXT NOT NULL,
+        action_type TEXT NOT NULL,
+        details TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_handle) REFERENCES users(handle)
+    );
+    CREATE INDEX idx_activity_logs_timestamp ON activity_logs (timestamp);
+    CREATE TABLE activity_rollups (
+        user_handle TEXT NOT NULL,
+        action_type TEXT NOT NULL,
+        day DATE NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_handle, action_type, day),
+        FOREIGN KEY (user_handle) REFERENCES users(handle)
+    );
+    CREATE TABLE binder_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_handle TEXT NOT NULL,
+        bell_ringer_id INTEGER NOT NULL,
+        original_id INTEGER,
+        catalog_id INTEGER,
+        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_handle) REFERENCES users(handle),
+        FOREIGN KEY (bell_ringer_id) REFERENCES bell_ringers(id),
+        UNIQUE(user_handle, bell_ringer_id)
+    );
+    CREATE INDEX idx_bell_ringers_visibility ON bell_ringers (is_public, is_approved, created_at);
+'''
+
+# The same queries before and after (see iter_user_binder() and get_user_statistics())
+QUERIES = {
+    'legacy': {
+        'binder': '''
+            SELECT br.* FROM bell_ringers br
+            INNER JOIN binder_items bi ON br.id = bi.bell_ringer_id
+            WHERE bi.user_handle = ?
+            ORDER BY bi.added_at DESC
+        ''',
+        'in_binder': 'SELECT id FROM binder_items WHERE user_handle = ? AND bell_ringer_id = ?',
+        'statistics': '''
+            WITH activity AS (
+                SELECT user_handle, action_type, COUNT(*) AS n FROM activity_logs
+                GROUP BY user_handle, action_type
+            ),
+            user_activity AS (
+                SELECT user_handle, SUM(CASE WHEN action_type = 'generate' THEN n ELSE 0 END) AS api_requests
+                FROM activity GROUP BY user_handle
+            ),
+            user_binders AS (
+                SELECT user_handle, COUNT(*) AS binder_items FROM binder_items GROUP BY user_handle
+            )
+            SELECT u.handle, COALESCE(ua.api_requests, 0), COALESCE(ub.binder_items, 0)
+            FROM users u
+            LEFT JOIN user_activity ua ON u.handle = ua.user_handle
+            LEFT JOIN user_binders ub ON u.handle = ub.user_handle
+        ''',
+    },
+    'integer': {
+        'binder': f'''
+            {db.BELL_RINGER_SELECT}
+            INNER JOIN binder_items bi ON br.id = bi.bell_ringer_id
+            WHERE bi.user_id = ?
+            ORDER BY bi.added_at DESC
+        ''',
+        'in_binder': 'SELECT id FROM binder_items WHERE user_id = ? AND bell_ringer_id = ?',
+        'statistics': '''
+            WITH activity AS (
+                SELECT user_id, action_type, COUNT(*) AS n FROM activity_logs
+                GROUP BY user_id, action_type
+            ),
+            user_activity AS (
+                SELECT user_id, SUM(CASE WHEN action_type = 'generate' THEN n ELSE 0 END) AS api_requests
+                FROM activity GROUP BY user_id
+            ),
+            user_binders AS (
+                SELECT user_id, COUNT(*) AS binder_items FROM binder_items GROUP BY user_id
+            )
+            SELECT u.handle, COALESCE(ua.api_requests, 0), COALESCE(ub.binder_items, 0)
+            FROM users u
+            LEFT JOIN user_activity ua ON u.id = ua.user_id
+            LEFT JOIN user_binders ub ON u.id = ub.user_id
+        ''',
+    },
+}
+
+ADJECTIVES = ('clever', 'curious', 'swift', 'brave', 'quiet', 'bright', 'nimble', 'steady')
+NOUNS = ('python', 'compiler', 'pointer', 'lambda', 'kernel', 'router', 'bitwise', 'recursion')
+
+
+def build_legacy(path, users, items_per_user, logs_per_user):
+    """Create a handle-keyed database filled with synthetic data"""
+    rng = random.Random(42)
+    handles = [f'{rng.choice(ADJECTIVES)}-{rng.choice(NOUNS)}-{i}-{rng.randrange(16 ** 6):06x}'
+               for i in range(users)]
+
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.executemany('INSERT INTO users (handle) VALUES (?)', [(h,) for h in handles])
+    conn.executemany('''
+        INSERT INTO bell_ringers (owner_handle, topic, format, constraint_type, content, is_public, is_approved)
+        VALUES (?, 'Loops', 'Code Tracing', '5-Minute Timer', '<p>Trace the loop.</p>', ?, 1)
+    ''', ((h, rng.random() < 0.2) for h in handles for _ in range(items_per_user)))
+
+    # Own items plus a few public items saved from the feed
+    item_count = users * items_per_user
+    binder = set()
+    for i, handle in enumerate(handles):
+        binder.update((handle, i * items_per_user + n + 1) for n in range(items_per_user))
+        binder.update((handle, rng.randrange(1, item_count + 1)) for _ in range(items_per_user // 4))
+    conn.executemany('INSERT INTO binder_items (user_handle, bell_ringer_id) VALUES (?, ?)', sorted(binder))
+
+    actions = ('generate', 'generate', 'generate', 'save', 'login')
+    conn.executemany('''
+        INSERT INTO activity_logs (user_handle, action_type, details, timestamp)
+        VALUES (?, ?, '', datetime('now', ?))
+    ''', ((rng.choice(handles), rng.choice(actions), f'-{rng.randrange(90)} days')
+          for _ in range(users * logs_per_user)))
+    conn.commit()
+    conn.close()
+    return handles
+
+
+def object_sizes(path):
+    """Bytes used by each table and index (dbstat), largest first"""
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute('''
+            SELECT name, SUM(pgsize) FROM dbstat
+            WHERE name NOT LIKE 'sqlite_%' OR name LIKE 'sqlite_autoindex_%'
+            GROUP BY name
+        ''').fetchall()
+    except sqlite3.OperationalError:
+        rows = []  # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB
+    finally:
+        conn.close()
+    return dict(rows)
+
+
+def time_query(conn, sql, param_sets, fetch=True):
+    """Average milliseconds per execution over param_sets"""
+    started = time.perf_counter()
+    for params in param_sets:
+        cursor = conn.execute(sql, params)
+        if fetch:
+            cursor.fetchall()
+    return (time.perf_counter() - started) * 1000 / len(param_sets)
+
+
+def measure_latency(path, kind, keys, pairs):
+    """Average latency of the binder page join, duplicate check and statistics query"""
+    conn = sqlite3.connect(path)
+    try:
+        queries = QUERIES[kind]
+        time_query(conn, queries['binder'], keys[:50])  # Warm the page cache
+        return {
+            'binder join': time_query(conn, queries['binder'], keys),
+            'binder lookup': time_query(conn, queries['in_binder'], pairs),
+            'user statistics': time_query(conn, queries['statistics'], [()] * 3),
+        }
+    finally:
+        conn.close()
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    items_per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    logs_per_user = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    tmp = tempfile.mkdtemp()
+    legacy_path = os.path.join(tmp, 'legacy.db')
+    integer_path = os.path.join(tmp, 'integer.db')
+    try:
+        print(f"Building {users} users, {users * items_per_user} bell ringers, "
+              f"{users * logs_per_user} activity logs...")
+        handles = build_legacy(legacy_path, users, items_per_user, logs_per_user)
+        shutil.copy(legacy_path, integer_path)
+
+        started = time.perf_counter()
+        db.init_db(integer_path)
+        print(f"Migration: {time.perf_counter() - started:.1f} s")
+
+        # Compare compacted files, not leftovers from the rebuild
+        for path in (legacy_path, integer_path):
+            conn = sqlite3.connect(path)
+            conn.execute('VACUUM')
+            conn.close()
+
+        before = object_sizes(legacy_path)
+        after = object_sizes(integer_path)
+        if before:
+            print(f"\n{'table / index':<40}{'before (KiB)':>14}{'after (KiB)':>14}")
+            for name in sorted(set(before) | set(after), key=lambda n: -max(before.get(n, 0), after.get(n, 0))):
+                print(f"{name:<40}{before.get(name, 0) // 1024:>14}{after.get(name, 0) // 1024:>14}")
+        print(f"{'database file':<40}{os.path.getsize(legacy_path) // 1024:>14}"
+              f"{os.path.getsize(integer_path) // 1024:>14}")
+
+        rng = random.Random(7)
+        sample = rng.sample(range(users), min(users, 2000))
+        legacy_keys = [(handles[i],) for i in sample]
+        integer_keys = [(i + 1,) for i in sample]  # Users were inserted in order, so ids match
+        item_count = users * items_per_user
+        item_ids = [rng.randrange(1, item_count + 1) for _ in sample]
+
+        before = measure_latency(legacy_path, 'legacy', legacy_keys,
+                                 [(k[0], item) for k, item in zip(legacy_keys, item_ids)])
+        after = measure_latency(integer_path, 'integer', integer_keys,
+                                [(k[0], item) for k, item in zip(integer_keys, item_ids)])
+
+        print(f"\n{'query':<40}{'before (ms)':>14}{'after (ms)':>14}")
+        for name in before:
+            print(f"{name:<40}{before[name]:>14.3f}{after[name]:>14.3f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
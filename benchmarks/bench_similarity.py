@@ -0,0 +1,99 @@
+"""
+Benchmark: the "More like this" similarity index
+Fills a fresh database with a synthetic public feed, then reports the time
+to build a worker's index from scratch, to pick up one newly approved item
+(the incremental sync), and the latency percentiles of related-item and
+reuse lookups.
+
+Usage (from the project root):
+    python benchmarks/bench_similarity.py [feed_items] [queries]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bellringers import database as db, gemini_api, similarity
+
+WORDS = '''
+    variable loop array list index function return value string integer boolean condition
+    recursion base case stack queue tree node graph search sort binary linear algorithm
+    print output input trace debug error bug off by one counter total sum average maximum
+    minimum nested while for range element swap compare class object method parameter
+'''.split()
+# A long tail of rarer terms, drawn with Zipf-like frequencies like real text
+VOCABULARY = WORDS + [f'term{i}' for i in range(5000)]
+FREQUENCIES = [1 / rank for rank in range(1, len(VOCABULARY) + 1)]
+
+
+def content(rng):
+    """Generated-looking HTML with a few hundred words of random CS vocabulary"""
+    sections = ''.join(
+        f'<div class="section {kind}"><h3>{kind.title()}</h3>'
+        f'<p>{" ".join(rng.choices(VOCABULARY, FREQUENCIES, k=80))}</p></div>'
+        for kind in ('instructions', 'problem', 'answer-key'))
+    return f'<div class="bell-ringer-content"><h2>Bell Ringer</h2>{sections}</div>'
+
+
+def record(rng, approved=1):
+    return {
+        'owner_handle': f'bench-{rng.randrange(50)}',
+        'topic': rng.choice(gemini_api.TOPIC_OPTIONS),
+        'format': rng.choice(gemini_api.FORMAT_OPTIONS),
+        'constraint_type': rng.choice(gemini_api.CONSTRAINT_OPTIONS),
+        'content': content(rng),
+        'is_public': 1,
+        'is_approved': approved,
+    }
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {
+        'p50_ms': round(samples[len(samples) // 2] * 1000, 2),
+        'p99_ms': round(samples[int(len(samples) * 0.99)] * 1000, 2),
+        'max_ms': round(samples[-1] * 1000, 2),
+    }
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rng = random.Random(42)
+
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    db.init_db()
+    for start in range(0, items, 1000):
+        db.bulk_insert_bell_ringers([record(rng) for _ in range(min(1000, items - start))])
+    feed_ids = db.get_feed_ids()
+    print(f'{len(feed_ids)} feed items, {queries} queries')
+
+    index = similarity.SimilarityIndex(db.DB_PATH)
+    print({'build_ms': round(timed(index.view) * 1000)})
+
+    # One more item approved (by any process): picked up on the next query
+    db.bulk_insert_bell_ringers([record(rng)])
+    index.expire()
+    print({'sync_one_item_ms': round(timed(index.view) * 1000, 1)})
+
+    related = [timed(index.related, rng.choice(feed_ids)) for _ in range(queries)]
+    print(dict({'lookup': 'related'}, **percentiles(related)))
+
+    reuse = [timed(index.find_reusable, rng.choice(gemini_api.TOPIC_OPTIONS),
+                   rng.choice(gemini_api.FORMAT_OPTIONS), rng.choice(gemini_api.CONSTRAINT_OPTIONS),
+                   (), ' '.join(rng.choices(WORDS, k=4)), 0.8)
+             for _ in range(queries)]
+    print(dict({'lookup': 'reuse'}, **percentiles(reuse)))
+
+
+if __name__ == '__main__':
+    main()
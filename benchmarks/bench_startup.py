@@ -0,0 +1,110 @@
+"""
+Benchmark: worker cold start
+Starts fresh Python processes that import the blueprint, build the app and
+serve their first requests, and reports import time and first-request
+latency without a template cache, with an empty (cold) cache and with a
+populated (warm) cache. Also reports whether the Gemini SDK was imported.
+
+Usage (from the project root):
+    python benchmarks/bench_startup.py [runs]
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PAGES = ('/bellringers/feed', '/bellringers/')
+
+
+def child():
+    """Runs in a fresh process: time startup and the first requests"""
+    started = time.perf_counter()
+    from flask import Flask
+
+    from bellringers import create_blueprint, database as db
+    from bellringers.config import Config
+
+    db.DB_PATH = os.environ['BENCH_DB_PATH']
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.register_blueprint(create_blueprint())
+    client = app.test_client()
+    result = {'startup': time.perf_counter() - started}
+
+    for path in PAGES:
+        for attempt in ('first', 'second'):
+            request_started = time.perf_counter()
+            response = client.get(path)
+            response.get_data()
+            result[f'{attempt} {path}'] = time.perf_counter() - request_started
+
+    result['gemini_sdk_imported'] = 'google.generativeai' in sys.modules
+    print(json.dumps(result))
+
+
+def run(cache_dir, db_path):
+    """Start one child process and return its measurements"""
+    env = dict(os.environ, TEMPLATE_CACHE_DIR=cache_dir, BENCH_DB_PATH=db_path)
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child'],
+                            env=env, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process'] = time.perf_counter() - started
+    return result
+
+
+def sdk_import_seconds():
+    """Time a bare import of the Gemini SDK in a fresh process (None if not installed)"""
+    code = 'import time; s = time.perf_counter(); import google.generativeai; print(time.perf_counter() - s)'
+    completed = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    return float(completed.stdout) if completed.returncode == 0 else None
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    from bellringers import database as db
+
+    tmp = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(tmp, 'bench.db')
+        db.init_db(db_path)
+        cache_dir = os.path.join(tmp, 'template_cache')
+
+        scenarios = {'no cache': [], 'cold cache': [], 'warm cache': []}
+        for _ in range(runs):
+            scenarios['no cache'].append(run('', db_path))
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            scenarios['cold cache'].append(run(cache_dir, db_path))
+            scenarios['warm cache'].append(run(cache_dir, db_path))
+
+        columns = ['process', 'startup'] + [f'{attempt} {path}' for path in PAGES
+                                            for attempt in ('first', 'second')]
+        print(f"Median of {runs} runs, milliseconds")
+        print(f"{'':<12}" + ''.join(f'{column:>26}' for column in columns))
+        for name, results in scenarios.items():
+            medians = [sorted(r[column] for r in results)[len(results) // 2] for column in columns]
+            print(f"{name:<12}" + ''.join(f'{m * 1000:>26.1f}' for m in medians))
+
+        imported = any(r['gemini_sdk_imported'] for results in scenarios.values() for r in results)
+        print(f"\nGemini SDK imported during startup/page views: {imported}")
+        seconds = sdk_import_seconds()
+        if seconds is None:
+            print("google.generativeai is not installed; import cost not measured")
+        else:
+            print(f"Import cost deferred to the first generation: {seconds * 1000:.1f} ms")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    if '--child' in sys.argv:
+        child()
+    else:
+        main()
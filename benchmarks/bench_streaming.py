@@ -0,0 +1,85 @@
+"""
+Benchmark: buffered vs streamed rendering of the binder page
+Compares time-to-first-byte, total time and peak Python memory for a
+binder with many saved bell ringers.
+
+Usage (from the project root):
+    python benchmarks/bench_streaming.py [number_of_items]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, render_template
+
+from bellringers import create_blueprint, database as db
+from bellringers.config import Config
+
+HANDLE = 'bench-binder-user'
+CONTENT = '<div class="bell-ringer-content"><p>' + 'Trace the loop and predict the output. ' * 60 + '</p></div>'
+
+
+def build_app(item_count):
+    """Create an app backed by a temporary database holding item_count binder items"""
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    db.init_db()
+    db.bulk_insert_bell_ringers([
+        {'owner_handle': HANDLE, 'topic': 'Loops', 'format': 'Code Tracing',
+         'constraint_type': '5-Minute Timer', 'content': CONTENT}
+        for _ in range(item_count)
+    ])
+    user_id = db.get_user_id(HANDLE)
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.register_blueprint(create_blueprint())
+
+    @app.route('/buffered-binder')
+    def buffered_binder():
+        # The pre-streaming code path: fetchall() then render the whole page
+        return render_template('bellringers/binder.html', bell_ringers=db.get_user_binder(user_id))
+
+    return app
+
+
+def measure(client, path):
+    """Return (time to first chunk, total time, bytes, peak traced memory)"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get(path, buffered=False)
+    chunks = iter(response.response)
+    first = next(chunks)
+    first_byte = time.perf_counter() - started
+    size = len(first) + sum(len(chunk) for chunk in chunks)
+    total = time.perf_counter() - started
+    response.close()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first_byte, total, size, peak
+
+
+def main():
+    item_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    app = build_app(item_count)
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_handle'] = HANDLE
+
+    # Warm up template compilation so both paths are measured hot
+    measure(client, '/buffered-binder')
+    measure(client, '/bellringers/binder')
+
+    print(f"Binder with {item_count} items")
+    print(f"{'path':<12}{'TTFB (ms)':>12}{'total (ms)':>12}{'bytes':>12}{'peak mem (KiB)':>16}")
+    for label, path in (('buffered', '/buffered-binder'), ('streamed', '/bellringers/binder')):
+        first_byte, total, size, peak = measure(client, path)
+        print(f"{label:<12}{first_byte * 1000:>12.1f}{total * 1000:>12.1f}{size:>12}{peak / 1024:>16.0f}")
+
+
+if __name__ == '__main__':
+    main()
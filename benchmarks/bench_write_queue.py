@@ -0,0 +1,102 @@
+"""
+Benchmark: SQLite writes under contention, direct vs the single-writer queue
+Several processes, each with several threads, write to one database at the
+same time: each operation saves a bell ringer or marks the user active, the
+mix a busy worker pool sees. Reports writes per second, failed writes (e.g.
+"database is locked") and latency percentiles for both modes.
+
+Usage (from the project root):
+    python benchmarks/bench_write_queue.py [processes] [threads_per_process] [writes_per_thread]
+"""
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bellringers import database as db, writer
+
+CONTENT = '<div class="bell-ringer-content"><h2>Bell Ringer: Loops</h2><p>Trace the loop.</p></div>'
+
+
+def worker(path, use_queue, threads, writes, results):
+    """One process: threads writing as fast as they can"""
+    db.DB_PATH = path
+    writer.configure(use_queue)
+    user_id = db.get_or_create_user(f'bench-writer-{os.getpid()}')
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def run():
+        mine = []
+        failed = 0
+        for i in range(writes):
+            started = time.perf_counter()
+            try:
+                if i % 2:
+                    db.touch_user(user_id)
+                else:
+                    db.save_bell_ringer(user_id, 'Loops', 'Code Tracing', '5-Minute Timer', CONTENT)
+            except sqlite3.OperationalError:
+                failed += 1
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+            errors.append(failed)
+
+    pool = [threading.Thread(target=run) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    writer.close_all()
+    results.put((latencies, sum(errors)))
+
+
+def run_mode(use_queue, processes, threads, writes):
+    """Run every process against a fresh database; returns the summary"""
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    db.DB_PATH = path
+    db.init_db()
+
+    results = multiprocessing.Queue()
+    pool = [multiprocessing.Process(target=worker, args=(path, use_queue, threads, writes, results))
+            for _ in range(processes)]
+    started = time.perf_counter()
+    for process in pool:
+        process.start()
+    collected = [results.get() for _ in pool]
+    for process in pool:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for process_latencies, _ in collected for latency in process_latencies)
+    failed = sum(errors for _, errors in collected)
+    return {
+        'mode': 'queue' if use_queue else 'direct',
+        'writes': len(latencies) - failed,
+        'failed': failed,
+        'writes_per_second': round((len(latencies) - failed) / elapsed),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 1),
+        'max_ms': round(latencies[-1] * 1000, 1),
+    }
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    writes = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+
+    print(f'{processes} processes x {threads} threads x {writes} writes')
+    for use_queue in (False, True):
+        print(run_mode(use_queue, processes, threads, writes))
+
+
+if __name__ == '__main__':
+    main()